@@ -0,0 +1,193 @@
+"""
+Compares the two camera transports of WebcamStreamer: JPEG frames over the websocket (turned into Blob URLs by the
+page, as the clientside callbacks do) and the multipart MJPEG HTTP endpoint consumed directly by an <img>.
+
+A synthetic camera of our sensor size stamps the acquisition time into a strip of black/white blocks at the top of
+every frame. The benchmark page decodes the strip of each displayed frame and reports end-to-end latency
+(acquisition -> displayed in the browser), displayed frame rate, time spent in page handlers and long tasks. The
+server CPU time used during each run is printed alongside. Browser CPU is read from the browser's task manager
+(Chrome: Shift+Esc) while a run is in progress.
+
+The websocket run skips the Dash renderer, so it is a lower bound for the Dash-driven tiles.
+
+Usage: python benchmarks/camera_transport_benchmark.py [fps] [width]
+then open the printed URLs one after the other (same browser, nothing else streaming).
+"""
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from quart import request, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import webcam_server
+from controllers.streamer import WebcamStreamer
+
+HOST, PORT = "127.0.0.1", 5001
+# CS165CU sensor
+WIDTH, HEIGHT = 1440, 1080
+# Timestamp strip: BITS blocks of (WIDTH // BITS) x STRIP_HEIGHT pixels, white = 1, most significant bit first
+BITS = 32
+STRIP_HEIGHT = 24
+RUN_SECONDS = 20
+
+
+class SyntheticCamera:
+    """Camera stand-in producing a moving gradient with the acquisition time (ms, 32 bit) encoded at the top"""
+
+    def __init__(self, cam_id, width, height, framerate):
+        self.id = cam_id
+        self.framerate = framerate
+        self.streamOn = True
+        self._block_width = width // BITS
+        y, x = np.mgrid[0:height, 0:width]
+        self._background = ((x + y) % 256).astype(np.uint8)
+        self._frame = np.empty((height, width), dtype=np.uint8)
+        self._count = 0
+
+    def get_frame(self):
+        self._count += 1
+        np.add(self._background, (4 * self._count) % 256, out=self._frame, casting='unsafe')
+        stamp = int(time.time() * 1000) & 0xFFFFFFFF
+        for bit in range(BITS):
+            value = 255 if (stamp >> (BITS - 1 - bit)) & 1 else 0
+            self._frame[:STRIP_HEIGHT, bit * self._block_width:(bit + 1) * self._block_width] = value
+        return self._frame
+
+    def get_sensor_frame_rate(self):
+        return None
+
+
+PAGE = """<!DOCTYPE html>
+<html><body style="background:#222;color:#ddd;font-family:monospace">
+<div id="status">starting</div>
+<img id="view" style="max-width:480px">
+<script>
+const params = new URLSearchParams(location.search);
+const mode = params.get('mode') || 'ws';
+const seconds = Number(params.get('seconds') || %(seconds)d);
+const bits = %(bits)d, stripHeight = %(strip_height)d;
+const query = 'width=' + (params.get('width') || '') + '&fps=' + (params.get('fps') || '');
+const img = document.getElementById('view');
+const canvas = document.createElement('canvas');
+const ctx = canvas.getContext('2d', {willReadFrequently: true});
+const latencies = [];
+let handlerMs = 0, longTasks = 0, lastStamp = null, prevUrl = null, t0 = null;
+
+new PerformanceObserver(list => { longTasks += list.getEntries().length; }).observe({entryTypes: ['longtask']});
+
+function decode() {
+    // reads the timestamp strip of the currently displayed frame
+    const w = img.naturalWidth, h = Math.round(stripHeight * img.naturalWidth / %(width)d);
+    if (!w) return null;
+    canvas.width = w; canvas.height = h;
+    ctx.drawImage(img, 0, 0, w, h, 0, 0, w, h);
+    const row = ctx.getImageData(0, Math.floor(h / 2), w, 1).data;
+    let stamp = 0;
+    for (let bit = 0; bit < bits; bit++) {
+        const x = Math.floor((bit + 0.5) * w / bits);
+        stamp = (stamp * 2) + (row[4 * x] > 127 ? 1 : 0);
+    }
+    return stamp;
+}
+
+function onFrame() {
+    const start = performance.now();
+    const stamp = decode();
+    if (stamp !== null && stamp !== lastStamp) {
+        lastStamp = stamp;
+        let latency = (Date.now() %% 4294967296) - stamp;
+        if (latency < -2147483648) latency += 4294967296;
+        latencies.push(latency);
+    }
+    handlerMs += performance.now() - start;
+}
+
+async function finish(close) {
+    close();
+    const elapsed = (performance.now() - t0) / 1000;
+    latencies.sort((a, b) => a - b);
+    const pick = q => latencies[Math.min(latencies.length - 1, Math.floor(q * latencies.length))];
+    const result = {mode: mode, seconds: elapsed, frames: latencies.length, fps: latencies.length / elapsed,
+                    latency_median_ms: pick(0.5), latency_p95_ms: pick(0.95),
+                    handler_ms_per_s: handlerMs / elapsed, long_tasks: longTasks};
+    document.getElementById('status').textContent = JSON.stringify(result);
+    await fetch('/transport_benchmark/result', {method: 'POST', body: JSON.stringify(result),
+                                                headers: {'Content-Type': 'application/json'}});
+}
+
+async function run() {
+    await fetch('/transport_benchmark/start?mode=' + mode, {method: 'POST'});
+    t0 = performance.now();
+    document.getElementById('status').textContent = 'running ' + mode + ' for ' + seconds + ' s';
+    if (mode === 'ws') {
+        const ws = new WebSocket('ws://' + location.host + '/bench_stream?' + query);
+        ws.binaryType = 'blob';
+        ws.onmessage = event => {
+            // same work as the clientside callbacks: Blob -> object URL -> <img>
+            const start = performance.now();
+            const url = URL.createObjectURL(new Blob([event.data], {type: 'image/jpeg'}));
+            if (prevUrl) URL.revokeObjectURL(prevUrl);
+            prevUrl = url;
+            img.src = url;
+            handlerMs += performance.now() - start;
+        };
+        img.onload = onFrame;
+        setTimeout(() => finish(() => ws.close()), seconds * 1000);
+    } else {
+        img.src = '/bench_stream.mjpg?' + query;
+        // an MJPEG <img> fires no event per frame; sample the displayed frame every animation frame
+        let polling = true;
+        const poll = () => { if (polling) { onFrame(); requestAnimationFrame(poll); } };
+        requestAnimationFrame(poll);
+        setTimeout(() => finish(() => { polling = false; img.src = ''; }), seconds * 1000);
+    }
+}
+run();
+</script></body></html>
+"""
+
+_run_started = {}
+
+
+@webcam_server.route('/transport_benchmark')
+async def benchmark_page():
+    return PAGE % {'seconds': RUN_SECONDS, 'bits': BITS, 'strip_height': STRIP_HEIGHT, 'width': WIDTH}
+
+
+@webcam_server.route('/transport_benchmark/start', methods=['POST'])
+async def benchmark_start():
+    _run_started[request.args.get('mode')] = time.process_time()
+    return jsonify({})
+
+
+@webcam_server.route('/transport_benchmark/result', methods=['POST'])
+async def benchmark_result():
+    result = await request.get_json()
+    started = _run_started.pop(result['mode'], None)
+    server_cpu = (time.process_time() - started) / result['seconds'] * 100 if started is not None else float('nan')
+    print(f"{result['mode']:>5}: {result['fps']:.1f} fps displayed, latency median "
+          f"{result['latency_median_ms']} ms / p95 {result['latency_p95_ms']} ms, page handlers "
+          f"{result['handler_ms_per_s']:.1f} ms/s, {result['long_tasks']} long tasks, server CPU {server_cpu:.0f} %")
+    return jsonify({})
+
+
+async def main(fps, width):
+    camera = SyntheticCamera('bench_camera', WIDTH, HEIGHT, fps)
+    WebcamStreamer(camera, '/bench_stream')
+    config = Config()
+    config.bind = [f"{HOST}:{PORT}"]
+    base = f"http://{HOST}:{PORT}/transport_benchmark?fps={fps}&width={width or ''}"
+    print(f"Frame {WIDTH}x{HEIGHT} at {fps} fps, output width {width or 'full'}, {RUN_SECONDS} s per run")
+    print(f"Websocket run: {base}&mode=ws")
+    print(f"MJPEG run:     {base}&mode=mjpeg")
+    await serve(webcam_server, config)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 20,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else None))
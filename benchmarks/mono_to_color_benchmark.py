@@ -0,0 +1,92 @@
+"""
+Compares the host-side NumPy/OpenCV mono to color path with the SDK MonoToColorProcessor on identical synthetic
+Bayer frames of our sensor size.
+
+The SDK path is only timed where the mono to color DLLs can be loaded; the host path runs everywhere.
+
+Usage: python benchmarks/mono_to_color_benchmark.py [repeats]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'thorlabs_tsi_sdk-0.0.8'))  # SDK package shipped with the repository
+from thorlabs_tsi_sdk.tl_color_enums import FILTER_ARRAY_PHASE
+from thorlabs_tsi_sdk.tl_mono_to_color_host import HostMonoToColorProcessor
+import thorlabs_tsi_sdk.tl_mono_to_color_host as host_module
+
+DLL_DIR = "C:\\Users\\CavLev\\Documents\\Qavity\\dll"
+# CS165CU sensor
+WIDTH, HEIGHT = 1440, 1080
+BIT_DEPTH = 10
+PHASE = FILTER_ARRAY_PHASE.BAYER_RED
+# Neutral matrices, so both paths only differ by demosaic algorithm and rounding
+COLOR_CORRECTION = np.eye(3).ravel()
+WHITE_BALANCE = np.eye(3).ravel()
+
+
+def synthetic_frame(width, height, bit_depth, seed=0):
+    """Smooth color gradients sampled through an RGGB mosaic, plus noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    full_scale = 2 ** bit_depth - 1
+    red = 0.2 + 0.7 * x / width
+    green = 0.2 + 0.7 * y / height
+    blue = 0.5 + 0.4 * np.sin(2 * np.pi * x / width)
+    mosaic = np.where(y % 2 == 0, np.where(x % 2 == 0, red, green), np.where(x % 2 == 0, green, blue))
+    mosaic = mosaic * full_scale + rng.normal(0, 0.005 * full_scale, mosaic.shape)
+    return np.clip(mosaic, 0, full_scale).astype(np.uint16).ravel()
+
+
+def time_call(func, repeats):
+    func()  # warm-up, allocates intermediate buffers
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+
+def main(repeats=20):
+    frame = synthetic_frame(WIDTH, HEIGHT, BIT_DEPTH)
+    print(f"Frame {WIDTH}x{HEIGHT}, {BIT_DEPTH} bit, {repeats} repeats")
+
+    host = HostMonoToColorProcessor(PHASE, COLOR_CORRECTION, WHITE_BALANCE, BIT_DEPTH)
+    out_24 = np.empty(WIDTH * HEIGHT * 3, dtype=np.uint8)
+    out_48 = np.empty(WIDTH * HEIGHT * 3, dtype=np.uint16)
+    demosaic = 'OpenCV' if host._use_opencv else 'NumPy'
+    for name, func in (('24 bpp', lambda: host.transform_to_24(frame, WIDTH, HEIGHT, out_24)),
+                       ('48 bpp', lambda: host.transform_to_48(frame, WIDTH, HEIGHT, out_48))):
+        print(f"Host ({demosaic} demosaic), {name}: {time_call(func, repeats) * 1e3:.1f} ms per frame")
+    if host_module.cv2 is not None:
+        host._use_opencv = False
+        t_numpy = time_call(lambda: host.transform_to_24(frame, WIDTH, HEIGHT, out_24), repeats)
+        print(f"Host (NumPy demosaic), 24 bpp: {t_numpy * 1e3:.1f} ms per frame")
+        host._use_opencv = True
+        host.transform_to_24(frame, WIDTH, HEIGHT, out_24)
+
+    try:
+        if hasattr(os, 'add_dll_directory') and os.path.isdir(DLL_DIR):
+            os.add_dll_directory(DLL_DIR)
+        from thorlabs_tsi_sdk.tl_camera_enums import SENSOR_TYPE
+        from thorlabs_tsi_sdk.tl_mono_to_color_processor import MonoToColorProcessorSDK
+        sdk = MonoToColorProcessorSDK()
+    except Exception as e:
+        print(f"SDK path skipped: {e}")
+        return
+
+    with sdk, sdk.create_mono_to_color_processor(SENSOR_TYPE.BAYER, PHASE, COLOR_CORRECTION, WHITE_BALANCE,
+                                                 BIT_DEPTH) as processor:
+        for name, func in (('24 bpp', lambda: processor.transform_to_24(frame, WIDTH, HEIGHT)),
+                           ('48 bpp', lambda: processor.transform_to_48(frame, WIDTH, HEIGHT))):
+            print(f"SDK, {name}: {time_call(func, repeats) * 1e3:.1f} ms per frame")
+
+        diff = np.abs(processor.transform_to_24(frame, WIDTH, HEIGHT).astype(np.int16) - out_24.astype(np.int16))
+        print(f"24 bpp |SDK - host|: median {np.median(diff):.1f}, 99th percentile {np.percentile(diff, 99):.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
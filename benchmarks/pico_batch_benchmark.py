@@ -0,0 +1,98 @@
+"""
+Scaling of PicoBatchProcessor with the number of worker processes, without a scope.
+
+A synthetic ChunkStore measurement set (a noisy sine per channel, as written by run_multi_block_acquisition) is
+created in data_dir and reduced with the given reducer using 1, 2, 4, ... up to the number of CPUs workers. For
+each worker count the wall time, chunks/s, input throughput (MB/s of int16 samples) and the speedup over a single
+process are printed. Run it twice to see the effect of a warm page cache.
+
+Usage: python benchmarks/pico_batch_benchmark.py [data_dir] [chunks] [samples] [reducer]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from controllers.analysis.PicoBatchProcessor import PicoBatchProcessor
+from controllers.picoscope.ChunkStore import ChunkStoreWriter
+
+CHANNELS = ['A', 'B']
+SAMPLE_RATE = 62.5e6
+RANGE = 1.0
+MAX_ADC = 32767
+
+
+def create_measurement_set(measurement_dir, num_chunks, num_samples):
+    """Write a ChunkStore set with metadata like run_multi_block_acquisition does; returns the metadata path"""
+    os.makedirs(measurement_dir, exist_ok=True)
+    name = 'benchmark'
+    rng = np.random.default_rng(0)
+    t = np.arange(num_samples) / SAMPLE_RATE
+    store = ChunkStoreWriter(os.path.join(measurement_dir, name), CHANNELS, num_samples)
+    chunk = np.empty((len(CHANNELS), num_samples), dtype=np.int16)
+    for i in range(num_chunks):
+        for c in range(len(CHANNELS)):
+            signal = 0.5 * np.sin(2 * np.pi * 1e6 * (c + 1) * t + i) + rng.normal(0, 0.05, num_samples)
+            chunk[c] = np.clip(signal / RANGE * MAX_ADC, -MAX_ADC, MAX_ADC)
+        store.append(chunk, trigger_time=i * 1e-3)
+    store.close()
+
+    metadata = {
+        'ActualSamplingFrequency, Hz': SAMPLE_RATE,
+        'RequestedNumberOfSamples': num_samples,
+        'MaxADC': MAX_ADC,
+        'EnabledChannels': CHANNELS,
+        'MeasurementSetName': name,
+        'NumberOfChunks': num_chunks,
+        'StorageFormat': 'ChunkStore',
+        'DataFile': os.path.basename(store.data_path),
+        'IndexFile': os.path.basename(store.index_path),
+    }
+    for channel in CHANNELS:
+        metadata[channel] = {'Range, V': RANGE, 'Coupling': 'DC', 'Offset, V': 0.0}
+    metadata_path = os.path.join(measurement_dir, f'{name}_metadata.json')
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent='\t')
+    return metadata_path
+
+
+def main(data_dir, num_chunks, num_samples, reducer):
+    measurement_dir = os.path.join(data_dir, 'pico_batch_benchmark')
+    metadata_path = create_measurement_set(measurement_dir, num_chunks, num_samples)
+    input_mb = num_chunks * len(CHANNELS) * num_samples * 2 / 1e6
+    print(f"{num_chunks} chunks x {len(CHANNELS)} channels x {num_samples} samples ({input_mb:.0f} MB), "
+          f"reducer '{reducer}', {os.cpu_count()} CPUs")
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != os.cpu_count():
+        worker_counts.append(os.cpu_count())
+
+    try:
+        baseline = None
+        reference = None
+        for workers in worker_counts:
+            processor = PicoBatchProcessor(metadata_path, reducer, workers=workers)
+            table = processor.run()
+            baseline = baseline or processor.elapsed
+            # every worker count must give the same table
+            if reference is None:
+                reference = table
+            else:
+                assert all(np.allclose(reference[k], table[k]) for k in reference), "results differ"
+            print(f"{workers:3d} workers: {processor.elapsed:7.2f} s, {num_chunks / processor.elapsed:7.1f} chunks/s, "
+                  f"{input_mb / processor.elapsed:7.0f} MB/s, speedup {baseline / processor.elapsed:5.2f}")
+    finally:
+        shutil.rmtree(measurement_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else tempfile.gettempdir(),
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 1_000_000,
+         sys.argv[4] if len(sys.argv) > 4 else 'psd')
@@ -0,0 +1,81 @@
+"""
+Sustained write throughput of PicoScope streaming data, without a scope.
+
+Synthetic int16 (channels, samples) blocks are pushed as fast as possible, the way the driver callback receives
+them, through:
+- 'tofile': the previous callback, writing each block synchronously (with a .T transpose for several channels),
+- 'interleaved' / 'channels_first': StreamWriter, where the callback only stages the block and a writer thread
+  issues large writes to a preallocated file.
+
+For each method the sustained throughput (MB/s and MS/s per channel) is compared with what the scope produces at
+the given streaming rate, together with the time the callback is blocked per block (median / max), which is what
+delays the next getStreamingLatestValues poll.
+
+Usage: python benchmarks/pico_stream_write_benchmark.py [data_dir] [channels] [rate_MSps] [seconds]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from controllers.picoscope.StreamWriter import StreamWriter
+
+# Samples per channel delivered per callback (a few ms of data at MS/s rates)
+BLOCK_SAMPLES = 100_000
+
+
+def run(method, file_path, blocks, num_channels, total_samples):
+    callback_times = []
+    t_start = time.perf_counter()
+    if method == 'tofile':
+        with open(file_path, 'wb') as f:
+            for i in range(total_samples // BLOCK_SAMPLES):
+                block = blocks[i % len(blocks)]
+                t_call = time.perf_counter()
+                if num_channels == 1:
+                    block[0].tofile(f)
+                else:
+                    block.T.tofile(f)
+                callback_times.append(time.perf_counter() - t_call)
+        dropped = 0
+    else:
+        writer = StreamWriter(file_path, num_channels, total_samples, layout=method)
+        for i in range(total_samples // BLOCK_SAMPLES):
+            block = blocks[i % len(blocks)]
+            t_call = time.perf_counter()
+            # wait while the staging ring is full, so the benchmark measures the writer and loses no data
+            writer.put(block, blocking=True)
+            callback_times.append(time.perf_counter() - t_call)
+        writer.close()
+        dropped = writer.dropped_samples
+    elapsed = time.perf_counter() - t_start
+    os.remove(file_path)
+    return elapsed, np.array(callback_times), dropped
+
+
+def main(data_dir, num_channels, rate_msps, seconds):
+    total_samples = int(rate_msps * 1e6 * seconds) // BLOCK_SAMPLES * BLOCK_SAMPLES
+    rng = np.random.default_rng(0)
+    blocks = [rng.integers(-32000, 32000, (num_channels, BLOCK_SAMPLES), dtype=np.int16) for _ in range(8)]
+    required = rate_msps * 1e6 * num_channels * 2 / 1e6
+    print(f"{num_channels} channels at {rate_msps} MS/s: the scope produces {required:.0f} MB/s, "
+          f"{total_samples * num_channels * 2 / 1e6:.0f} MB per run, writing to {data_dir}")
+
+    for method in ('tofile', 'interleaved', 'channels_first'):
+        file_path = os.path.join(data_dir, f'pico_write_benchmark_{method}.bin')
+        elapsed, callback_times, dropped = run(method, file_path, blocks, num_channels, total_samples)
+        throughput = total_samples * num_channels * 2 / elapsed / 1e6
+        verdict = 'keeps up' if throughput >= required else 'TOO SLOW'
+        print(f"{method:>15}: {throughput:8.0f} MB/s ({total_samples / elapsed / 1e6:6.1f} MS/s per channel, "
+              f"{verdict}), callback median {1e3 * np.median(callback_times):.2f} ms / "
+              f"max {1e3 * callback_times.max():.2f} ms, dropped {dropped}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else tempfile.gettempdir(),
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 31.25,
+         float(sys.argv[4]) if len(sys.argv) > 4 else 5)
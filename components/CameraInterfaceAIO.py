@@ -1,6 +1,8 @@
-from dash import html, Input, Output, MATCH, callback, callback_context
+from dash import html, dcc, Input, Output, MATCH, callback, callback_context
 import uuid
 import json
+import os
+from datetime import datetime
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
 from dash_iconify import DashIconify
@@ -40,6 +42,41 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
             'subcomponent': 'hidden_div',
             'aio_id': aio_id
         }
+        stream_stats = lambda aio_id: {
+            'component': 'CameraInterfaceAIO',
+            'subcomponent': 'stream_stats',
+            'aio_id': aio_id
+        }
+        stats_interval = lambda aio_id: {
+            'component': 'CameraInterfaceAIO',
+            'subcomponent': 'stats_interval',
+            'aio_id': aio_id
+        }
+        averaging_mode_select = lambda aio_id: {
+            'component': 'CameraInterfaceAIO',
+            'subcomponent': 'averaging_mode_select',
+            'aio_id': aio_id
+        }
+        averaging_frames_input = lambda aio_id: {
+            'component': 'CameraInterfaceAIO',
+            'subcomponent': 'averaging_frames_input',
+            'aio_id': aio_id
+        }
+        capture_dark_btn = lambda aio_id: {
+            'component': 'CameraInterfaceAIO',
+            'subcomponent': 'capture_dark_btn',
+            'aio_id': aio_id
+        }
+        clear_dark_btn = lambda aio_id: {
+            'component': 'CameraInterfaceAIO',
+            'subcomponent': 'clear_dark_btn',
+            'aio_id': aio_id
+        }
+        save_average_btn = lambda aio_id: {
+            'component': 'CameraInterfaceAIO',
+            'subcomponent': 'save_average_btn',
+            'aio_id': aio_id
+        }
 
     # Make the ids class a public class
     ids = ids
@@ -47,6 +84,8 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
     # Class level storage for device instances
     # Maps aio_id to (camera, streamer) pairs
     _devices = {}
+    # Maps aio_id to (accumulator, save directory) for cameras with frame averaging
+    _accumulators = {}
 
     # Define the arguments of the All-in-One component
     def __init__(
@@ -56,7 +95,10 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
         camera=None,
         streamer = None,
         name = None,
-        placeholder=None
+        placeholder=None,
+        stream_url=None,
+        accumulator=None,
+        save_dir='.'
     ):
         # If aio_id is not provided, use a generated id
         if aio_id is None:
@@ -66,6 +108,8 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
                 CameraInterfaceAIO._devices[aio_id] = (camera, streamer)
             else:
                 raise Exception('Camera AND streamer must be specified')
+        if accumulator is not None:
+            CameraInterfaceAIO._accumulators[aio_id] = (accumulator, save_dir)
         if placeholder is not None:
             self._placeholder = placeholder
 
@@ -89,7 +133,7 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
                              rightSection=dmc.NumberInput(value=default_exp, debounce=True,
                                                           suffix=' ms', w=100,
                                                           id=self.ids.exposureControlInput(aio_id))),
-            ]),
+            ] + (self._averaging_menu(aio_id, accumulator) if accumulator is not None else [])),
     ],closeOnItemClick=False, closeOnClickOutside=True)
         menu = dmc.CardSection([
             dmc.Text(name, size='xl'),
@@ -108,10 +152,16 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
             print("CAMERA NOT FOUND - USING PLACEHOLDER")
             camera_screen = html.Img(src=self._placeholder, id=self.ids.htmlImg(aio_id),
                                      **htmlImg_props)
+        elif stream_url is not None:
+            # MJPEG transport: the browser reads the multipart stream itself, no websocket or callbacks per frame
+            camera_screen = html.Img(src=stream_url, id=self.ids.htmlImg(aio_id), **htmlImg_props)
         else:
             camera_screen = html.Img(id=self.ids.htmlImg(aio_id), **htmlImg_props)
         # Hidden Div to mitigate problems with callbacks without Output
         hidden_div = html.Div([], id=self.ids.hidden_div(aio_id), style={'display': 'none'})
+        # Stream statistics (achieved fps, encode and send time) refreshed once per second
+        stream_stats = dmc.Text('', size='xs', c='dimmed', id=self.ids.stream_stats(aio_id))
+        stats_interval = dcc.Interval(id=self.ids.stats_interval(aio_id), interval=1000, n_intervals=0)
         #%% LAYOUT DEFINITION
         # layout = dmc.Flex([],
         #                   direction='column',
@@ -123,9 +173,34 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
             children=[],
             style={'width': '400px', 'padding': 'xs', 'margin': '10px'}
         )
-        layout.children = [menu, camera_screen, hidden_div]
+        layout.children = [menu, camera_screen, stream_stats, stats_interval, hidden_div]
         super().__init__(layout)
 
+    def _averaging_menu(self, aio_id, accumulator):
+        """Menu entries controlling the frame accumulator"""
+        return [
+            dmc.MenuDivider(),
+            dmc.MenuLabel("Averaging"),
+            dmc.MenuItem("Mode:",
+                         rightSection=dmc.Select(data=[{'value': 'off', 'label': 'Off'},
+                                                       {'value': 'mean', 'label': 'Running mean'},
+                                                       {'value': 'ema', 'label': 'Moving average (EMA)'},
+                                                       {'value': 'boxcar', 'label': 'Last N frames'}],
+                                                 value=accumulator.mode, w=160,
+                                                 id=self.ids.averaging_mode_select(aio_id))),
+            dmc.MenuItem("Frames (N):",
+                         rightSection=dmc.NumberInput(value=accumulator.frames, min=1, max=1000, debounce=True,
+                                                      w=100, id=self.ids.averaging_frames_input(aio_id))),
+            dmc.MenuItem(dmc.ButtonGroup([
+                dmc.Button('Capture dark', size='xs', variant='outline', n_clicks=0,
+                           id=self.ids.capture_dark_btn(aio_id)),
+                dmc.Button('Clear dark', size='xs', variant='outline', color='red', n_clicks=0,
+                           id=self.ids.clear_dark_btn(aio_id)),
+                dmc.Button('Save', size='xs', variant='outline', color='green', n_clicks=0,
+                           id=self.ids.save_average_btn(aio_id)),
+            ])),
+        ]
+
     @staticmethod
     def get_aio_id_from_trigger():
         """Extract aio_id from the component that triggered the callback"""
@@ -191,3 +266,96 @@ class CameraInterfaceAIO(html.Div):  # html.Div will be the "parent" component
         camera.set_exposure_ms(exposure)
         print(f'Camera {aio_id}: exposure set to {exposure}')
         return ''
+
+    @callback(
+        Output(ids.stream_stats(MATCH), 'children'),
+        Input(ids.stats_interval(MATCH), 'n_intervals'),
+        prevent_initial_call=True
+    )
+    def update_stream_stats(n_intervals):
+        """Show the achieved frame rate and per-frame timings reported by the streamer"""
+        aio_id = CameraInterfaceAIO.get_aio_id_from_trigger()
+        try:
+            camera, streamer = CameraInterfaceAIO._devices[aio_id]
+        except Exception:
+            return ''
+        if not camera.streamOn:
+            return 'Stream stopped'
+        stats = streamer.stats
+        sensor = f"{stats['sensor_fps']:.1f}" if stats['sensor_fps'] else '?'
+        text = (f"{stats['fps']:.1f}/{stats['target_fps']} fps (sensor {sensor}) | "
+                f"acquire {stats['acquire_ms']:.1f} ms | encode {stats['encode_ms']:.1f} ms | "
+                f"send {stats['send_ms']:.1f} ms | late {stats['late_frames']} | variants {stats['variants']}")
+        if aio_id in CameraInterfaceAIO._accumulators:
+            accumulator, _ = CameraInterfaceAIO._accumulators[aio_id]
+            text += f" | averaging: {accumulator.status()}"
+        return text
+
+    @callback(
+        Output(ids.hidden_div(MATCH), 'children', allow_duplicate=True),
+        Input(ids.averaging_mode_select(MATCH), 'value'),
+        Input(ids.averaging_frames_input(MATCH), 'value'),
+        prevent_initial_call=True
+    )
+    def set_averaging(mode, frames):
+        """Select the averaging mode and number of frames"""
+        aio_id = CameraInterfaceAIO.get_aio_id_from_trigger()
+        try:
+            accumulator, _ = CameraInterfaceAIO._accumulators[aio_id]
+            accumulator.configure(mode=mode, frames=frames)
+        except Exception as e:
+            print(f'Camera {aio_id}: could not set averaging: {e}')
+            return ''
+        print(f'Camera {aio_id}: averaging set to {mode}, {frames} frames')
+        return ''
+
+    @callback(
+        Output(ids.hidden_div(MATCH), 'children', allow_duplicate=True),
+        Input(ids.capture_dark_btn(MATCH), 'n_clicks'),
+        prevent_initial_call=True
+    )
+    def capture_dark(n_clicks):
+        """Average the next frames into the dark frame (block the light first)"""
+        aio_id = CameraInterfaceAIO.get_aio_id_from_trigger()
+        try:
+            accumulator, _ = CameraInterfaceAIO._accumulators[aio_id]
+        except Exception as e:
+            print(f'Camera has no averaging: {e}')
+            return ''
+        accumulator.capture_dark()
+        print(f'Camera {aio_id}: capturing dark frame')
+        return ''
+
+    @callback(
+        Output(ids.hidden_div(MATCH), 'children', allow_duplicate=True),
+        Input(ids.clear_dark_btn(MATCH), 'n_clicks'),
+        prevent_initial_call=True
+    )
+    def clear_dark(n_clicks):
+        aio_id = CameraInterfaceAIO.get_aio_id_from_trigger()
+        try:
+            accumulator, _ = CameraInterfaceAIO._accumulators[aio_id]
+        except Exception as e:
+            print(f'Camera has no averaging: {e}')
+            return ''
+        accumulator.clear_dark()
+        print(f'Camera {aio_id}: dark frame cleared')
+        return ''
+
+    @callback(
+        Output(ids.hidden_div(MATCH), 'children', allow_duplicate=True),
+        Input(ids.save_average_btn(MATCH), 'n_clicks'),
+        prevent_initial_call=True
+    )
+    def save_average(n_clicks):
+        """Save the averaged image as float32 .npy"""
+        aio_id = CameraInterfaceAIO.get_aio_id_from_trigger()
+        try:
+            accumulator, save_dir = CameraInterfaceAIO._accumulators[aio_id]
+            file_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{aio_id}_{accumulator.mode}.npy"
+            saved = accumulator.save(os.path.join(save_dir, file_name))
+        except Exception as e:
+            print(f'Camera {aio_id}: could not save averaged image: {e}')
+            return ''
+        print(f'Camera {aio_id}: averaged image saved to {saved}' if saved else f'Camera {aio_id}: no image to save')
+        return ''
@@ -4,8 +4,9 @@ import json
 import dash_mantine_components as dmc
 import dash_core_components as dcc
 
-from controllers.sinara.run_artiq_script import run_artiq_in_clang64_visible
 from config import config, update_config
+from controllers.sinara.SinaraCommandQueue import sinara_queue
+from controllers.utils.JobManager import Job
 
 # All-in-One Components should be suffixed with 'AIO'
 class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
@@ -72,6 +73,22 @@ class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
             'subcomponent': 'update_status',
             'aio_id': aio_id
         }
+        # Sinara job of the last Ramp / Single tone, polled while it is queued or running
+        job_store = lambda aio_id: {
+            'component': 'CavityDriveAIO',
+            'subcomponent': 'job_store',
+            'aio_id': aio_id
+        }
+        job_interval = lambda aio_id: {
+            'component': 'CavityDriveAIO',
+            'subcomponent': 'job_interval',
+            'aio_id': aio_id
+        }
+        job_status = lambda aio_id: {
+            'component': 'CavityDriveAIO',
+            'subcomponent': 'job_status',
+            'aio_id': aio_id
+        }
         # Storage to keep device properties
         module_props_store = lambda aio_id: {
             'component': 'CavityDriveAIO',
@@ -172,6 +189,11 @@ class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
             dmc.Button('Ramp', id=self.ids.scan_freq_btn(aio_id)),
             dmc.Button('Single tone', id=self.ids.constant_output_btn(aio_id)),
         ], justify='center', align='flex-end', direction='row', py='xs', gap='xl')
+        job_row = dmc.Flex([
+            dcc.Store(id=self.ids.job_store(aio_id), data=None),
+            dcc.Interval(id=self.ids.job_interval(aio_id), interval=500, disabled=True),
+            dmc.Text('Idle', size='sm', id=self.ids.job_status(aio_id)),
+        ], justify='center', direction='row')
         info_row = dmc.Flex([
             dmc.NumberInput(value=tem00_tem01_spacing, label='TEM01-TEM00 spacing', suffix=' kHz',
                             w=150, debounce=True, radius=3, allowDecimal=True, decimalScale=2,
@@ -190,6 +212,7 @@ class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
             output_row,
             ramp_row,
             control_row,
+            job_row,
             dmc.Divider(mt='xs', mb='xs'),
             info_row,
             hidden_status,
@@ -338,6 +361,8 @@ class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
 
     @callback(
         Output(ids.update_status(MATCH), "children", allow_duplicate=True),
+        Output(ids.job_store(MATCH), "data", allow_duplicate=True),
+        Output(ids.job_interval(MATCH), "disabled", allow_duplicate=True),
         Input(ids.constant_output_btn(MATCH), "n_clicks"),
         State(ids.output_updated(MATCH), "checked"),
         running=[(Output(ids.constant_output_btn(MATCH), "loading"), True, False)],
@@ -345,20 +370,21 @@ class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
     )
     def run_singletone(n_clicks, script_isuptodate):
         """
-        Runs Artiq script for using Mirny as single constant tone output generator
+        Queues Artiq script for using Mirny as single constant tone output generator.
+        Returns immediately; the job is polled by poll_job.
         :param script_isuptodate:
         :return:
         """
         if not script_isuptodate:
             print("Must update script before running")
-            return ""
+            return "", no_update, no_update
         else:
             # Get the aio_id from the triggered component
             aio_id = CavityDriveAIO.get_aio_id_from_trigger()
             # Get the device and channel
             device, ch = CavityDriveAIO._devices[aio_id]
-            run_artiq_in_clang64_visible(device.freq_gen_path)
-            return "Success"
+            job = device.run_freq_gen_script()
+            return "Queued", {'job_id': job.id}, False
 
     # RAMP CALLBACKS
     @callback(
@@ -432,6 +458,8 @@ class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
         Output(ids.curr_freq_ctrl(MATCH), "value", allow_duplicate=True),
         Output(ids.end_freq_ctrl(MATCH), "value", allow_duplicate=True),
         Output(ids.output_updated(MATCH), "checked", allow_duplicate=True),
+        Output(ids.job_store(MATCH), "data", allow_duplicate=True),
+        Output(ids.job_interval(MATCH), "disabled", allow_duplicate=True),
         Input(ids.scan_freq_btn(MATCH), "n_clicks"),
         State(ids.output_updated(MATCH), "checked"),
         running=[(Output(ids.scan_freq_btn(MATCH), "disabled"), True, False)],
@@ -440,19 +468,41 @@ class CavityDriveAIO(html.Div):  # html.Div will be the "parent" component
     def run_ramp(n_clicks, script_isuptodate):
         if not script_isuptodate:
             print("Must update script before running")
-            return  no_update
+            return  no_update, no_update, no_update, no_update, no_update
         else:
             # Get the aio_id from the triggered component
             aio_id = CavityDriveAIO.get_aio_id_from_trigger()
             # Get the device and channel
             device, ch = CavityDriveAIO._devices[aio_id]
-            run_artiq_in_clang64_visible(device.freq_ramp_path)
+            job = device.run_freq_ramp_script()
             ramp_starting_freq = device.ramp_params["Starting frequency kHz"]
             ramp_ending_freq = device.ramp_params["Ending frequency kHz"]
-            return [ramp_starting_freq, ramp_ending_freq, True]
+            return [ramp_starting_freq, ramp_ending_freq, True, {'job_id': job.id}, False]
 
             # # Swaps the role of starting frequency and ending frequency in case
             # # one wants to immediately scan back
             # return [ramp_ending_freq, ramp_starting_freq, False]
 
-
+    @callback(
+        Output(ids.job_status(MATCH), "children"),
+        Output(ids.job_interval(MATCH), "disabled", allow_duplicate=True),
+        Input(ids.job_interval(MATCH), "n_intervals"),
+        State(ids.job_store(MATCH), "data"),
+        prevent_initial_call=True
+    )
+    def poll_job(n_intervals, job_info):
+        """Shows the state of the last Sinara job; stops polling once it finished"""
+        if not job_info:
+            return no_update, True
+        job = sinara_queue.get(job_info['job_id'])
+        if job is None:
+            return 'Job not found', True
+        status = job.as_dict()
+        if job.status == Job.PENDING:
+            waiting = [pending.id for pending in sinara_queue.pending()]
+            position = waiting.index(job.id) + 1 if job.id in waiting else 0
+            return f"{status['name']}: queued ({position} of {len(waiting)})", False
+        text = f"{status['name']}: {status['status']} ({status['elapsed']:.1f} s) {status['message']}"
+        if status['error']:
+            text = f"{status['name']}: failed: {status['error']}"
+        return text, job.is_finished
@@ -1,11 +1,14 @@
-from dash import html, callback, Input, Output, State, MATCH, ALL, callback_context
+from dash import html, callback, clientside_callback, Input, Output, State, MATCH, ALL, callback_context, no_update
+from dash.exceptions import PreventUpdate
 import uuid
 import json
 import dash_core_components as dcc
 import dash_mantine_components as dmc
+from dash_extensions import WebSocket
 from config import config  # Import the config
 
 from controllers.picoscope.ps5000a_wrapper import PicoInterface
+from controllers.utils.JobManager import job_manager, Job
 
 
 # All-in-One Components should be suffixed with 'AIO'
@@ -91,10 +94,92 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
             'subcomponent': 'data_comments',
             'aio_id': aio_id
         }
+        rapid_block = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'rapid_block',
+            'aio_id': aio_id
+        }
+        group_acquire = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'group_acquire',
+            'aio_id': aio_id
+        }
+        job_store = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'job_store',
+            'aio_id': aio_id
+        }
+        job_interval = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'job_interval',
+            'aio_id': aio_id
+        }
+        job_progress = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'job_progress',
+            'aio_id': aio_id
+        }
+        job_status = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'job_status',
+            'aio_id': aio_id
+        }
+        cancel_btn = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'cancel_btn',
+            'aio_id': aio_id
+        }
+        live_ws = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'live_ws',
+            'aio_id': aio_id
+        }
+        live_graph = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'live_graph',
+            'aio_id': aio_id
+        }
+        down_sample_mode = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'down_sample_mode',
+            'aio_id': aio_id
+        }
+        down_sample_ratio = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'down_sample_ratio',
+            'aio_id': aio_id
+        }
+        lockin_enable = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'lockin_enable',
+            'aio_id': aio_id
+        }
+        lockin_channel = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'lockin_channel',
+            'aio_id': aio_id
+        }
+        lockin_frequency = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'lockin_frequency',
+            'aio_id': aio_id
+        }
+        lockin_bandwidth = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'lockin_bandwidth',
+            'aio_id': aio_id
+        }
+        lockin_graph = lambda aio_id: {
+            'component': 'PicoscopeInterfaceAIO',
+            'subcomponent': 'lockin_graph',
+            'aio_id': aio_id
+        }
 
     # Class level storage for device instances
     # Maps aio_id to device
     _devices = {}
+    # Maps aio_id to the PicoGroup of the device, if it acquires together with other units
+    _groups = {}
 
     # Define the arguments of the All-in-One component
     def __init__(
@@ -102,6 +187,8 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
             aio_id=None,
             name=None,
             device=None,
+            stream_url=None,
+            group=None,
     ):
         if aio_id is None:
             aio_id = str(uuid.uuid4())
@@ -111,6 +198,9 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
 
         # Store device in class-level storage
         PicoscopeInterfaceAIO._devices[aio_id] = device
+        # The group's acquisition is only offered if it has units besides the device
+        PicoscopeInterfaceAIO._groups[aio_id] = group if group is not None and len(group.devices) > 1 else None
+        num_units = len(group.devices) if PicoscopeInterfaceAIO._groups[aio_id] is not None else 1
 
         # Load config file
         if self._device:
@@ -125,6 +215,8 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
         self.default_data_path = self.pico_config.get('data_path', 'C:/')
         self.default_msmt_name = self.pico_config.get('measurement_set_name', 'none')
         self.default_channel_props = self.pico_config.get('channels', {})
+        self.default_down_sample_mode = self.pico_config.get('down_sample_mode', 'none')
+        self.default_down_sample_ratio = self.pico_config.get('down_sample_ratio', '1')
 
         # Channel configuration
         self.channels = ['A', 'B', 'C', 'D']
@@ -221,7 +313,30 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
                         checkIconPosition="right",
                         id=self.ids.resolution(aio_id)
                     )
-                ])
+                ]),
+
+                # Driver down sampling of streams (aggregate keeps the max and min of every group)
+                dmc.Flex(children=[
+                    dmc.Select(
+                        label='Stream down sampling:',
+                        value=self.default_down_sample_mode,
+                        data=[
+                            {"value": "none", "label": "None"},
+                            {"value": "aggregate", "label": "Aggregate (min/max)"},
+                            {"value": "decimate", "label": "Decimate"},
+                            {"value": "average", "label": "Average"},
+                        ],
+                        checkIconPosition="right", w=200,
+                        id=self.ids.down_sample_mode(aio_id)
+                    ),
+                    dmc.NumberInput(
+                        value=int(self.default_down_sample_ratio),
+                        label='Ratio:',
+                        min=1, step=1, allowDecimal=False,
+                        debounce=True, hideControls=True, w=100,
+                        id=self.ids.down_sample_ratio(aio_id)
+                    ),
+                ], direction='row', align='flex-end', justify='space-between'),
             ],
             direction='column'
         )
@@ -245,17 +360,68 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
             dmc.Text('OR', size='lg', fw='500'),
             dmc.NumberInput(
                 label='Chunks:', hideControls=True, w=50, debounce=True,
-                value=1, min=1, max=1000, id=self.ids.chunks_input(aio_id)
+                value=1, min=1, max=10000, id=self.ids.chunks_input(aio_id)
             ),
+            dmc.Switch(label='Rapid block', checked=False, id=self.ids.rapid_block(aio_id)),
+            # Acquire with all units of the group, on the shared EXT trigger
+            dmc.Switch(label=f'All {num_units} units', checked=False, id=self.ids.group_acquire(aio_id),
+                       style={} if num_units > 1 else {'display': 'none'}),
             dmc.Button('Arm trigger', id=self.ids.arm_trigger_btn(aio_id))
         ], direction='row', align='flex-end', justify='space-between')
 
+        # Lock-in demodulation of one channel during streaming
+        lockin_controls = dmc.Flex([
+            dmc.Switch(label='Lock-in', checked=False, id=self.ids.lockin_enable(aio_id)),
+            dmc.Select(
+                label='Channel:', value='A', w=80,
+                data=[{"value": channel, "label": channel} for channel in self.channels],
+                id=self.ids.lockin_channel(aio_id)
+            ),
+            dmc.NumberInput(
+                label='Reference:', suffix='kHz', value=100, min=0, step=1,
+                allowDecimal=True, decimalScale=3, debounce=True, hideControls=True, w=120,
+                id=self.ids.lockin_frequency(aio_id)
+            ),
+            dmc.NumberInput(
+                label='Output rate:', suffix='kHz', value=10, min=0.001, step=1,
+                allowDecimal=True, decimalScale=3, debounce=True, hideControls=True, w=120,
+                id=self.ids.lockin_bandwidth(aio_id)
+            ),
+        ], direction='row', align='flex-end', justify='space-between', mt='sm')
+
+        # Progress of the running acquisition job, polled while a job is active
+        job_section = dmc.Flex([
+            dcc.Store(id=self.ids.job_store(aio_id), data=None),
+            dcc.Interval(id=self.ids.job_interval(aio_id), interval=500, disabled=True),
+            dmc.Progress(value=0, size='lg', w=300, id=self.ids.job_progress(aio_id)),
+            dmc.Text('Idle', size='sm', id=self.ids.job_status(aio_id)),
+            dmc.Button('Cancel', color='red', variant='outline', size='xs', disabled=True,
+                       id=self.ids.cancel_btn(aio_id))
+        ], direction='row', align='center', justify='space-between', gap='sm', mt='sm')
+
         layout.children = [
             config_store, top_bar, data_path, sampling_params,
             channel_params, dmc.Divider(mt='sm', mb='sm'), comment_field,
-            dmc.Divider(mt='sm', mb='sm'), controls
+            dmc.Divider(mt='sm', mb='sm'), controls, lockin_controls, job_section
         ]
 
+        # Live preview of the running stream (PicoDataStreamer websocket)
+        if stream_url:
+            live_preview = dmc.CardSection([
+                WebSocket(url=stream_url, id=self.ids.live_ws(aio_id)),
+                dcc.Graph(
+                    id=self.ids.live_graph(aio_id),
+                    figure={'data': [], 'layout': {'height': 250}},
+                    config={'displayModeBar': False, 'staticPlot': True}
+                ),
+                dcc.Graph(
+                    id=self.ids.lockin_graph(aio_id),
+                    figure={'data': [], 'layout': {'height': 250}},
+                    config={'displayModeBar': False, 'staticPlot': True}
+                )
+            ], withBorder=True, mt='sm')
+            layout.children.append(live_preview)
+
         super().__init__(layout)
 
     def _create_channel_controls(self):
@@ -303,6 +469,34 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
         id_dict = json.loads(triggered_id)
         return id_dict['aio_id']
 
+    @staticmethod
+    def check_device_idle(device):
+        """Raise PreventUpdate while an acquisition job of the device is unfinished, so its settings stay put"""
+        for job in job_manager.jobs(key=device.get_name()):
+            if not job.is_finished:
+                print(f"{device.get_name()} is busy with job {job.name} ({job.id}), settings not changed")
+                raise PreventUpdate
+
+    @staticmethod
+    def group_for(aio_id, use_group):
+        """The device's PicoGroup if group acquisition is selected and available, otherwise None"""
+        return PicoscopeInterfaceAIO._groups.get(aio_id) if use_group else None
+
+    @staticmethod
+    def prepare_group(group, device):
+        """Open the other units of the group and give them the settings of the device"""
+        for unit in group.devices:
+            if not unit.is_open and not unit.open():
+                raise RuntimeError(f"Could not open {unit.get_name()}")
+        channel_config = {channel: {'enabled': device.channels_enabled[channel],
+                                    'coupling': device.channel_couplings[channel],
+                                    'range': device.channel_ranges[channel],
+                                    'offset': device.channel_offsets[channel]}
+                          for channel in device.channels_enabled}
+        if not group.configure(sampling_interval=device.sampling_interval, acquisition_time=device.acquisition_time,
+                               resolution=device.resolution, channel_config=channel_config):
+            raise RuntimeError(f"Could not configure the units of {group.get_name()}")
+
     @staticmethod
     def get_channel_from_trigger():
         """Extract channel from the component that triggered the callback"""
@@ -310,6 +504,93 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
         id_dict = json.loads(triggered_id)
         return id_dict.get('channel')
 
+    # Live preview: messages are JSON, so the figure is built synchronously in the browser
+    clientside_callback(
+        """
+        function(message) {
+            if (!message || typeof message.data !== 'string') {
+                return dash_clientside.no_update;
+            }
+            const preview = JSON.parse(message.data);
+            const colors = {A: '#339af0', B: '#ff6b6b', C: '#20c997', D: '#fcc419'};
+            const traces = Object.keys(preview.channels).map(channel => ({
+                x: preview.time,
+                y: preview.channels[channel],
+                mode: 'lines',
+                name: channel,
+                type: 'scattergl',
+                line: {color: colors[channel.split('_')[0]], width: 1},
+                hoverinfo: 'none'
+            }));
+            const status = (preview.streaming ? 'Streaming' : 'Last stream') + ': ' +
+                (preview.total_samples / 1e6).toFixed(2) + ' MS at ' + (preview.sample_rate / 1e6).toFixed(3) + ' MHz';
+            return {
+                data: traces,
+                layout: {
+                    height: 250,
+                    margin: {l: 50, r: 10, t: 30, b: 40},
+                    title: {text: status, font: {size: 12}},
+                    plot_bgcolor: '#25262b',
+                    paper_bgcolor: '#25262b',
+                    font: {color: '#c1c2c5'},
+                    xaxis: {title: 'Time (s)', gridcolor: '#373A40'},
+                    yaxis: {title: 'Voltage (V)', gridcolor: '#373A40'},
+                    showlegend: false
+                }
+            };
+        }
+        """,
+        Output(ids.live_graph(MATCH), 'figure'),
+        Input(ids.live_ws(MATCH), 'message'),
+        prevent_initial_call=True
+    )
+
+    # Lock-in amplitude and phase from the same preview messages
+    clientside_callback(
+        """
+        function(message) {
+            if (!message || typeof message.data !== 'string') {
+                return dash_clientside.no_update;
+            }
+            const lockin = JSON.parse(message.data).lockin || {};
+            const names = Object.keys(lockin);
+            if (names.length === 0) {
+                return dash_clientside.no_update;
+            }
+            const colors = {A: '#339af0', B: '#ff6b6b', C: '#20c997', D: '#fcc419'};
+            const traces = [];
+            names.forEach(name => {
+                const output = lockin[name];
+                const line = {color: colors[output.channel], width: 1};
+                traces.push({x: output.time, y: output.amplitude, mode: 'lines', type: 'scattergl',
+                             name: name, line: line, hoverinfo: 'none'});
+                traces.push({x: output.time, y: output.phase, mode: 'lines', type: 'scattergl',
+                             name: name, line: line, hoverinfo: 'none', yaxis: 'y2'});
+            });
+            const title = names.map(name => name + ': ' + lockin[name].channel + ' at ' +
+                (lockin[name].reference_frequency / 1e3).toFixed(3) + ' kHz').join(', ');
+            return {
+                data: traces,
+                layout: {
+                    height: 250,
+                    margin: {l: 50, r: 10, t: 30, b: 40},
+                    title: {text: title, font: {size: 12}},
+                    plot_bgcolor: '#25262b',
+                    paper_bgcolor: '#25262b',
+                    font: {color: '#c1c2c5'},
+                    xaxis: {title: 'Time (s)', gridcolor: '#373A40'},
+                    yaxis: {title: 'Amplitude (V)', gridcolor: '#373A40', domain: [0.5, 1]},
+                    yaxis2: {title: 'Phase (rad)', gridcolor: '#373A40', domain: [0, 0.45], range: [-3.2, 3.2]},
+                    showlegend: false
+                }
+            };
+        }
+        """,
+        Output(ids.lockin_graph(MATCH), 'figure'),
+        Input(ids.live_ws(MATCH), 'message'),
+        prevent_initial_call=True
+    )
+
     # Open/Close connection callback
     @callback(
         [Output(ids.pico_openclose(MATCH), 'checked', allow_duplicate=True),
@@ -373,7 +654,9 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
                 return False, freq_mhz, acq_time
 
         else:
-            success = device.close()
+            # the other units of the group were opened for group acquisitions
+            group = PicoscopeInterfaceAIO._groups.get(aio_id)
+            success = group.close() if group is not None else device.close()
             print(f"Closing PicoScope connection: {'Success' if success else 'Failed'}")
             return not success, freq_mhz, acq_time
 
@@ -388,6 +671,7 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
     def channels_on_off(channel_states, current_config):
         aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
         device = PicoscopeInterfaceAIO._devices[aio_id]
+        PicoscopeInterfaceAIO.check_device_idle(device)
 
         channels = ['A', 'B', 'C', 'D']  # Order should match the ALL pattern
 
@@ -418,6 +702,7 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
     def update_channel_ranges(range_values, current_config):
         aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
         device = PicoscopeInterfaceAIO._devices[aio_id]
+        PicoscopeInterfaceAIO.check_device_idle(device)
 
         channels = ['A', 'B', 'C', 'D']  # Order should match the ALL pattern
 
@@ -448,6 +733,7 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
     def update_resolution(resolution, current_config):
         aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
         device = PicoscopeInterfaceAIO._devices[aio_id]
+        PicoscopeInterfaceAIO.check_device_idle(device)
 
         if resolution is not None:
             success = device.set_resolution(int(resolution))
@@ -459,6 +745,33 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
 
         return current_config
 
+    # Down sampling callback
+    @callback(
+        Output(ids.config_storage(MATCH), 'data', allow_duplicate=True),
+        [Input(ids.down_sample_mode(MATCH), 'value'),
+         Input(ids.down_sample_ratio(MATCH), 'value')],
+        State(ids.config_storage(MATCH), 'data'),
+        prevent_initial_call=True
+    )
+    def update_down_sampling(mode, ratio, current_config):
+        aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
+        device = PicoscopeInterfaceAIO._devices[aio_id]
+        PicoscopeInterfaceAIO.check_device_idle(device)
+
+        if mode is None or not ratio:
+            return no_update
+        ratio = int(ratio)
+        if mode == 'none' and ratio > 1:
+            print("Select a down sampling mode to stream with a ratio above 1")
+        device.down_sample_mode = mode
+        device.down_sample_ratio = ratio
+        print(f"Stream down sampling: {mode}, ratio {ratio}")
+
+        if current_config and device.get_name() in current_config:
+            current_config[device.get_name()]['down_sample_mode'] = mode
+            current_config[device.get_name()]['down_sample_ratio'] = str(ratio)
+        return current_config
+
     # Sampling frequency callback
     @callback(
         Output(ids.sampling_frequency_actual(MATCH), 'value', allow_duplicate=True),
@@ -469,6 +782,7 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
     def update_sampling_frequency(freq_mhz, acq_time_s):
         aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
         device = PicoscopeInterfaceAIO._devices[aio_id]
+        PicoscopeInterfaceAIO.check_device_idle(device)
 
         if freq_mhz is not None:
             freq_hz = freq_mhz * 1e6
@@ -493,6 +807,7 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
     def update_acquisition_time(acq_time, freq_MHz):
         aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
         device = PicoscopeInterfaceAIO._devices[aio_id]
+        PicoscopeInterfaceAIO.check_device_idle(device)
 
         if acq_time is not None:
             freq_hz = freq_MHz * 1e6
@@ -502,51 +817,74 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
         return acq_time
 
     # Start streaming callback
+    # Acquisitions run as background jobs so the callback returns at once; poll_job reports the outcome
     @callback(
-        Output(ids.start_stream_btn(MATCH), 'children', allow_duplicate=True),
+        [Output(ids.start_stream_btn(MATCH), 'children', allow_duplicate=True),
+         Output(ids.job_store(MATCH), 'data', allow_duplicate=True),
+         Output(ids.job_interval(MATCH), 'disabled', allow_duplicate=True)],
         [Input(ids.start_stream_btn(MATCH), 'n_clicks')],
         [State(ids.data_path(MATCH), 'value'),
          State(ids.measurement_name(MATCH), 'value'),
-         State(ids.data_comments(MATCH),'value')],
+         State(ids.data_comments(MATCH),'value'),
+         State(ids.group_acquire(MATCH), 'checked')],
         prevent_initial_call=True
     )
-    def start_streaming(n_clicks, data_path, measurement_name, comments):
+    def start_streaming(n_clicks, data_path, measurement_name, comments, use_group):
         if n_clicks is None:
-            return 'Stream'
+            return 'Stream', no_update, no_update
 
         aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
         device = PicoscopeInterfaceAIO._devices[aio_id]
         metadata={}
         metadata['comments'] = comments
 
-        print(f"Starting streaming acquisition...")
-        result = device.run_streaming(
-            data_dir=data_path,
-            filename=measurement_name,
-            auto_stop=True,
-            additional_metadata=metadata
-        )
+        group = PicoscopeInterfaceAIO.group_for(aio_id, use_group)
+        saving = bool(data_path and measurement_name)
+        if group is not None and not saving:
+            print("Streaming with all units needs a data path and a measurement name")
+            return 'Set data path', no_update, no_update
 
-        if result is not None or (data_path and measurement_name):
-            print("Streaming completed successfully")
-            return 'Stream Complete'
-        else:
-            print("Streaming failed")
-            return 'Stream Failed'
+        def stream_group(job):
+            PicoscopeInterfaceAIO.prepare_group(group, device)
+            return group.run_streaming(data_path, measurement_name, auto_stop=True,
+                                       additional_metadata=metadata, job=job)
+
+        print(f"Starting streaming acquisition...")
+        try:
+            if group is not None:
+                job = job_manager.submit('group_stream', stream_group, key=device.get_name())
+            else:
+                job = job_manager.submit(
+                    'stream', device.run_streaming, key=device.get_name(),
+                    data_dir=data_path,
+                    filename=measurement_name,
+                    auto_stop=True,
+                    additional_metadata=metadata
+                )
+        except RuntimeError as e:
+            print(f"Streaming not started: {e}")
+            return 'Device busy', no_update, no_update
+
+        job_info = {'job_id': job.id, 'kind': 'stream', 'saving': saving}
+        return 'Streaming...', job_info, False
 
     # Arm trigger callback
     @callback(
-        Output(ids.arm_trigger_btn(MATCH), 'children', allow_duplicate=True),
+        [Output(ids.arm_trigger_btn(MATCH), 'children', allow_duplicate=True),
+         Output(ids.job_store(MATCH), 'data', allow_duplicate=True),
+         Output(ids.job_interval(MATCH), 'disabled', allow_duplicate=True)],
         [Input(ids.arm_trigger_btn(MATCH), 'n_clicks')],
         [State(ids.data_path(MATCH), 'value'),
          State(ids.measurement_name(MATCH), 'value'),
          State(ids.chunks_input(MATCH), 'value'),
-         State(ids.data_comments(MATCH),'value')],
+         State(ids.data_comments(MATCH),'value'),
+         State(ids.rapid_block(MATCH), 'checked'),
+         State(ids.group_acquire(MATCH), 'checked')],
         prevent_initial_call=True
     )
-    def arm_trigger(n_clicks, data_path, measurement_name, num_chunks, comments):
+    def arm_trigger(n_clicks, data_path, measurement_name, num_chunks, comments, rapid_block, use_group):
         if n_clicks is None:
-            return 'Arm trigger'
+            return 'Arm trigger', no_update, no_update
 
         aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
         device = PicoscopeInterfaceAIO._devices[aio_id]
@@ -556,18 +894,131 @@ class PicoscopeInterfaceAIO(html.Div):  # html.Div will be the "parent" componen
         if num_chunks is None or num_chunks < 1:
             num_chunks = 1
 
+        group = PicoscopeInterfaceAIO.group_for(aio_id, use_group)
+
+        def acquire(job):
+            if group is not None:
+                # all units trigger on their EXT input, wired to the same trigger signal
+                PicoscopeInterfaceAIO.prepare_group(group, device)
+                group.set_trigger(threshold=1.0, direction='Rising', delay=0, auto_trigger=False, timeout_ms=1000)
+                acquisition = group.run_rapid_block_acquisition if rapid_block else group.run_multi_block_acquisition
+                count = {'num_segments': num_chunks} if rapid_block else {'num_chunks': num_chunks}
+                return acquisition(data_path, measurement_name, pre_trigger_percent=0,
+                                   additional_metadata=metadata, job=job, **count)
+            device.set_trigger(channel='A', threshold=1.0, direction='Rising',
+                               delay=0, auto_trigger=False, timeout_ms=1000)
+            if rapid_block:
+                # all chunks captured back-to-back in segmented scope memory
+                return device.run_rapid_block_acquisition(
+                    data_dir=data_path,
+                    measurement_set_name=measurement_name,
+                    num_segments=num_chunks,
+                    pre_trigger_percent=0,
+                    additional_metadata=metadata,
+                    job=job
+                )
+            return device.run_multi_block_acquisition(
+                data_dir=data_path,
+                measurement_set_name=measurement_name,
+                num_chunks=num_chunks,
+                pre_trigger_percent=0,
+                additional_metadata=metadata,
+                job=job
+            )
+
         print(f"Arming trigger for {num_chunks} block acquisitions...")
-        device.set_trigger(channel='A', threshold=1.0, direction='Rising',
-                           delay=0, auto_trigger=False, timeout_ms=1000)
-        success = device.run_multi_block_acquisition(
-            data_dir=data_path,
-            measurement_set_name=measurement_name,
-            num_chunks=num_chunks,
-            pre_trigger_percent=0,
-            additional_metadata=metadata
-        )
+        try:
+            job = job_manager.submit('rapid_block' if rapid_block else 'multi_block', acquire, key=device.get_name())
+        except RuntimeError as e:
+            print(f"Trigger not armed: {e}")
+            return 'Device busy', no_update, no_update
+
+        job_info = {'job_id': job.id, 'kind': 'trigger', 'num_chunks': num_chunks}
+        return 'Armed...', job_info, False
 
-        if success:
-            return f'{num_chunks} Triggers Complete'
+    # Job progress polling
+    @callback(
+        [Output(ids.job_progress(MATCH), 'value'),
+         Output(ids.job_status(MATCH), 'children'),
+         Output(ids.cancel_btn(MATCH), 'disabled'),
+         Output(ids.job_interval(MATCH), 'disabled', allow_duplicate=True),
+         Output(ids.start_stream_btn(MATCH), 'children', allow_duplicate=True),
+         Output(ids.arm_trigger_btn(MATCH), 'children', allow_duplicate=True)],
+        Input(ids.job_interval(MATCH), 'n_intervals'),
+        State(ids.job_store(MATCH), 'data'),
+        prevent_initial_call=True
+    )
+    def poll_job(n_intervals, job_info):
+        if not job_info:
+            return no_update, no_update, True, True, no_update, no_update
+
+        job = job_manager.get(job_info['job_id'])
+        if job is None:
+            return 0, 'Job not found', True, True, no_update, no_update
+
+        status = job.as_dict()
+        text = f"{status['status']} ({status['elapsed']:.1f} s) {status['message']}"
+        if not job.is_finished:
+            return 100 * status['progress'], text, False, False, no_update, no_update
+
+        if status['error']:
+            text = f"failed: {status['error']}"
+        if job_info['kind'] == 'stream':
+            if job.status == Job.DONE and (job.result is not None or job_info['saving']):
+                label = 'Stream Complete'
+            elif job.status == Job.CANCELLED:
+                label = 'Stream Cancelled'
+            else:
+                label = 'Stream Failed'
+            return 100 * status['progress'], text, True, True, label, no_update
+
+        num_chunks = job_info['num_chunks']
+        if job.status == Job.DONE and job.result:
+            label = f'{num_chunks} Triggers Complete'
+        elif job.status == Job.CANCELLED:
+            label = 'Triggers Cancelled'
         else:
-            return 'Multi-Trigger Failed'
\ No newline at end of file
+            label = 'Multi-Trigger Failed'
+        return 100 * status['progress'], text, True, True, no_update, label
+
+    # Cancel the running job
+    @callback(
+        Output(ids.cancel_btn(MATCH), 'disabled', allow_duplicate=True),
+        Input(ids.cancel_btn(MATCH), 'n_clicks'),
+        State(ids.job_store(MATCH), 'data'),
+        prevent_initial_call=True
+    )
+    def cancel_job(n_clicks, job_info):
+        if n_clicks and job_info:
+            job_manager.cancel(job_info['job_id'])
+            print(f"Cancelling job {job_info['job_id']}")
+        return True
+
+    # Lock-in callback: the demodulator is attached to the device and used by the following streams
+    @callback(
+        Output(ids.lockin_enable(MATCH), 'checked', allow_duplicate=True),
+        [Input(ids.lockin_enable(MATCH), 'checked'),
+         Input(ids.lockin_channel(MATCH), 'value'),
+         Input(ids.lockin_frequency(MATCH), 'value'),
+         Input(ids.lockin_bandwidth(MATCH), 'value')],
+        prevent_initial_call=True
+    )
+    def update_lockin(enabled, channel, frequency_khz, output_rate_khz):
+        aio_id = PicoscopeInterfaceAIO.get_aio_id_from_trigger()
+        device = PicoscopeInterfaceAIO._devices[aio_id]
+        PicoscopeInterfaceAIO.check_device_idle(device)
+
+        if not enabled:
+            device.remove_lockin('lockin')
+            return no_update
+        if not frequency_khz or not output_rate_khz:
+            print("Lock-in needs a reference frequency and an output rate")
+            return False
+        try:
+            device.add_lockin('lockin', channel, float(frequency_khz) * 1e3,
+                              output_rate=float(output_rate_khz) * 1e3)
+            print(f"Lock-in on channel {channel} at {frequency_khz} kHz, output rate {output_rate_khz} kHz")
+        except Exception as e:
+            print(f"Error setting up lock-in: {e}")
+            return False
+        return no_update
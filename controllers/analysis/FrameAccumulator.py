@@ -0,0 +1,208 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameAccumulator:
+    """
+    In-place frame averaging for noisy, low-light camera images.
+
+    Registered as a FrameGrabber listener, it folds every frame into preallocated float32 buffers:
+
+    - 'mean': running mean of all frames since the last reset,
+    - 'ema': exponential moving average, alpha = 2 / (frames + 1),
+    - 'boxcar': mean of the last `frames` frames, kept in a (frames, height, width) ring,
+    - 'off': the latest frame (still dark-subtracted, as float32).
+
+    A dark frame (the mean of a number of frames with the light blocked) can be captured and is subtracted from
+    every frame before averaging. No frame stacks are copied into Python lists; the averaged image is read with
+    get_image or, normalized to 8 bit for the stream, with get_display_frame.
+    """
+
+    MODES = ('off', 'mean', 'ema', 'boxcar')
+
+    def __init__(self, mode='off', frames=10):
+        self._lock = threading.Lock()
+        self._mode = mode
+        self._frames = max(1, int(frames))
+        self._shape = None
+
+        # Preallocated buffers (created for the first frame of a given shape)
+        self._current = None
+        self._result = None
+        self._delta = None
+        self._ring = None
+        self._ring_sum = None
+        self._dark = None
+        self._dark_sum = None
+        self._display = None
+
+        self._count = 0
+        self._ring_index = 0
+        self._dark_frames = 0
+        self._dark_target = 0
+        self._seq = 0
+        self._display_seq = None
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def active(self):
+        """True if the accumulator changes the image (averaging or dark subtraction)"""
+        return self._mode != 'off' or self._dark is not None
+
+    @property
+    def count(self):
+        """Number of frames in the current average"""
+        return min(self._count, self._frames) if self._mode == 'boxcar' else self._count
+
+    @property
+    def has_dark(self):
+        return self._dark is not None
+
+    def configure(self, mode=None, frames=None):
+        """Change the averaging mode and/or frame count; restarts the average"""
+        with self._lock:
+            if mode is not None:
+                if mode not in self.MODES:
+                    raise ValueError(f"Unknown averaging mode {mode}, expected one of {self.MODES}")
+                self._mode = mode
+            if frames is not None:
+                self._frames = max(1, int(frames))
+                self._ring = None
+            self._reset()
+
+    def reset(self):
+        """Restart the average (keeps the dark frame)"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._count = 0
+        self._ring_index = 0
+        self._display_seq = None
+
+    def capture_dark(self, n_frames=20):
+        """Average the next n_frames raw frames into the dark frame"""
+        with self._lock:
+            self._dark_target = max(1, int(n_frames))
+            self._dark_frames = 0
+            if self._dark_sum is not None:
+                self._dark_sum.fill(0)
+
+    def clear_dark(self):
+        with self._lock:
+            self._dark = None
+            self._dark_target = 0
+            self._reset()
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._current = np.empty(shape, dtype=np.float32)
+        self._result = np.zeros(shape, dtype=np.float32)
+        self._delta = np.empty(shape, dtype=np.float32)
+        self._dark_sum = np.zeros(shape, dtype=np.float32)
+        self._display = np.empty(shape, dtype=np.uint8)
+        self._dark = None
+        self._ring = None
+        self._reset()
+
+    def __call__(self, frame, seq=None, timestamp=None):
+        """FrameGrabber listener"""
+        self.add(frame)
+
+    def add(self, frame):
+        """Fold one frame into the average"""
+        with self._lock:
+            if frame.shape != self._shape:
+                self._allocate(frame.shape)
+            current = self._current
+            np.copyto(current, frame, casting='unsafe')
+
+            if self._dark_target:
+                # frames taken for the dark frame are not averaged
+                self._dark_sum += current
+                self._dark_frames += 1
+                if self._dark_frames >= self._dark_target:
+                    self._dark = self._dark_sum / self._dark_frames
+                    self._dark_target = 0
+                    self._reset()
+                    print(f"Dark frame captured from {self._dark_frames} frames")
+                return
+            if self._dark is not None:
+                current -= self._dark
+
+            self._count += 1
+            if self._mode == 'mean':
+                # result += (current - result) / n
+                np.subtract(current, self._result, out=self._delta)
+                self._delta *= 1.0 / self._count
+                self._result += self._delta
+            elif self._mode == 'ema':
+                if self._count == 1:
+                    np.copyto(self._result, current)
+                else:
+                    np.subtract(current, self._result, out=self._delta)
+                    self._delta *= 2.0 / (self._frames + 1)
+                    self._result += self._delta
+            elif self._mode == 'boxcar':
+                self._add_to_ring(current)
+            else:
+                np.copyto(self._result, current)
+            self._seq += 1
+
+    def _add_to_ring(self, current):
+        if self._ring is None or self._ring.shape[1:] != current.shape:
+            self._ring = np.zeros((self._frames,) + current.shape, dtype=np.float32)
+            self._ring_sum = np.zeros(current.shape, dtype=np.float32)
+        if self._count == 1:
+            self._ring.fill(0)
+            self._ring_sum.fill(0)
+            self._ring_index = 0
+        slot = self._ring[self._ring_index]
+        self._ring_sum -= slot
+        np.copyto(slot, current)
+        self._ring_sum += slot
+        self._ring_index = (self._ring_index + 1) % self._frames
+        if self._ring_index == 0:
+            # recompute the sum once per lap so float32 rounding does not accumulate
+            np.sum(self._ring, axis=0, out=self._ring_sum)
+        np.multiply(self._ring_sum, 1.0 / min(self._count, self._frames), out=self._result)
+
+    def get_image(self):
+        """Copy of the averaged (dark-subtracted) image as float32, None before the first frame"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._result.copy()
+
+    def get_display_frame(self):
+        """Averaged image min-max normalized to uint8 (reused buffer, recomputed once per new frame)"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            if self._display_seq != self._seq:
+                cv2.normalize(self._result, self._display, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+                self._display_seq = self._seq
+            return self._display
+
+    def save(self, file_path):
+        """Save the averaged image as a float32 .npy file; returns the path or None if there is no image"""
+        image = self.get_image()
+        if image is None:
+            return None
+        np.save(file_path, image)
+        return file_path
+
+    def status(self):
+        dark = 'dark subtracted' if self._dark is not None else 'no dark'
+        if self._dark_target:
+            dark = f'capturing dark {self._dark_frames}/{self._dark_target}'
+        return f"{self._mode}, {self.count} frames, {dark}"
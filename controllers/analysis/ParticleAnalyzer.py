@@ -0,0 +1,158 @@
+import threading
+
+import numpy as np
+
+
+class ParticleAnalyzer:
+    """
+    Per-frame particle analysis on a (downsampled) region of interest.
+
+    Meant to be registered as a FrameGrabber listener, so it runs on the camera capture thread for every frame
+    independently of the preview stream. For each frame the ROI is binned by `downsample` x `downsample` into a
+    preallocated float32 buffer, the background is subtracted (a captured background frame, or else the median of
+    the ROI border) and negative values are clipped. From the result it computes the integrated intensity, centroid
+    and second central moments (in full-frame pixel coordinates), stored in a fixed-size history.
+    """
+
+    FIELDS = ('sum', 'centroid_x', 'centroid_y', 'var_x', 'var_y', 'cov_xy')
+
+    def __init__(self, roi=None, downsample=2, history=10000):
+        self._lock = threading.Lock()
+        self._roi = roi  # (x0, y0, width, height) in full-frame pixels, None = full frame
+        self._downsample = max(1, int(downsample))
+        self._layout = None  # (frame shape, roi, downsample) the buffers below were built for
+
+        # Preallocated working buffers
+        self._binned = None
+        self._background = None
+        self._background_sum = None
+        self._background_frames = 0
+        self._background_target = 0
+        self._xs = self._ys = self._xs2 = self._ys2 = None
+
+        # History: one row per frame, [time, *FIELDS]
+        self._history = np.full((history, 1 + len(self.FIELDS)), np.nan)
+        self._count = 0
+        self.last_result = None
+
+    def set_roi(self, roi=None, downsample=None):
+        """Set the ROI (x0, y0, width, height) and/or downsampling; clears the background"""
+        with self._lock:
+            self._roi = roi
+            if downsample is not None:
+                self._downsample = max(1, int(downsample))
+            self._layout = None
+
+    def capture_background(self, n_frames=20):
+        """Average the next n_frames ROIs (without a particle) into the background"""
+        with self._lock:
+            self._background_target = n_frames
+            self._background_frames = 0
+            if self._background_sum is not None:
+                self._background_sum.fill(0)
+
+    def clear_background(self):
+        with self._lock:
+            self._background = None
+            self._background_target = 0
+
+    def clear_history(self):
+        with self._lock:
+            self._history.fill(np.nan)
+            self._count = 0
+
+    def __call__(self, frame, seq=None, timestamp=None):
+        """FrameGrabber listener"""
+        result = self.analyze(frame)
+        if result is None:
+            return
+        with self._lock:
+            row = self._history[self._count % len(self._history)]
+            row[0] = timestamp if timestamp is not None else np.nan
+            row[1:] = [result[field] for field in self.FIELDS]
+            self._count += 1
+            self.last_result = result
+
+    def _prepare(self, frame):
+        layout = (frame.shape, self._roi, self._downsample)
+        if layout == self._layout:
+            return
+        height, width = frame.shape[:2]
+        x0, y0, roi_width, roi_height = self._roi if self._roi is not None else (0, 0, width, height)
+        x0, y0 = min(max(0, x0), width - 1), min(max(0, y0), height - 1)
+        ds = self._downsample
+        bins_x = max(1, min(roi_width, width - x0) // ds)
+        bins_y = max(1, min(roi_height, height - y0) // ds)
+        self._crop = (slice(y0, y0 + bins_y * ds), slice(x0, x0 + bins_x * ds))
+        self._binned_shape = (bins_y, ds, bins_x, ds)
+        self._binned = np.empty((bins_y, bins_x), dtype=np.float32)
+        self._background = None
+        self._background_sum = np.zeros((bins_y, bins_x), dtype=np.float32)
+        self._background_frames = 0
+        # coordinates of the bin centres in full-frame pixels
+        self._xs = (x0 + ds * np.arange(bins_x) + (ds - 1) / 2).astype(np.float32)
+        self._ys = (y0 + ds * np.arange(bins_y) + (ds - 1) / 2).astype(np.float32)
+        self._layout = layout
+
+    def analyze(self, frame):
+        """Analysis of one frame as a dict of FIELDS, None if the frame is not 2D"""
+        if frame is None or frame.ndim != 2:
+            return None
+        with self._lock:
+            self._prepare(frame)
+            ds = self._downsample
+            binned = self._binned
+
+            # bin the ROI: mean of each ds x ds block
+            np.sum(frame[self._crop].reshape(self._binned_shape), axis=(1, 3), dtype=np.float32, out=binned)
+            if ds > 1:
+                binned *= 1.0 / (ds * ds)
+
+            if self._background_target:
+                self._background_sum += binned
+                self._background_frames += 1
+                if self._background_frames >= self._background_target:
+                    self._background = self._background_sum / self._background_frames
+                    self._background_target = 0
+
+            if self._background is not None:
+                binned -= self._background
+            else:
+                border = np.concatenate((binned[0], binned[-1], binned[1:-1, 0], binned[1:-1, -1]))
+                binned -= np.median(border)
+            np.maximum(binned, 0, out=binned)
+
+            # moments from the row/column projections
+            column_sum = binned.sum(axis=0)
+            row_sum = binned.sum(axis=1)
+            total = float(column_sum.sum())
+            if total <= 0:
+                return dict.fromkeys(self.FIELDS, np.nan) | {'sum': 0.0}
+            cx = float(column_sum @ self._xs) / total
+            cy = float(row_sum @ self._ys) / total
+            dx = self._xs - cx
+            dy = self._ys - cy
+            return {'sum': total * ds * ds,
+                    'centroid_x': cx,
+                    'centroid_y': cy,
+                    'var_x': float(column_sum @ (dx * dx)) / total,
+                    'var_y': float(row_sum @ (dy * dy)) / total,
+                    'cov_xy': float(dy @ (binned @ dx)) / total}
+
+    def get_series(self, max_points=None):
+        """Time series of all fields, oldest first: {'time': array, field: array, ...}"""
+        with self._lock:
+            size = len(self._history)
+            n = min(self._count, size)
+            if max_points is not None:
+                n = min(n, max_points)
+            indices = np.arange(self._count - n, self._count) % size
+            rows = self._history[indices]
+        series = {'time': rows[:, 0]}
+        for i, field in enumerate(self.FIELDS):
+            series[field] = rows[:, 1 + i]
+        return series
+
+    @property
+    def frame_count(self):
+        return self._count
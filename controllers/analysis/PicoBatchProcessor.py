@@ -0,0 +1,183 @@
+"""
+Parallel offline processing of chunked PicoScope measurement sets.
+
+The chunks of a measurement set (run_multi_block_acquisition / run_rapid_block_acquisition) are distributed across
+a ProcessPoolExecutor. Only the metadata path and chunk indices are sent to the workers: every worker opens the
+data set once (PicoDataSet, np.memmap) and reads its chunks straight from the file, so no sample arrays are pickled.
+A reducer turns each chunk into a few named values, which are collected into a single table with one row per chunk
+and written to .npz (any values) or .csv (scalar values).
+
+A reducer is a module-level function reducer(volts, dataset, chunk, **kwargs) -> {column: scalar or 1-D array},
+where volts is the (channels, samples) float32 chunk. It must be importable by the workers (not a lambda or a
+function defined in a notebook cell).
+"""
+import csv
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from controllers.analysis.PicoDataSet import find_metadata, load_dataset
+
+
+# Reducers
+
+def chunk_statistics(volts, dataset, chunk):
+    """Mean, standard deviation, RMS, minimum and maximum per channel (V)"""
+    row = {}
+    for i, channel in enumerate(dataset.channels):
+        data = volts[i]
+        row[f'{channel}_mean'] = float(data.mean(dtype=np.float64))
+        row[f'{channel}_std'] = float(data.std(dtype=np.float64))
+        row[f'{channel}_rms'] = float(np.sqrt(np.mean(np.square(data, dtype=np.float64))))
+        row[f'{channel}_min'] = float(data.min())
+        row[f'{channel}_max'] = float(data.max())
+    return row
+
+
+def chunk_psd(volts, dataset, chunk, segment_samples=4096):
+    """
+    One-sided power spectral density per channel (V^2/Hz), Welch's method with a Hann window and 50% overlap.
+    Chunks shorter than segment_samples use a single segment of the chunk length.
+    """
+    num_samples = volts.shape[1]
+    segment_samples = min(segment_samples, num_samples)
+    step = max(1, segment_samples // 2)
+    window = np.hanning(segment_samples).astype(np.float32)
+    scale = 1.0 / ((1.0 / dataset.dt) * np.sum(window.astype(np.float64) ** 2))
+
+    row = {'frequency': np.fft.rfftfreq(segment_samples, dataset.dt)}
+    for i, channel in enumerate(dataset.channels):
+        # (segments, segment_samples) strided view, detrended by the segment mean
+        segments = np.lib.stride_tricks.sliding_window_view(volts[i], segment_samples)[::step]
+        segments = (segments - segments.mean(axis=1, keepdims=True)) * window
+        power = np.mean(np.abs(np.fft.rfft(segments, axis=1)) ** 2, axis=0) * scale
+        power[1:-1 if segment_samples % 2 == 0 else None] *= 2
+        row[f'{channel}_psd'] = power
+    return row
+
+
+REDUCERS = {
+    'statistics': chunk_statistics,
+    'psd': chunk_psd,
+}
+
+
+# Worker side
+
+_worker_dataset = None
+
+
+def _init_worker(metadata_path):
+    """Open the data set once per worker process"""
+    global _worker_dataset
+    _worker_dataset = load_dataset(metadata_path)
+
+
+def _process_chunks(reducer, reducer_kwargs, chunks):
+    """Reduce a list of chunks in a worker; returns [(chunk, row)]"""
+    dataset = _worker_dataset
+    results = []
+    buffer = None
+    for chunk in chunks:
+        raw = dataset.chunk_raw(chunk)
+        if buffer is None or buffer.shape[1] < raw.shape[1]:
+            buffer = np.empty(raw.shape, dtype=np.float32)
+        volts = dataset.to_volts(np.asarray(raw), out=buffer[:raw.shape[0], :raw.shape[1]])
+        results.append((chunk, reducer(volts, dataset, chunk, **reducer_kwargs)))
+    return results
+
+
+# Parent side
+
+class PicoBatchProcessor:
+    """
+    Applies a reducer to every chunk of a measurement set in a pool of worker processes.
+
+    path is a measurement directory, its metadata file or data set; reducer is a function or a name from REDUCERS.
+    workers defaults to the number of CPUs; with workers=1 the chunks are processed in this process.
+    chunks_per_task sets how many chunks a worker reduces per task (default: about 4 tasks per worker).
+    """
+
+    def __init__(self, path, reducer='statistics', reducer_kwargs=None, workers=None, chunks_per_task=None):
+        self.metadata_path = find_metadata(path)
+        self.reducer = REDUCERS[reducer] if isinstance(reducer, str) else reducer
+        self.reducer_kwargs = reducer_kwargs or {}
+        self.workers = workers or os.cpu_count() or 1
+        self.chunks_per_task = chunks_per_task
+        self.elapsed = None
+
+    def _tasks(self, chunks):
+        per_task = self.chunks_per_task or max(1, math.ceil(len(chunks) / (4 * self.workers)))
+        return [chunks[i:i + per_task] for i in range(0, len(chunks), per_task)]
+
+    def run(self, output_path=None, chunks=None):
+        """
+        Process the given chunk indices (default: all) and return the table as {column: array}, with columns
+        'chunk', 'trigger_time' (ChunkStore sets) and the reducer's values. Written to output_path if given.
+        """
+        dataset = load_dataset(self.metadata_path)
+        try:
+            chunks = list(range(dataset.num_chunks)) if chunks is None else list(chunks)
+            trigger_times = dataset.trigger_times[chunks] if dataset.trigger_times is not None else None
+        finally:
+            dataset.close()
+
+        t_start = time.perf_counter()
+        rows = {}
+        if self.workers == 1:
+            _init_worker(self.metadata_path)
+            for task in self._tasks(chunks):
+                rows.update(_process_chunks(self.reducer, self.reducer_kwargs, task))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(self.metadata_path,)) as executor:
+                futures = [executor.submit(_process_chunks, self.reducer, self.reducer_kwargs, task)
+                           for task in self._tasks(chunks)]
+                for future in futures:
+                    rows.update(future.result())
+        self.elapsed = time.perf_counter() - t_start
+
+        table = {'chunk': np.array(chunks, dtype=np.int64)}
+        if trigger_times is not None:
+            table['trigger_time'] = np.asarray(trigger_times)
+        if chunks:
+            for column in rows[chunks[0]]:
+                table[column] = np.stack([np.asarray(rows[chunk][column]) for chunk in chunks])
+        if output_path:
+            save_table(table, output_path)
+        return table
+
+
+def save_table(table, output_path):
+    """Write a {column: array} table to .npz, or to .csv if all columns hold one value per row"""
+    if output_path.endswith('.csv'):
+        multi = [column for column, values in table.items() if values.ndim > 1]
+        if multi:
+            raise ValueError(f"Columns {multi} hold arrays and cannot be written to CSV; use a .npz file")
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(table.keys())
+            writer.writerows(zip(*(values.tolist() for values in table.values())))
+    else:
+        np.savez(output_path, **table)
+    print(f"Results saved to {output_path}")
+
+
+def load_table(path):
+    """Read a table written by save_table"""
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            columns = next(reader)
+            values = np.array(list(reader), dtype=np.float64).reshape(-1, len(columns))
+        return {column: values[:, i] for i, column in enumerate(columns)}
+    with np.load(path) as data:
+        return {column: data[column] for column in data.files}
+
+
+def process_measurement_set(path, reducer='statistics', output_path=None, workers=None, **reducer_kwargs):
+    """Reduce every chunk of a measurement set in parallel; see PicoBatchProcessor"""
+    return PicoBatchProcessor(path, reducer, reducer_kwargs, workers).run(output_path)
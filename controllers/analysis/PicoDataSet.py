@@ -0,0 +1,335 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from controllers.picoscope.ChunkStore import ChunkStoreReader
+
+
+def max_adc_for(metadata):
+    """Full-scale ADC count of a recording (ps5000a: 32512 in 8 bit mode, 32767 otherwise)"""
+    if 'MaxADC' in metadata:
+        return metadata['MaxADC']
+    return 32512 if int(metadata.get('Bit depth', 16)) == 8 else 32767
+
+
+class PicoDataSet:
+    """
+    Lazy reader for data recorded by PicoInterface.
+
+    Handles streams (<timestamp>_<name>.bin + _header.json, interleaved or channels-first), ChunkStore measurement
+    sets and the older one-.bin-per-chunk measurement sets. The binary data is np.memmap'ed and only converted to
+    volts for the requested slice (counts * range / max ADC - offset, per channel), so multi-GB captures can be
+    processed block by block.
+
+    raw is (channels, samples) for streams and (chunks, channels, samples) for ChunkStore sets; per-chunk file sets
+    are only accessed through chunk_raw / iter_chunks.
+    """
+
+    def __init__(self, metadata_path):
+        self.metadata_path = metadata_path
+        with open(metadata_path) as f:
+            self.metadata = json.load(f)
+        md = self.metadata
+        self.directory = os.path.dirname(metadata_path)
+        # rows of the data; streams down sampled with 'aggregate' have a max and a min row per channel (A_max, A_min)
+        self.channels = list(md.get('StreamRows') or md['EnabledChannels'])
+        self.sample_rate = md.get('ActualSamplingFrequency, Hz') or md.get('RequestedSamplingFrequency, Hz')
+        self.down_sample_ratio = md.get('DownSampleRatio', 1) or 1
+        self.max_adc = max_adc_for(md)
+        self.ranges = np.array([md[channel.split('_')[0]]['Range, V'] for channel in self.channels],
+                               dtype=np.float64)
+        self.offsets = np.array([md[channel.split('_')[0]].get('Offset, V', 0.0) for channel in self.channels],
+                                dtype=np.float64)
+        self.scales = self.ranges / self.max_adc  # V per ADC count of each row
+
+        self._chunk_files = None
+        self._store = None
+        storage = md.get('StorageFormat')
+        if metadata_path.endswith('_header.json'):
+            self.kind = 'stream'
+            self.raw = self._map_stream(metadata_path[:-len('_header.json')] + '.bin', storage)
+        elif storage == 'ChunkStore':
+            self.kind = 'chunks'
+            base = os.path.join(self.directory, md['DataFile'][:-len('_chunks.dat')])
+            self._store = ChunkStoreReader(base)
+            self.raw = self._store.data
+        else:
+            self.kind = 'chunks'
+            pattern = os.path.join(self.directory, f"{md['MeasurementSetName']}_chunk_*.bin")
+            self._chunk_files = sorted(glob.glob(pattern))
+            self.raw = None
+
+    # Loading
+
+    def _map_stream(self, data_path, storage):
+        num_channels = len(self.channels)
+        num_samples = os.path.getsize(data_path) // (2 * num_channels)
+        if num_samples == 0:
+            return np.zeros((num_channels, 0), dtype=np.int16)
+        if storage == 'Raw_Int16_Channels_First':
+            return np.memmap(data_path, dtype=np.int16, mode='r', shape=(num_channels, num_samples))
+        # interleaved (also files written before the format was recorded): transposed view, no copy
+        return np.memmap(data_path, dtype=np.int16, mode='r', shape=(num_samples, num_channels)).T
+
+    @property
+    def num_chunks(self):
+        if self.kind == 'stream':
+            return 1
+        if self._store is not None:
+            return len(self._store)
+        return len(self._chunk_files)
+
+    @property
+    def num_samples(self):
+        """Samples per channel (per chunk for chunked sets)"""
+        if self.kind == 'stream':
+            return self.raw.shape[1]
+        if self._store is not None:
+            return self._store.num_samples
+        return int(self.metadata.get('RequestedNumberOfSamples') or self.chunk_raw(0).shape[1])
+
+    @property
+    def dt(self):
+        """Time between stored samples (s)"""
+        return self.down_sample_ratio / self.sample_rate
+
+    def actual_samples(self, chunk):
+        """Acquired samples per channel of a chunk (the rest of its record is undefined)"""
+        if self._store is not None:
+            return int(self._store.actual_samples[chunk].min())
+        if self._chunk_files is not None:
+            name = os.path.splitext(os.path.basename(self._chunk_files[chunk]))[0]
+            return int(min(self.metadata.get(name, [self.num_samples])))
+        return self.num_samples
+
+    @property
+    def trigger_times(self):
+        """Trigger time (Unix time, s) per chunk of a ChunkStore set, None otherwise"""
+        return self._store.trigger_times if self._store is not None else None
+
+    def chunk_raw(self, chunk):
+        """(channels, samples) memmap view of one chunk, trimmed to the acquired samples"""
+        if self.kind == 'stream':
+            return self.raw
+        if self._store is not None:
+            return self._store.chunk(chunk)
+        data = np.memmap(self._chunk_files[chunk], dtype=np.int16, mode='r').reshape(len(self.channels), -1)
+        return data[:, :self.actual_samples(chunk)]
+
+    # Conversion
+
+    def channel_index(self, channel):
+        return self.channels.index(channel) if isinstance(channel, str) else channel
+
+    def to_volts(self, raw, channels=None, out=None, dtype=np.float32):
+        """Convert a (channels, samples) block of ADC counts (rows = channels, or the given subset) to volts"""
+        rows = slice(None) if channels is None else [self.channel_index(c) for c in channels]
+        scale = self.scales[rows].astype(dtype)[:, None]
+        offset = self.offsets[rows].astype(dtype)[:, None]
+        if out is None:
+            out = np.empty(raw.shape, dtype=dtype)
+        np.multiply(raw, scale, out=out)
+        out -= offset
+        return out
+
+    def volts(self, channel=None, start=0, stop=None, chunk=0):
+        """Voltage of one channel (samples,) or all channels (channels, samples) between start and stop"""
+        raw = self.chunk_raw(chunk)
+        if channel is None:
+            return self.to_volts(raw[:, start:stop])
+        index = self.channel_index(channel)
+        return self.to_volts(raw[index:index + 1, start:stop], channels=[index])[0]
+
+    def time(self, start=0, stop=None, chunk=0):
+        """Sample times (s) relative to the start of the recording or chunk"""
+        stop = self.chunk_raw(chunk).shape[1] if stop is None else stop
+        return np.arange(start, stop) * self.dt
+
+    # Iteration
+
+    def iter_blocks(self, block_samples=1_000_000, channels=None, volts=True, chunk=0):
+        """
+        Yield (start, block) over a stream (or one chunk) in blocks of block_samples per channel.
+        Blocks are (channels, n) float32 volts, or raw int16 memmap views with volts=False. The volts output
+        buffer is reused between blocks; copy it to keep it.
+        """
+        raw = self.chunk_raw(chunk)
+        rows = [self.channel_index(c) for c in channels] if channels is not None else list(range(raw.shape[0]))
+        buffer = None
+        for start in range(0, raw.shape[1], block_samples):
+            if channels is None:
+                block = raw[:, start:start + block_samples]
+            else:
+                # reads only this block of the selected rows
+                block = raw[rows, start:start + block_samples]
+            if not volts:
+                yield start, block
+                continue
+            if buffer is None or buffer.shape[1] < block.shape[1]:
+                buffer = np.empty((len(rows), block.shape[1]), dtype=np.float32)
+            yield start, self.to_volts(block, channels=rows, out=buffer[:, :block.shape[1]])
+
+    def iter_chunks(self, volts=True):
+        """Yield (chunk, block) for every chunk of a chunked set, trimmed to the acquired samples"""
+        for chunk in range(self.num_chunks):
+            raw = self.chunk_raw(chunk)
+            yield chunk, self.to_volts(raw) if volts else raw
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+        self.raw = None
+
+    def __repr__(self):
+        return (f"{type(self).__name__}({self.kind}, channels={self.channels}, chunks={self.num_chunks}, "
+                f"samples={self.num_samples}, sample_rate={self.sample_rate})")
+
+
+class _AlignedRows:
+    """
+    Read-only (rows, samples) view joining the rows of several (rows, samples) arrays, each from its own start
+    sample. Indexing reads only the requested samples of the requested rows from the (memory-mapped) arrays.
+    """
+
+    def __init__(self, parts, num_samples):
+        self._parts = parts  # [(array, start sample)]
+        self._rows = [(part, row) for part, (array, _) in enumerate(parts) for row in range(array.shape[0])]
+        self.shape = (len(self._rows), int(num_samples))
+        self.dtype = parts[0][0].dtype if parts else np.dtype(np.int16)
+
+    def __getitem__(self, key):
+        rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(columns, int):
+            columns = slice(columns, columns + 1)
+        start, stop, step = columns.indices(self.shape[1])
+        if isinstance(rows, (int, np.integer)):
+            return self[[rows], columns][0]
+        rows = range(self.shape[0])[rows] if isinstance(rows, slice) else list(rows)
+        out = np.empty((len(rows), len(range(start, stop, step))), dtype=self.dtype)
+        for i, row in enumerate(rows):
+            part, part_row = self._rows[row]
+            array, offset = self._parts[part]
+            out[i] = array[part_row, offset + start:offset + stop:step]
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:, :]
+        return data if dtype is None else data.astype(dtype)
+
+
+class PicoGroupDataSet(PicoDataSet):
+    """
+    Combined view of the data sets of a PicoGroup acquisition (<name>_group.json).
+
+    Rows are named '<unit>:<channel>' (e.g. 'picoscope_2:A'). Streams are cut so the trigger is at the same sample
+    on every unit and to their common length; chunk i joins the chunks of the units that belong to the same trigger.
+    Data is read lazily from the units' memory-mapped files; chunk_raw returns an _AlignedRows view.
+    """
+
+    def __init__(self, group_path):
+        self.metadata_path = group_path
+        with open(group_path) as f:
+            self.metadata = json.load(f)
+        self.directory = os.path.dirname(group_path)
+        self.alignment = self.metadata.get('Alignment') or {}
+        self.kind = 'stream' if self.metadata['Mode'] == 'stream' else 'chunks'
+
+        self.datasets = {}
+        for device in self.metadata['Devices']:
+            if device.get('MetadataFile'):
+                self.datasets[device['Name']] = PicoDataSet(os.path.join(self.directory, device['MetadataFile']))
+        if not self.datasets:
+            raise FileNotFoundError(f"No unit data sets in {group_path}")
+        if self.kind == 'chunks':
+            # the chunk table only lists the units that had data
+            self._chunk_devices = self.alignment.get('Devices', list(self.datasets))
+        datasets = list(self.datasets.values())
+        rates = {dataset.sample_rate / dataset.down_sample_ratio for dataset in datasets}
+        if len(rates) > 1:
+            print(f"Warning: units were recorded at different rates: {sorted(rates)}")
+
+        self.channels = [f'{name}:{channel}' for name, dataset in self.datasets.items() for channel in dataset.channels]
+        self.sample_rate = datasets[0].sample_rate
+        self.down_sample_ratio = datasets[0].down_sample_ratio
+        self.max_adc = datasets[0].max_adc
+        self.ranges = np.concatenate([dataset.ranges for dataset in datasets])
+        self.offsets = np.concatenate([dataset.offsets for dataset in datasets])
+        self.scales = np.concatenate([dataset.scales for dataset in datasets])
+        self._store = None
+        self._chunk_files = None
+        self.raw = self.chunk_raw(0) if self.kind == 'stream' else None
+
+    @property
+    def num_chunks(self):
+        if self.kind == 'stream':
+            return 1
+        return len(self.alignment.get('Chunks', []))
+
+    @property
+    def num_samples(self):
+        if self.kind == 'stream':
+            return self.alignment['Samples']
+        return min(dataset.num_samples for dataset in self.datasets.values())
+
+    def _unit_chunks(self, chunk):
+        """(data set, unit chunk index) of every unit for a group chunk"""
+        row = self.alignment['Chunks'][chunk]
+        return [(self.datasets[name], index) for name, index in zip(self._chunk_devices, row)]
+
+    def actual_samples(self, chunk):
+        if self.kind == 'stream':
+            return self.num_samples
+        return min(dataset.actual_samples(index) for dataset, index in self._unit_chunks(chunk))
+
+    @property
+    def trigger_times(self):
+        """Host trigger time of each group chunk (first unit), None for streams"""
+        if self.kind == 'stream':
+            return None
+        dataset, _ = self._unit_chunks(0)[0] if self.num_chunks else (None, None)
+        if dataset is None or dataset.trigger_times is None:
+            return None
+        return dataset.trigger_times[[row[0] for row in self.alignment['Chunks']]]
+
+    def chunk_raw(self, chunk):
+        if self.kind == 'stream':
+            starts = self.alignment.get('StartSample', {})
+            parts = [(dataset.raw, starts.get(name, 0)) for name, dataset in self.datasets.items()]
+            return _AlignedRows(parts, self.alignment['Samples'])
+        parts = [(dataset.chunk_raw(index), 0) for dataset, index in self._unit_chunks(chunk)]
+        return _AlignedRows(parts, min(array.shape[1] for array, _ in parts))
+
+    def close(self):
+        for dataset in self.datasets.values():
+            dataset.close()
+        self.raw = None
+
+
+def find_metadata(path):
+    """Metadata file for a measurement or group directory, a .bin data file or a metadata file"""
+    if os.path.isdir(path):
+        groups = glob.glob(os.path.join(path, '*_group.json'))
+        if len(groups) == 1:
+            return groups[0]
+        candidates = glob.glob(os.path.join(path, '*_metadata.json'))
+        candidates += glob.glob(os.path.join(path, '*_header.json'))
+        if len(candidates) != 1:
+            raise FileNotFoundError(f"Expected one metadata file in {path}, found {len(candidates)}")
+        return candidates[0]
+    if path.endswith('.json'):
+        return path
+    if path.endswith('.bin'):
+        header = path[:-len('.bin')] + '_header.json'
+        if os.path.exists(header):
+            return header
+    raise FileNotFoundError(f"No PicoScope metadata found for {path}")
+
+
+def load_dataset(path):
+    """Open a PicoScope recording (directory, data file or metadata file) as a PicoDataSet or PicoGroupDataSet"""
+    metadata_path = find_metadata(path)
+    if metadata_path.endswith('_group.json'):
+        return PicoGroupDataSet(metadata_path)
+    return PicoDataSet(metadata_path)
@@ -21,6 +21,10 @@ class Camera:
     def close(self):
         pass
 
+    def get_sensor_frame_rate(self):
+        """Frame rate (fps) at which the sensor actually delivers frames, None if unknown"""
+        return None
+
     @property
     def id(self):
         return self._id
\ No newline at end of file
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import numpy as np
+
+
+class FrameGrabber:
+    """
+    Acquires frames from a camera on a background thread while its stream is on.
+
+    Frames are copied into a small ring of preallocated buffers (camera SDK buffers are only valid until the next
+    poll), so the latest frame can be read from other threads - e.g. the websocket streamer on the event loop -
+    without blocking on the camera. A buffer is reused `num_buffers - 1` frames later, so latest() and
+    wait_for_frame() return a copy that stays valid however long the reader keeps it; listeners get the buffer.
+
+    Listeners registered with add_listener are called on the capture thread for every frame, as
+    listener(frame, seq, timestamp). They must be fast (vectorized, no I/O) to keep up with the sensor rate.
+    """
+
+    def __init__(self, camera, num_buffers=4):
+        self._camera = camera
+        self._num_buffers = num_buffers
+        self._buffers = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+
+        self._frame = None
+        self._seq = 0
+        self._timestamp = None
+        self.acquire_s = 0.0  # Duration of the last get_frame call
+
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start the capture thread (idles while camera.streamOn is False)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f'FrameGrabber-{self._camera.id}', daemon=True)
+        self._thread.start()
+        print(f"FrameGrabber started for camera {self._camera.id}")
+
+    def stop(self):
+        """Stop the capture thread and wait for it to exit"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        print(f"FrameGrabber stopped for camera {self._camera.id}")
+
+    def add_listener(self, listener):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def latest(self):
+        """(seq, frame, timestamp) of the most recent frame (a copy), seq 0 / frame None before the first frame"""
+        with self._lock:
+            return self._snapshot()
+
+    def wait_for_frame(self, after_seq, timeout=None):
+        """Block until a frame newer than after_seq is available; returns latest() (possibly unchanged on timeout)"""
+        with self._new_frame:
+            self._new_frame.wait_for(lambda: self._seq > after_seq, timeout=timeout)
+            return self._snapshot()
+
+    def _snapshot(self):
+        # Called with the lock held: the capture thread can't publish, so it can't wrap around to this buffer
+        frame = None if self._frame is None else self._frame.copy()
+        return self._seq, frame, self._timestamp
+
+    def _buffer_for(self, frame, seq):
+        if not self._buffers or self._buffers[0].shape != frame.shape or self._buffers[0].dtype != frame.dtype:
+            self._buffers = [np.empty_like(frame) for _ in range(self._num_buffers)]
+        return self._buffers[seq % self._num_buffers]
+
+    def _run(self):
+        while self._running:
+            if not self._camera.streamOn:
+                time.sleep(0.1)
+                continue
+            try:
+                t_start = time.perf_counter()
+                frame = self._camera.get_frame()
+                acquire_s = time.perf_counter() - t_start
+            except Exception as e:
+                print(f"FrameGrabber {self._camera.id}: error acquiring frame: {e}")
+                time.sleep(0.5)
+                continue
+            if frame is None:
+                continue
+
+            timestamp = time.time()
+            seq = self._seq + 1
+            buffer = self._buffer_for(frame, seq)
+            np.copyto(buffer, frame)
+            with self._new_frame:
+                self._frame = buffer
+                self._seq = seq
+                self._timestamp = timestamp
+                self.acquire_s = acquire_s
+                listeners = list(self._listeners)
+                self._new_frame.notify_all()
+
+            for listener in listeners:
+                try:
+                    listener(buffer, seq, timestamp)
+                except Exception as e:
+                    print(f"FrameGrabber {self._camera.id}: listener {listener} failed: {e}")
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @property
+    def camera(self):
+        return self._camera
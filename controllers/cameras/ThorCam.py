@@ -1,13 +1,27 @@
 from .Camera import Camera
 import cv2
+import numpy as np
 import time
 
+from thorlabs_tsi_sdk.tl_camera_enums import SENSOR_TYPE
+from thorlabs_tsi_sdk.tl_color_enums import FILTER_ARRAY_PHASE, FORMAT
+from thorlabs_tsi_sdk.tl_color_host import HostColorProcessor
+
+# OpenCV demosaic codes per color filter array phase (named after the sensor layout), BGR output for cv2.imencode
+_BAYER_TO_BGR = {FILTER_ARRAY_PHASE.BAYER_RED: cv2.COLOR_BayerRGGB2BGR,
+                 FILTER_ARRAY_PHASE.BAYER_BLUE: cv2.COLOR_BayerBGGR2BGR,
+                 FILTER_ARRAY_PHASE.GREEN_LEFT_OF_RED: cv2.COLOR_BayerGRBG2BGR,
+                 FILTER_ARRAY_PHASE.GREEN_LEFT_OF_BLUE: cv2.COLOR_BayerGBRG2BGR}
+
+
 class ThorCam(Camera):
     def __init__(self, cam_id, sdk, **kwargs):
         super().__init__(cam_id)
         self._sdk = sdk
         self._current_frame = None  # Instance variable to hold the current frame
         self._image_buffer = None  # Instance variable to hold the image buffer
+        self.color = False
+        self._color_processor = None  # HostColorProcessor of a color camera, None for monochrome frames
         print(f"Initialized camera, ID {self._id}")
         
     def __enter__(self):
@@ -24,6 +38,7 @@ class ThorCam(Camera):
         self.rotate_img = kwargs.get("rotate_img", False)
         self.roi_hor = kwargs.get("roi_hor", None)
         self.roi_ver = kwargs.get("roi_ver", None)
+        self.color = kwargs.get("color", False)  # Demosaic and color-correct frames of a color sensor
         # Then initialize camera
         camera = self._sdk.open_camera(self._id)
         time.sleep(1) # Let the camera connect and start properly
@@ -32,6 +47,8 @@ class ThorCam(Camera):
         self.set_exposure_ms(exposure_ms)
         self.set_timeout(polling_timeout_ms)
         self.framerate = framerate
+        if self.color:
+            self._setup_color()
         self._camera.arm(2)
         self._camera.issue_software_trigger()
 
@@ -42,14 +59,49 @@ class ThorCam(Camera):
         if self._current_frame is not None:
             self._image_buffer = self._current_frame.image_buffer
             # print("CAMERA SIDE: FRAME IS NOT NONE")
+            image = self._to_color(self._image_buffer) if self._color_processor else self._image_buffer
             if self.rotate_img:
-                return cv2.rotate(self._image_buffer, cv2.ROTATE_90_CLOCKWISE)
+                return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
             else:
-                return self._image_buffer
+                return image
         else:
             # print("CAMERA SIDE: FRAME IS NONE")
             return None
 
+    def _setup_color(self):
+        """Color pipeline of a Bayer sensor on the host (no color processing DLLs): white balance, color correction
+        and sRGB encoding in one HostColorProcessor"""
+        if self._camera.camera_sensor_type != SENSOR_TYPE.BAYER:
+            print(f"Camera {self._id} has no color sensor, frames stay monochrome")
+            return
+        bit_depth = self._camera.bit_depth
+        max_value = 2 ** bit_depth - 1
+        processor = HostColorProcessor(bit_depth, bit_depth)
+        # white balance first, then color correction (same order as the SDK's mono to color processor)
+        processor.append_matrix(self._camera.get_default_white_balance_matrix())
+        processor.append_matrix(self._camera.get_color_correction_matrix())
+        linear = np.arange(max_value + 1) / max_value
+        srgb = np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * np.power(linear, 1 / 2.4) - 0.055)
+        srgb_lut = np.rint(srgb * max_value).astype(np.int32)
+        processor.set_blue_output_lut(srgb_lut)
+        processor.set_green_output_lut(srgb_lut)
+        processor.set_red_output_lut(srgb_lut)
+        processor.enable_output_luts(True, True, True)
+        self._bayer_code = _BAYER_TO_BGR[self._camera.color_filter_array_phase]
+        self._color_max = max_value
+        self._color_shift = bit_depth - 8  # 8 bit output
+        self._color_processor = processor
+        print(f"Camera {self._id}: color processing on the host ({bit_depth} bit)")
+
+    def _to_color(self, image):
+        """Bayer frame to a (height, width, 3) uint8 BGR image"""
+        height, width = image.shape
+        bgr48 = cv2.cvtColor(np.ascontiguousarray(image, dtype=np.uint16), self._bayer_code)
+        m, shift = self._color_max, self._color_shift
+        bgr24 = self._color_processor.transform_48_to_24(bgr48, FORMAT.BGR_PIXEL, 0, m, 0, m, 0, m,
+                                                         shift, shift, shift, FORMAT.BGR_PIXEL, height * width)
+        return bgr24.reshape(height, width, 3)
+
     def close(self):
         self._camera.disarm()
         self._camera.dispose()
@@ -65,6 +117,17 @@ class ThorCam(Camera):
     def get_exposure_ms(self):
         return self._camera.exposure_time_us/1000.0
 
+    def get_sensor_frame_rate(self):
+        """Measured delivery rate, or the exposure + readout limited rate before frames have been measured"""
+        try:
+            measured_fps = self._camera.get_measured_frame_rate_fps()
+            if measured_fps > 0:
+                return measured_fps
+            return 1e6 / self._camera.frame_time_us
+        except Exception as e:
+            print(f"Camera {self._id}: could not read sensor frame rate: {e}")
+            return None
+
     def set_timeout(self, timeout):
         self._camera.image_poll_timeout_ms = timeout
 
@@ -2,8 +2,10 @@ from controllers.frequency_generators.FrequencyGenerator import FrequencyGenerat
 import subprocess
 import platform
 from typing import Optional, Dict, List, Union, Tuple
-from controllers.sinara.modify_experiment import update_script_values_by_lines
-from controllers.sinara.run_artiq_script import run_artiq_in_clang64_visible
+from controllers.sinara.ArtiqRunner import ArtiqRunner
+from controllers.sinara.ArtiqWorkerClient import ArtiqWorkerClient
+from controllers.sinara.SinaraCommandQueue import SinaraCommandQueue, sinara_queue
+from controllers.utils.JobManager import Job
 
 class MirnyFrequencyGenerator(FrequencyGenerator):
     """
@@ -14,22 +16,37 @@ class MirnyFrequencyGenerator(FrequencyGenerator):
     with individual instruments), so the basic idea is following. There is a number of
     template scripts implementing certain use cases, such as rampint the drive frequency,
     continuous Mirny operation with monitoring experiment through Sampler etc.
-    Communicating with Mirny changes certain parameters in corresponding template,
-    and then runs .bat file to run the script in Artiq. This makes it VERY slow and
+    The templates take their parameters as experiment arguments, which are passed
+    when the script is run in Artiq (see ArtiqRunner). This makes it VERY slow and
     unflexible.
+    If the persistent Sinara worker (controllers/sinara/sinara_worker.py) is running, the
+    output and the ramps are sent to it instead, without running a script (the scripts are only
+    used without a worker, or with script_fallback when the worker is not running).
+    Either way, runs are queued on the Sinara command queue and return a job immediately.
     """
+    WORKER_START_TIMEOUT = 30.0  # Time a job waits for a starting Sinara worker (s)
 
     def __init__(self, device_id: str, channel_params: Dict = None, connection_params: Dict = None,
-                 freq_gen_path: str = None, freq_ramp_path: str = None):
+                 freq_gen_path: str = None, freq_ramp_path: str = None, worker: ArtiqWorkerClient = None,
+                 runner: ArtiqRunner = None, command_queue: SinaraCommandQueue = None,
+                 script_fallback: bool = False):
         """
         Args:
             device_id: ID of Mirny in case there is more than 1. Not implemented for now.
             channel_params: Dictionary of channel output parameters.
                     Format: {int ch_num : {'frequency': float, 'attenuation': float, 'on': bool}}
             connection_params: IP address of Kasli
+            worker: Client of the persistent Sinara worker
+            runner: Runs the template scripts, shared by all Sinara modules
+            command_queue: Queue serializing Sinara jobs, shared by all Sinara modules
+            script_fallback: Run the template scripts if the worker is configured but not running
         """
         super().__init__(device_id, connection_params)
         self.channel_params = channel_params
+        self.worker = worker
+        self.runner = runner or ArtiqRunner()
+        self.command_queue = command_queue or sinara_queue
+        self.script_fallback = script_fallback
         # Default ramp parameters
         self.ramp_params = {}
         self.ramp_params["Starting frequency kHz"] = channel_params[0]["frequency"]/1e03
@@ -39,10 +56,8 @@ class MirnyFrequencyGenerator(FrequencyGenerator):
 
         self.output_updated = False
         self.connect()
-        if freq_gen_path is None:
-            self.freq_gen_path = r'C:/Users/CavLev/Documents/Qavity/controllers/sinara/mirny_as_freq_gen.py'
-        if freq_ramp_path is None:
-            self.freq_ramp_path = r'C:/Users/CavLev/Documents/Qavity/controllers/sinara/mirny_scan.py'
+        self.freq_gen_path = freq_gen_path or r'C:/Users/CavLev/Documents/Qavity/controllers/sinara/mirny_as_freq_gen.py'
+        self.freq_ramp_path = freq_ramp_path or r'C:/Users/CavLev/Documents/Qavity/controllers/sinara/mirny_scan.py'
 
     def update_properties_from_dict(self, prop_dict):
         """
@@ -92,24 +107,25 @@ class MirnyFrequencyGenerator(FrequencyGenerator):
         """Disconnect from Mirny - nothing to be done here"""
         return True
 
-    def update_freq_gen_script(self, starting_line: int = 22) -> bool:
-        updates = {}
-        script_path = self.freq_gen_path
+    def freq_gen_arguments(self) -> Dict:
+        """Arguments of mirny_as_freq_gen.py for the current channel parameters"""
+        # For now Mirny only works with 1 channel, Channel 0
+        return {
+            'drive_freq_kHz': float(self.channel_params[0]['frequency']/1e03), # Output frequency
+            'att_dB': float(self.channel_params[0]['attenuation']), # Channel attenuation
+            'turn_on': bool(self.channel_params[0]['on']), # If the channel should be on
+        }
+
+    def update_freq_gen_script(self) -> bool:
+        """Checks that the channel parameters make valid arguments of the frequency generator script"""
         self.logger.info(f"Updating frequency generator script")
         self.logger.info(f"Pushing channel parameters: {self.channel_params[0]}")
-        # First we generate a dictionary with line number and new numerical value of variable at that line
-        # For now Mirny only works with 1 channel, Channel 0
-        updates[starting_line] = float(self.channel_params[0]['frequency']/1e03) # Output frequency
-        updates[starting_line+1] = float(self.channel_params[0]['attenuation']) # Channel attenuation
-        updates[starting_line+3] = self.channel_params[0]['on'] # If the channel should be on
-        # Now we push the updates into the driver script
         try:
-            self.logger.info(f"Updating frequency gen script: \n {script_path}")
-            update_script_values_by_lines(script_path, updates)
+            self.freq_gen_arguments()
             self.output_updated = True
             return True
         except Exception as e:
-            self.logger.error(f"Error updating the script file: {str(e)}")
+            self.logger.error(f"Error updating the script arguments: {str(e)}")
             return False
 
     def set_frequency(self, frequency: float, channel: int = 0) -> bool:
@@ -283,37 +299,84 @@ class MirnyFrequencyGenerator(FrequencyGenerator):
             self.logger.error(f"Error setting ramp starting frequency: {str(e)}")
             return False
 
-    def update_freq_ramp_script(self) -> float:
+    def freq_ramp_arguments(self) -> Dict:
+        """Arguments of mirny_scan.py for the current ramp parameters"""
+        return {
+            'start_freq_kHz': float(self.ramp_params["Starting frequency kHz"]),
+            'end_freq_kHz': float(self.ramp_params["Ending frequency kHz"]),
+            'step_kHz': float(self.ramp_params["Frequency step kHz"]),
+            'step_delay': float(self.ramp_params["Delay seconds"]),
+            'turn_off': False,
+        }
+
+    def update_freq_ramp_script(self) -> bool:
         """
-        Updates frequency ramp script. Takes parameters from self.ramp_params dictionary.
+        Checks that the ramp parameters (self.ramp_params dictionary) make valid arguments of the ramp script.
         :return: True if update was successful, False otherwise
         """
-        script_path = self.freq_ramp_path # Path to the Artiq frequency ramp script
-        start_freq_update_line = 24
-        end_freq_update_line = 25
-        step_update_line = 27
-        delay_update_line = 29
-        turn_off_update_line = 31
-        code_updates = {start_freq_update_line: float(self.ramp_params["Starting frequency kHz"]),
-                        end_freq_update_line: float(self.ramp_params["Ending frequency kHz"]),
-                        step_update_line: float(self.ramp_params["Frequency step kHz"]),
-                        delay_update_line: float(self.ramp_params["Delay seconds"]),
-                        turn_off_update_line: False}
         try:
-            update_script_values_by_lines(script_path, code_updates)
+            self.freq_ramp_arguments()
             self.logger.info('UPDATING SCRIPT TO RAMP CAVITY DRIVE FREQUENCY')
-            # self.channel_params[0]['frequency'] = float(self.ramp_params["Ending frequency kHz"]*1e03)
-            # self.channel_params[0]['attenuation'] = 27
-            # self.channel_params[0]['on'] = True
-            # self.output_updated = True
-            # self.update_freq_gen_script()
             return True
         except Exception as e:
-            self.logger.error(f"Error updating the script file: {str(e)}")
+            self.logger.error(f"Error updating the script arguments: {str(e)}")
             return False
 
-    def run_freq_ramp_script(self):
-        run_artiq_in_clang64_visible(self.freq_ramp_path)
+    def worker_available(self) -> bool:
+        """
+        True if updates can go through the persistent Sinara worker, False if the template scripts should be run.
+        With a worker configured, a starting worker is waited for, and the scripts are only run if script_fallback
+        is set and the worker process is not alive: artiq_run next to a running worker would compete for the core
+        device. Otherwise raises RuntimeError, which fails the job.
+        """
+        if self.worker is None:
+            return False
+        if self.worker.is_available():
+            return True
+        if self.worker.process_alive() and self.worker.wait_for_start(self.WORKER_START_TIMEOUT):
+            return True
+        if self.script_fallback and not self.worker.process_alive():
+            self.logger.warning("Sinara worker not running, running the Mirny template script instead")
+            return False
+        raise RuntimeError("Sinara worker not available")
 
-    def run_freq_gen_script(self):
-        run_artiq_in_clang64_visible(self.freq_gen_path)
+    def run_freq_ramp_script(self) -> Job:
+        """
+        Queues the frequency ramp on the Sinara command queue and returns its job without waiting.
+        The ramp goes through the Sinara worker if it is running, otherwise the ramp script is run.
+        """
+        return self.command_queue.submit('mirny_ramp', self._run_freq_ramp)
+
+    def _run_freq_ramp(self, job=None):
+        """Runs the ramp with the ramp parameters at the time the job runs; the output stays at the end frequency"""
+        if self.worker_available():
+            self.worker.mirny_ramp(self.ramp_params["Starting frequency kHz"] * 1e03,
+                                   self.ramp_params["Ending frequency kHz"] * 1e03,
+                                   self.ramp_params["Frequency step kHz"] * 1e03,
+                                   self.ramp_params["Delay seconds"])
+            result = True
+        else:
+            result = self.runner.run(self.freq_ramp_path, **self.freq_ramp_arguments())
+        self.channel_params[0]['frequency'] = self.ramp_params["Ending frequency kHz"] * 1e03
+        return result
+
+    def run_freq_gen_script(self) -> Job:
+        """
+        Queues the single tone output on the Sinara command queue and returns its job without waiting.
+        Only the latest queued output is applied: a single tone job still waiting is superseded by a new one,
+        and the job uses the channel parameters at the time it runs.
+        """
+        return self.command_queue.submit('mirny_single_tone', self._run_freq_gen,
+                                         coalesce_key=('mirny', self.device_id, 0, 'output'))
+
+    def _run_freq_gen(self, job=None):
+        """Applies the channel parameters at the time the job runs"""
+        if self.worker_available():
+            self.worker.set_mirny(0, self.channel_params[0]['frequency'],
+                                  self.channel_params[0]['attenuation'], self.channel_params[0]['on'])
+            self.output_updated = True
+            self.logger.info(f"Mirny output applied by the Sinara worker in {self.worker.last_latency:.3f} s")
+            return True
+        result = self.runner.run(self.freq_gen_path, **self.freq_gen_arguments())
+        self.output_updated = True
+        return result
@@ -2,8 +2,10 @@ from controllers.frequency_generators.FrequencyGenerator import FrequencyGenerat
 import subprocess
 import platform
 from typing import Optional, Dict, List, Union, Tuple
-from controllers.sinara.modify_experiment import update_script_values_by_lines
-from controllers.sinara.run_artiq_script import run_artiq_in_clang64_visible
+from controllers.sinara.ArtiqRunner import ArtiqRunner
+from controllers.sinara.ArtiqWorkerClient import ArtiqWorkerClient
+from controllers.sinara.SinaraCommandQueue import SinaraCommandQueue, sinara_queue
+from controllers.utils.JobManager import Job
 
 class UrukulFrequencyGenerator(FrequencyGenerator):
     """
@@ -14,22 +16,40 @@ class UrukulFrequencyGenerator(FrequencyGenerator):
     with individual instruments), so the basic idea is following. There is a number of
     template scripts implementing certain use cases, such as particle loading,
     continuous Urukul operation with monitoring experiment through Sampler etc.
-    Communicating with Urukul changes certain parameters in corresponding template,
-    and then runs .bat file to run the script in Artiq. This makes it VERY slow and
+    The templates take their parameters as experiment arguments, which are passed
+    when the script is run in Artiq (see ArtiqRunner). This makes it VERY slow and
     unflexible.
+    If the persistent Sinara worker (controllers/sinara/sinara_worker.py) is running, the
+    outputs are pushed to it instead, which takes milliseconds; the scripts are only used
+    without a worker, or with script_fallback when the worker is not running. Either way,
+    runs are queued on the Sinara command queue and return a job immediately.
     """
+    WORKER_START_TIMEOUT = 30.0  # Time a job waits for a starting Sinara worker (s)
 
-    def __init__(self, device_id: str, channel_params: Dict = None, connection_params: Dict = None):
+    def __init__(self, device_id: str, channel_params: Dict = None, connection_params: Dict = None,
+                 freq_gen_path: str = None, worker: ArtiqWorkerClient = None, runner: ArtiqRunner = None,
+                 command_queue: SinaraCommandQueue = None, script_fallback: bool = False):
         """
         Args:
             device_id: ID of Urukul in case there is more than 1. Not implemented for now.
             channel_params: Dictionary of channel output parameters.
                     Format: {int ch_num : {'frequency': float, 'amplitude': float, 'attenuation': float, 'on': bool}}
             connection_params: IP address of Kasli
+            freq_gen_path: Artiq script setting all channels, used without the worker
+            worker: Client of the persistent Sinara worker
+            runner: Runs the template scripts, shared by all Sinara modules
+            command_queue: Queue serializing Sinara jobs, shared by all Sinara modules
+            script_fallback: Run the template scripts if the worker is configured but not running
         """
         super().__init__(device_id, connection_params)
         self.channel_params = channel_params
         self.output_updated = False
+        self.worker = worker
+        self.runner = runner or ArtiqRunner()
+        self.command_queue = command_queue or sinara_queue
+        self.script_fallback = script_fallback
+        self.freq_gen_path = freq_gen_path or 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/urukul_as_freq_gen.py'
+        self.move_particles_path = 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/move_particle.py'
         self.connect()
 
     def connect(self) -> bool:
@@ -62,23 +82,58 @@ class UrukulFrequencyGenerator(FrequencyGenerator):
         """Disconnect from Urukul - nothing to be done here"""
         return True
 
-    def update_freq_gen_script(self, script: str, starting_line: int) -> bool:
-        updates = {}
-        # First we generate a dictionary with line number and new numerical value of variable at that line
-        # For every Urukul channel
+    def freq_gen_arguments(self) -> Dict:
+        """Arguments of urukul_as_freq_gen.py for the current channel parameters"""
+        arguments = {}
         for i in range(0,4):
-            updates[starting_line+i] = float(self.channel_params[i]['frequency']) # Output frequency
-            updates[starting_line+i+5] = float(self.channel_params[i]['amplitude']) # Channel amplitude
-            updates[starting_line+i+10] = float(self.channel_params[i]['attenuation']) # Attenuation
-            updates[starting_line+i+15] = self.channel_params[i]['on'] # If the channel should be on
-        # Now we push the updates into the driver script
-        try:
-            update_script_values_by_lines(script, updates)
-            self.output_updated = True
+            arguments[f'freq_ch{i}'] = float(self.channel_params[i]['frequency']) # Output frequency
+            arguments[f'amp_ch{i}'] = float(self.channel_params[i]['amplitude']) # Channel amplitude
+            arguments[f'att_ch{i}'] = float(self.channel_params[i]['attenuation']) # Attenuation
+            arguments[f'ch{i}_on'] = bool(self.channel_params[i]['on']) # If the channel should be on
+        return arguments
+
+    def worker_available(self) -> bool:
+        """
+        True if updates can go through the persistent Sinara worker, False if the template scripts should be run.
+        With a worker configured, a starting worker is waited for, and the scripts are only run if script_fallback
+        is set and the worker process is not alive: artiq_run next to a running worker would compete for the core
+        device. Otherwise raises RuntimeError, which fails the job.
+        """
+        if self.worker is None:
+            return False
+        if self.worker.is_available():
             return True
-        except Exception as e:
-            self.logger.error(f"Error updating the script file: {str(e)}")
+        if self.worker.process_alive() and self.worker.wait_for_start(self.WORKER_START_TIMEOUT):
+            return True
+        if self.script_fallback and not self.worker.process_alive():
+            self.logger.warning("Sinara worker not running, running the Urukul template script instead")
             return False
+        raise RuntimeError("Sinara worker not available")
+
+    def run_freq_gen_script(self) -> Job:
+        """
+        Queues applying the parameters of all channels on the Sinara command queue and returns the job
+        without waiting. All channels are applied together, so only the latest queued update is applied:
+        one still waiting is superseded by a new one, and the job uses the parameters at the time it runs.
+        """
+        return self.command_queue.submit('urukul_output', self._run_freq_gen,
+                                         coalesce_key=('urukul', self.device_id, 'output'))
+
+    def _run_freq_gen(self, job=None):
+        """
+        Applies the parameters of all channels: through the Sinara worker if it is running,
+        otherwise by running the frequency generator script in Artiq with them as arguments.
+        """
+        if self.worker_available():
+            for channel, params in self.channel_params.items():
+                self.worker.set_urukul(channel, params['frequency'], params['amplitude'],
+                                       params['attenuation'], params['on'])
+            self.output_updated = True
+            self.logger.info(f"Urukul outputs applied by the Sinara worker in {self.worker.last_latency:.3f} s")
+            return True
+        self.runner.run(self.freq_gen_path, **self.freq_gen_arguments())
+        self.output_updated = True
+        return True
 
     def set_frequency(self, frequency: float, channel: int = 0) -> bool:
         """Set the output frequency of Urukul."""
@@ -188,23 +243,38 @@ class UrukulFrequencyGenerator(FrequencyGenerator):
     def is_up_to_date(self):
         return self.output_updated
 
-    def move_particles(self, detuning: float, duration: float, distance: float = 0.0) -> float:
+    def move_particles(self, detuning: float, duration: float, distance: float = 0.0) -> Job:
         """
+        Queues moving the particles on the Sinara command queue and returns the job without waiting.
         Args:
             detuning: (Hz) Detuning between AOMs. Detuning <0 moves the particle towards science chamber
             duration: (s) How long the particle should move at given detuning.
             distance: (m) Total distance the particle should travel.
         Returns:
-            distance: (m) Total distance travelled (TODO: IMPLEMENT)
+            job: its result is the total distance travelled (m) (TODO: IMPLEMENT)
         """
-        script_path = 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/move_particle.py'
-        detuning_update_line = 15
-        time_update_line = 16
-        code_updates = {detuning_update_line: float(detuning), time_update_line:float(duration)}
-        try:
-            update_script_values_by_lines(script_path, code_updates)
-            print('UPDATING SCRIPT TO MOVE PARTICLES')
-            run_artiq_in_clang64_visible(script_path)
-        except Exception as e:
-            self.logger.error(f"Error updating the script file: {str(e)}")
+        return self.command_queue.submit('move_particles', self._move_particles, detuning, duration, distance)
+
+    def _move_particles(self, detuning: float, duration: float, distance: float = 0.0, job=None) -> float:
+        if self.worker_available():
+            print('MOVING PARTICLES THROUGH THE SINARA WORKER')
+            self.worker.move_particles(detuning, duration,
+                                       frequency=self.channel_params[0]['frequency'],
+                                       amplitude_load=self.channel_params[0]['amplitude'],
+                                       attenuation_load=self.channel_params[0]['attenuation'],
+                                       amplitude_science=self.channel_params[1]['amplitude'],
+                                       attenuation_science=self.channel_params[1]['attenuation'])
+        else:
+            arguments = {'detuning': float(detuning), 'transport_time': float(duration),
+                         'freq_load': float(self.channel_params[0]['frequency']),
+                         'amp_load': float(self.channel_params[0]['amplitude']),
+                         'att_load': float(self.channel_params[0]['attenuation']),
+                         'amp_sci': float(self.channel_params[1]['amplitude']),
+                         'att_sci': float(self.channel_params[1]['attenuation'])}
+            print('RUNNING SCRIPT TO MOVE PARTICLES')
+            self.runner.run(self.move_particles_path, **arguments)
+        # The conveyor belt leaves both AOMs on at the loading frequency
+        for channel in (0, 1):
+            self.channel_params[channel]['frequency'] = self.channel_params[0]['frequency']
+            self.channel_params[channel]['on'] = True
         return distance
@@ -0,0 +1,184 @@
+"""
+Single-container storage for chunked PicoScope measurement sets.
+
+A measurement set is stored as two append-only files instead of one .bin file per chunk:
+
+- <name>_chunks.dat: a HEADER_SIZE byte header (MAGIC followed by a JSON description, padded with spaces) and
+  fixed-size records, one per chunk, each a C-ordered (channels, samples) int16 array. Record i starts at
+  HEADER_SIZE + i * record_bytes.
+- <name>_chunks.idx: one INDEX_DTYPE entry per chunk, appended after its record is written, with the record
+  offset, actual samples per channel, trigger time (Unix time, s) and overflow bit field (bit 0 = channel A).
+
+Only chunks with an index entry are complete, so an interrupted measurement can still be read. ChunkStoreReader
+memory-maps the data file and returns (chunk, channel, sample) views without loading it.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+
+MAGIC = b'PICOCHK1'
+HEADER_SIZE = 4096
+MAX_CHANNELS = 4
+INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('actual_samples', '<i4', (MAX_CHANNELS,)),
+    ('trigger_time', '<f8'),
+    ('overflow', '<i2'),
+])
+
+
+def chunk_store_paths(base_path):
+    """Data and index file paths of the store at base_path (directory + measurement name)"""
+    return f'{base_path}_chunks.dat', f'{base_path}_chunks.idx'
+
+
+class ChunkStoreWriter:
+    """Appends fixed-size (channels, samples) chunks to a single data file and their entries to the index"""
+
+    def __init__(self, base_path, channels, num_samples, dtype=np.int16, description=None):
+        if len(channels) > MAX_CHANNELS:
+            raise ValueError(f"At most {MAX_CHANNELS} channels can be stored, got {len(channels)}")
+        self.data_path, self.index_path = chunk_store_paths(base_path)
+        self.channels = list(channels)
+        self.num_samples = int(num_samples)
+        self.dtype = np.dtype(dtype)
+        self.record_bytes = len(self.channels) * self.num_samples * self.dtype.itemsize
+        self.num_chunks = 0
+
+        header = {
+            'format': 'ChunkStore',
+            'version': 1,
+            'channels': self.channels,
+            'samples': self.num_samples,
+            'dtype': self.dtype.str,
+            'record_bytes': self.record_bytes,
+            'header_size': HEADER_SIZE,
+            'created': time.time(),
+            'description': description or {},
+        }
+        header_bytes = MAGIC + json.dumps(header).encode('utf-8')
+        if len(header_bytes) > HEADER_SIZE:
+            raise ValueError("ChunkStore header description is too long")
+
+        # unbuffered: records are large, and a failed write can be cut back to the last complete record
+        self._data_file = open(self.data_path, 'wb', buffering=0)
+        self._data_file.write(header_bytes.ljust(HEADER_SIZE, b' '))
+        self._index_file = open(self.index_path, 'wb')
+        self._entry = np.zeros(1, dtype=INDEX_DTYPE)
+
+    def append(self, data, actual_samples=None, trigger_time=None, overflow=0):
+        """Append one (channels, samples) chunk; returns its chunk index"""
+        self._write_record(data)
+        self._write_index(actual_samples, trigger_time, overflow)
+        return self.num_chunks - 1
+
+    def append_many(self, data, actual_samples=None, trigger_times=None, overflow=None):
+        """Append a (chunks, channels, samples) array with a single write; returns the first chunk index"""
+        first = self.num_chunks
+        self._write_record(data)
+        for i in range(data.shape[0]):
+            self._write_index(actual_samples[i] if actual_samples is not None else None,
+                              trigger_times[i] if trigger_times is not None else None,
+                              overflow[i] if overflow is not None else 0)
+        return first
+
+    def _write_record(self, data):
+        if data.shape[-2:] != (len(self.channels), self.num_samples) or data.dtype != self.dtype:
+            raise ValueError(f"Chunk of shape {data.shape} and type {data.dtype} does not match the store "
+                             f"({len(self.channels)}, {self.num_samples}) {self.dtype}")
+        end = HEADER_SIZE + self.num_chunks * self.record_bytes  # end of the last complete record
+        record = memoryview(np.ascontiguousarray(data)).cast('B')
+        try:
+            written = 0
+            while written < len(record):
+                written += self._data_file.write(record[written:])
+        except Exception:
+            # drop a partially written record, so the next one starts at its indexed offset
+            self._data_file.truncate(end)
+            self._data_file.seek(end)
+            raise
+
+    def _write_index(self, actual_samples, trigger_time, overflow):
+        entry = self._entry[0]
+        entry['offset'] = HEADER_SIZE + self.num_chunks * self.record_bytes
+        entry['actual_samples'] = 0
+        samples = actual_samples if actual_samples is not None else [self.num_samples] * len(self.channels)
+        entry['actual_samples'][:len(self.channels)] = samples
+        entry['trigger_time'] = trigger_time if trigger_time is not None else np.nan
+        entry['overflow'] = overflow
+        self._index_file.write(self._entry.tobytes())
+        self._index_file.flush()
+        self.num_chunks += 1
+
+    def close(self):
+        self._data_file.close()
+        self._index_file.close()
+
+
+class ChunkStoreReader:
+    """
+    Lazily reads a ChunkStore through a read-only memory map.
+
+    data is a (chunk, channel, sample) np.memmap over the complete chunks; indexing it only reads the pages that
+    are used. Per chunk index fields are available as arrays (actual_samples, trigger_times, overflow).
+    """
+
+    def __init__(self, base_path):
+        self.data_path, self.index_path = chunk_store_paths(base_path)
+        with open(self.data_path, 'rb') as f:
+            raw_header = f.read(HEADER_SIZE)
+        if not raw_header.startswith(MAGIC):
+            raise ValueError(f"{self.data_path} is not a ChunkStore data file")
+        self.header = json.loads(raw_header[len(MAGIC):].decode('utf-8').rstrip())
+        self.channels = self.header['channels']
+        self.num_samples = self.header['samples']
+        self.dtype = np.dtype(self.header['dtype'])
+
+        self.index = np.fromfile(self.index_path, dtype=INDEX_DTYPE) if os.path.exists(self.index_path) \
+            else np.zeros(0, dtype=INDEX_DTYPE)
+        # only chunks whose record is completely on disk
+        complete = (os.path.getsize(self.data_path) - HEADER_SIZE) // self.header['record_bytes']
+        self.index = self.index[:complete]
+        self.num_chunks = len(self.index)
+        if self.num_chunks:
+            self.data = np.memmap(self.data_path, dtype=self.dtype, mode='r', offset=HEADER_SIZE,
+                                  shape=(self.num_chunks, len(self.channels), self.num_samples))
+        else:
+            self.data = np.zeros((0, len(self.channels), self.num_samples), dtype=self.dtype)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def actual_samples(self):
+        """(chunks, channels) samples actually acquired; the rest of each record is undefined"""
+        return self.index['actual_samples'][:, :len(self.channels)]
+
+    @property
+    def trigger_times(self):
+        return self.index['trigger_time']
+
+    @property
+    def overflow(self):
+        return self.index['overflow']
+
+    def __len__(self):
+        return self.num_chunks
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    def chunk(self, index, channel=None):
+        """View of one chunk trimmed to its acquired samples, (channels, samples) or (samples,) for one channel"""
+        samples = int(self.actual_samples[index].min())
+        if channel is None:
+            return self.data[index, :, :samples]
+        return self.data[index, self.channels.index(channel), :samples]
+
+    def close(self):
+        """Drop the memory map (it is released once no views of it remain)"""
+        self.data = None
@@ -0,0 +1,61 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class ChunkWriter:
+    """
+    Writes acquired chunks on a background thread so the scope can be re-armed while the previous chunk is saved.
+
+    Chunks are read into buffers from a small preallocated pool (get_buffer) and handed over with submit(); the
+    writer thread calls sink(index, data, info) and returns the buffer to the pool. The pool bounds the queue: if
+    the disk falls behind, get_buffer blocks instead of allocating more memory.
+    """
+
+    def __init__(self, sink, shape, num_buffers=4, dtype=np.int16):
+        self._sink = sink
+        self._free = queue.Queue()
+        for _ in range(num_buffers):
+            self._free.put(np.empty(shape, dtype=dtype))
+        self._queue = queue.Queue(maxsize=num_buffers)
+        self.write_times = {}  # chunk index -> seconds spent in sink
+        self.errors = {}  # chunk index -> error message
+        self.buffer_wait = 0.0  # Seconds the acquisition waited for a free buffer
+        self._thread = threading.Thread(target=self._run, name='ChunkWriter', daemon=True)
+        self._thread.start()
+
+    def get_buffer(self):
+        """A free buffer to read the next chunk into (blocks while all buffers wait to be written)"""
+        t_start = time.perf_counter()
+        buffer = self._free.get()
+        self.buffer_wait += time.perf_counter() - t_start
+        return buffer
+
+    def submit(self, index, buffer, info=None):
+        self._queue.put((index, buffer, info))
+
+    def release(self, buffer):
+        """Return a buffer that was not submitted (e.g. after a failed readout)"""
+        self._free.put(buffer)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            index, buffer, info = item
+            t_start = time.perf_counter()
+            try:
+                self._sink(index, buffer, info)
+            except Exception as e:
+                self.errors[index] = str(e)
+                print(f"Error writing chunk {index}: {e}")
+            self.write_times[index] = time.perf_counter() - t_start
+            self._free.put(buffer)
+
+    def close(self):
+        """Wait until all submitted chunks are written"""
+        self._queue.put(None)
+        self._thread.join()
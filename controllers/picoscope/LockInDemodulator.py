@@ -0,0 +1,287 @@
+"""
+Streaming digital lock-in (IQ demodulation) of a PicoScope channel.
+
+Each streamed block of the selected channel is converted to volts, mixed with a numerically controlled oscillator
+at the reference frequency and low-pass filtered and decimated in two stages:
+
+- a CIC decimator (cic_stages cascaded moving sums of cic_ratio samples, keeping every cic_ratio-th output),
+- a windowed-sinc FIR decimator (fir_taps taps, keeping every fir_ratio-th output) that sets the final bandwidth.
+
+All stages keep their state between blocks (oscillator phase, filter histories, decimation phase), so the output
+is the same however the stream is split into blocks. The output is the complex amplitude
+z = I + iQ = A exp(i phi) of a signal A cos(2 pi f t + phi) at sample_rate / (cic_ratio * fir_ratio).
+"""
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from controllers.utils.SampleRingBuffer import SampleRingBuffer
+from controllers.picoscope.StreamWriter import StreamWriter
+
+
+class NCO:
+    """Complex local oscillator exp(-i 2 pi f t) with a phase that continues across blocks"""
+
+    def __init__(self, frequency, sample_rate):
+        self.frequency = frequency
+        self.sample_rate = sample_rate
+        self._step = 2 * np.pi * frequency / sample_rate
+        self._phase = 0.0
+        self._table = np.zeros(0, dtype=np.complex64)
+
+    def reset(self):
+        self._phase = 0.0
+
+    def next(self, n):
+        """Oscillator values of the next n samples"""
+        if self._table.shape[0] < n:
+            # exp(-i step k) is computed once per block length; each block only rotates it by its start phase
+            self._table = np.exp(-1j * self._step * np.arange(n)).astype(np.complex64)
+        lo = self._table[:n] * np.complex64(np.exp(-1j * self._phase))
+        self._phase = (self._phase + self._step * n) % (2 * np.pi)
+        return lo
+
+
+class CICDecimator:
+    """
+    CIC decimator: `stages` cascaded moving sums of `ratio` samples, then every ratio-th sample (gain normalized).
+
+    The moving sums use a cumulative sum over each block plus the last ratio - 1 samples of the previous one,
+    rather than free-running integrators, so floating point errors do not accumulate over long streams.
+    """
+
+    def __init__(self, ratio, stages=3):
+        self.ratio = int(ratio)
+        self.stages = int(stages)
+        self.reset()
+
+    def reset(self):
+        self._history = [np.zeros(self.ratio - 1, dtype=np.complex128) for _ in range(self.stages)]
+        self._phase = 0  # Input samples until the next kept output
+
+    def process(self, x):
+        if self.ratio == 1:
+            return x
+        y = x.astype(np.complex128)
+        for stage in range(self.stages):
+            extended = np.concatenate((self._history[stage], y))
+            self._history[stage] = extended[len(extended) - (self.ratio - 1):]
+            sums = np.empty(len(extended) + 1, dtype=np.complex128)
+            sums[0] = 0
+            np.cumsum(extended, out=sums[1:])
+            if stage < self.stages - 1:
+                y = sums[self.ratio:] - sums[:-self.ratio]
+            else:
+                # only the kept outputs of the last stage
+                kept = slice(self._phase, None, self.ratio)
+                y = sums[self.ratio:][kept] - sums[:-self.ratio][kept]
+        self._phase = (self._phase - len(x)) % self.ratio
+        return (y / float(self.ratio) ** self.stages).astype(np.complex64)
+
+
+class FIRDecimator:
+    """Windowed-sinc (Blackman) low-pass FIR that keeps every ratio-th output; cutoff relative to the input rate"""
+
+    def __init__(self, ratio, taps=64, cutoff=None):
+        self.ratio = int(ratio)
+        self.taps = int(taps)
+        # default cutoff: 80% of the output Nyquist frequency
+        self.cutoff = cutoff if cutoff is not None else 0.4 / self.ratio
+        n = np.arange(self.taps) - (self.taps - 1) / 2
+        h = 2 * self.cutoff * np.sinc(2 * self.cutoff * n) * np.blackman(self.taps)
+        self.coefficients = (h / h.sum()).astype(np.float32)
+        self._reversed = self.coefficients[::-1].copy()
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(self.taps - 1, dtype=np.complex64)
+        self._phase = 0
+
+    def process(self, x):
+        if len(x) == 0:
+            # e.g. a block too short for the CIC stage to produce an output
+            return np.zeros(0, dtype=np.complex64)
+        extended = np.concatenate((self._history, x))
+        self._history = extended[len(extended) - (self.taps - 1):]
+        windows = np.lib.stride_tricks.sliding_window_view(extended, self.taps)[self._phase::self.ratio]
+        self._phase = (self._phase - len(x)) % self.ratio
+        return windows @ self._reversed
+
+
+class LockInDemodulator:
+    """
+    Lock-in stage for PicoInterface.run_streaming (see PicoInterface.stream_processors).
+
+    The driver callback only copies the channel's block into a queue (put); a worker thread demodulates it.
+    Decimated I/Q is kept in `live_buffer` (SampleRingBuffer, rows I and Q, float32 volts) for display and, if
+    the stream is saved, written as interleaved float32 I, Q pairs to <stream>_<name>_iq.bin. Blocks arriving while
+    the queue is full are dropped and counted, never blocking the driver callback.
+
+    With output_rate set, cic_ratio is chosen for each stream so that the output rate is close to it at the
+    stream's sample rate (fir_ratio is kept unless the total decimation is smaller).
+    """
+
+    QUEUE_BLOCKS = 64
+
+    def __init__(self, name, channel, reference_frequency, cic_ratio=100, cic_stages=3, fir_ratio=10, fir_taps=64,
+                 output_rate=None, live_seconds=10.0):
+        self.name = name
+        self.channel = channel
+        self.reference_frequency = reference_frequency
+        self.cic_ratio = int(cic_ratio)
+        self.cic_stages = int(cic_stages)
+        self.fir_ratio = int(fir_ratio)
+        self.fir_taps = int(fir_taps)
+        self.target_output_rate = output_rate
+        self._fir_ratio_setting = self.fir_ratio
+        self.live_seconds = live_seconds
+
+        self.sample_rate = None
+        self.live_buffer = None
+        self.record_path = None
+        self._nco = None
+        self._cic = CICDecimator(self.cic_ratio, self.cic_stages)
+        self._fir = FIRDecimator(self.fir_ratio, self.fir_taps)
+        self._row = None
+        self._scale = 1.0
+        self._offset = 0.0
+        self._queue = None
+        self._thread = None
+        self._writer = None
+        self._reset_stats()
+
+    @property
+    def decimation(self):
+        return self.cic_ratio * self.fir_ratio
+
+    @property
+    def output_rate(self):
+        return self.sample_rate / self.decimation if self.sample_rate else None
+
+    def _reset_stats(self):
+        self.input_samples = 0
+        self.output_samples = 0
+        self.dropped_samples = 0
+        self.process_time = 0.0
+        self.error = None
+
+    def configure(self, sample_rate, volts_per_count=1.0, offset=0.0, row=0):
+        """Set up the filters for a stream; row is the channel's row in the streamed (channels, n) blocks"""
+        self.sample_rate = sample_rate
+        self._row = row
+        self._scale = volts_per_count
+        self._offset = offset
+        self._nco = NCO(self.reference_frequency, sample_rate)
+        if self.target_output_rate:
+            decimation = max(1, round(sample_rate / self.target_output_rate))
+            fir_ratio = min(self._fir_ratio_setting, decimation)
+            cic_ratio = max(1, round(decimation / fir_ratio))
+            if (cic_ratio, fir_ratio) != (self.cic_ratio, self.fir_ratio):
+                self.cic_ratio, self.fir_ratio = cic_ratio, fir_ratio
+                self._cic = CICDecimator(self.cic_ratio, self.cic_stages)
+                self._fir = FIRDecimator(self.fir_ratio, self.fir_taps)
+        self._cic.reset()
+        self._fir.reset()
+        capacity = max(1024, int(self.live_seconds * self.output_rate))
+        if self.live_buffer is None or self.live_buffer.capacity != capacity:
+            self.live_buffer = SampleRingBuffer(2, capacity, dtype=np.float32)
+        else:
+            self.live_buffer.clear()
+        self._reset_stats()
+
+    def process(self, raw):
+        """Demodulate a block of raw ADC counts (or volts with volts_per_count=1) of the channel; returns complex I/Q"""
+        t_start = time.perf_counter()
+        volts = raw.astype(np.float32)
+        volts *= self._scale
+        volts -= self._offset
+        mixed = volts * self._nco.next(len(volts))
+        # 2 x the low-pass of x * exp(-i w t) is the complex amplitude A exp(i phi)
+        z = 2 * self._fir.process(self._cic.process(mixed))
+        self.input_samples += len(raw)
+        self.output_samples += len(z)
+        if len(z):
+            iq = np.empty((2, len(z)), dtype=np.float32)
+            iq[0] = z.real
+            iq[1] = z.imag
+            self.live_buffer.write(iq)
+            if self._writer is not None:
+                self._writer.put(iq, blocking=True)
+        self.process_time += time.perf_counter() - t_start
+        return z
+
+    # Streaming
+
+    def start(self, sample_rate, volts_per_count, offset, row, record_path=None, expected_samples=0):
+        """Start the worker thread for a stream; record_path is the stream's data file (I/Q is saved next to it)"""
+        self.configure(sample_rate, volts_per_count, offset, row)
+        self._writer = None
+        self.record_path = None
+        if record_path:
+            self.record_path = f"{os.path.splitext(record_path)[0]}_{self.name}_iq.bin"
+            self._writer = StreamWriter(self.record_path, 2, expected_samples // self.decimation + 1,
+                                        sample_rate=self.output_rate, dtype=np.float32)
+        self._queue = queue.Queue(maxsize=self.QUEUE_BLOCKS)
+        self._thread = threading.Thread(target=self._run, name=f'LockIn-{self.name}', daemon=True)
+        self._thread.start()
+
+    def put(self, block):
+        """Queue the channel's samples of a streamed (channels, n) block; called from the driver callback"""
+        try:
+            self._queue.put_nowait(block[self._row].copy())
+        except queue.Full:
+            self.dropped_samples += block.shape[1]
+
+    def _run(self):
+        while True:
+            raw = self._queue.get()
+            if raw is None:
+                break
+            try:
+                self.process(raw)
+            except Exception as e:
+                # keep consuming the queue, so the driver callback and close() never wait on a dead worker
+                self.error = str(e)
+                print(f"Lock-in {self.name}: processing failed: {e}")
+
+    def close(self):
+        """Process the queued blocks, stop the worker and close the I/Q file"""
+        if self._thread is not None:
+            if self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.dropped_samples:
+            print(f"Lock-in {self.name}: dropped {self.dropped_samples} samples (processing too slow)")
+
+    def latest(self, n=None):
+        """Newest n decimated samples as (time relative to the newest sample (s), amplitude (V), phase (rad))"""
+        if self.live_buffer is None or len(self.live_buffer) == 0:
+            return None
+        iq = self.live_buffer.latest(n)
+        times = (np.arange(iq.shape[1]) - (iq.shape[1] - 1)) / self.output_rate
+        return times, np.hypot(iq[0], iq[1]), np.arctan2(iq[1], iq[0])
+
+    def stats(self):
+        """Settings and processing statistics for the stream metadata"""
+        return {
+            'Channel': self.channel,
+            'ReferenceFrequency, Hz': self.reference_frequency,
+            'CIC': {'Ratio': self.cic_ratio, 'Stages': self.cic_stages},
+            'FIR': {'Ratio': self.fir_ratio, 'Taps': self.fir_taps, 'Cutoff, Hz':
+                    self._fir.cutoff * self.sample_rate / self.cic_ratio if self.sample_rate else None},
+            'OutputRate, Hz': self.output_rate,
+            'InputSamples': self.input_samples,
+            'OutputSamples': self.output_samples,
+            'DroppedSamples': self.dropped_samples,
+            'ProcessTime, s': self.process_time,
+            'DataFile': os.path.basename(self.record_path) if self.record_path else None,
+            'StorageFormat': 'Float32_Interleaved_IQ, V',
+            'Error': self.error,
+        }
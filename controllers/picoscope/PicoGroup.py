@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from controllers.picoscope.ChunkStore import ChunkStoreReader
+
+
+class _DeviceJob:
+    """Job view given to one unit of a group: progress is averaged over the units, cancelling is shared"""
+
+    def __init__(self, job, progress, index):
+        self._job = job
+        self._progress = progress
+        self._index = index
+
+    @property
+    def cancelled(self):
+        return self._job.cancelled
+
+    def update(self, progress=None, message=None):
+        if progress is not None:
+            self._progress[self._index] = progress
+        self._job.update(sum(self._progress) / len(self._progress), message)
+
+
+class PicoGroup:
+    """
+    Several PicoInterface units acquiring together on a shared external trigger.
+
+    The trigger signal is wired to the EXT input of every unit. An acquisition runs each unit's own run_streaming /
+    run_multi_block_acquisition / run_rapid_block_acquisition on its own thread; the threads are released together
+    by a barrier, so the units are armed at the same time and collect in parallel. Every unit writes its data set,
+    named after the unit, into a common group directory, and <name>_group.json records how they line up (read it
+    with PicoGroupDataSet):
+
+    - streams: each unit's stored sample index of the trigger ('TriggerSample' of its header),
+    - multi block: chunks matched by trigger time, so a unit that missed a trigger does not shift the others,
+    - rapid block: segment i of every unit is trigger i.
+    """
+
+    # Largest difference of the host trigger times of matching chunks of two units (s)
+    TRIGGER_MATCH_TOLERANCE = 0.05
+
+    def __init__(self, devices, name='pico_group'):
+        self.devices = list(devices)
+        self.name = name
+        self.trigger = None
+        names = [device.get_name() for device in self.devices]
+        if len(set(names)) != len(names) or '' in names:
+            raise ValueError(f"Units of a PicoGroup need unique names, got {names}")
+
+    def get_name(self):
+        return self.name
+
+    @property
+    def is_open(self):
+        return bool(self.devices) and all(device.is_open for device in self.devices)
+
+    def open(self):
+        """Open all units; returns True if all of them opened"""
+        return all([device.open() for device in self.devices])
+
+    def close(self):
+        return all([device.close() for device in self.devices])
+
+    def configure(self, sampling_interval=None, acquisition_time=None, resolution=None, channel_config=None):
+        """Apply the same resolution, sampling and channel settings (see configure_channels) to all units"""
+        success = True
+        for device in self.devices:
+            if resolution is not None:
+                success &= bool(device.set_resolution(resolution))
+            if channel_config is not None:
+                success &= bool(device.configure_channels(channel_config))
+            if sampling_interval is not None:
+                device.set_sampling_period(sampling_interval, acquisition_time or device.acquisition_time)
+        rates = {device.get_name(): device.actual_sample_freq for device in self.devices}
+        if len(set(rates.values())) > 1:
+            print(f"Warning: units sample at different frequencies: {rates}")
+        return success
+
+    def set_trigger(self, threshold=0.0, direction='Rising', delay=0, auto_trigger=False, timeout_ms=1000):
+        """Trigger all units on their EXT input"""
+        self.trigger = {'Channel': 'External', 'Threshold, V': threshold, 'Direction': direction,
+                        'Delay': delay, 'AutoTrigger': auto_trigger}
+        return all([device.set_trigger('External', threshold, direction, delay, auto_trigger, timeout_ms)
+                    for device in self.devices])
+
+    # Acquisition
+
+    def _run_parallel(self, method, job, kwargs_for):
+        """Call method(**kwargs_for(device)) on every unit in its own thread; returns {name: metadata file}"""
+        barrier = threading.Barrier(len(self.devices))
+        progress = [0.0] * len(self.devices)
+        metadata_files = {}
+
+        def run(index, device):
+            device.last_metadata_file = None
+            try:
+                barrier.wait()
+                device_job = _DeviceJob(job, progress, index) if job is not None else None
+                getattr(device, method)(job=device_job, **kwargs_for(device))
+            except Exception as e:
+                print(f"{device.get_name()}: {method} failed: {e}")
+            metadata_files[device.get_name()] = device.last_metadata_file
+
+        threads = [threading.Thread(target=run, args=(i, device), name=f'PicoGroup-{device.get_name()}')
+                   for i, device in enumerate(self.devices)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return metadata_files
+
+    def run_streaming(self, data_dir, measurement_set_name, duration=None, additional_metadata=None, job=None,
+                      **kwargs):
+        """Stream all units at once (kwargs: see PicoInterface.run_streaming); returns the group metadata file"""
+        group_dir = self._group_dir(data_dir, measurement_set_name)
+        metadata_files = self._run_parallel('run_streaming', job, lambda device: dict(
+            kwargs, duration=duration, data_dir=group_dir, filename=device.get_name(),
+            additional_metadata=additional_metadata))
+        return self._save_group(group_dir, measurement_set_name, 'stream', metadata_files,
+                                self._align_streams(metadata_files))
+
+    def run_multi_block_acquisition(self, data_dir, measurement_set_name, num_chunks, pre_trigger_percent=0,
+                                    additional_metadata=None, job=None):
+        """Triggered block captures on all units in parallel; returns the group metadata file"""
+        group_dir = self._group_dir(data_dir, measurement_set_name)
+        metadata_files = self._run_parallel('run_multi_block_acquisition', job, lambda device: dict(
+            data_dir=group_dir, measurement_set_name=device.get_name(), num_chunks=num_chunks,
+            pre_trigger_percent=pre_trigger_percent, additional_metadata=additional_metadata))
+        return self._save_group(group_dir, measurement_set_name, 'multi_block', metadata_files,
+                                self._align_chunks(metadata_files, by_trigger_time=True))
+
+    def run_rapid_block_acquisition(self, data_dir, measurement_set_name, num_segments, pre_trigger_percent=0,
+                                    additional_metadata=None, job=None):
+        """Rapid block captures on all units in parallel; returns the group metadata file"""
+        group_dir = self._group_dir(data_dir, measurement_set_name)
+        metadata_files = self._run_parallel('run_rapid_block_acquisition', job, lambda device: dict(
+            data_dir=group_dir, measurement_set_name=device.get_name(), num_segments=num_segments,
+            pre_trigger_percent=pre_trigger_percent, additional_metadata=additional_metadata))
+        return self._save_group(group_dir, measurement_set_name, 'rapid_block', metadata_files,
+                                self._align_chunks(metadata_files, by_trigger_time=False))
+
+    # Alignment
+
+    @staticmethod
+    def _group_dir(data_dir, measurement_set_name):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        group_dir = os.path.join(data_dir, "_".join([timestamp, measurement_set_name]))
+        os.makedirs(group_dir, exist_ok=True)
+        return group_dir
+
+    @staticmethod
+    def _load_metadata(metadata_files):
+        metadata = {}
+        for name, path in metadata_files.items():
+            if path is None:
+                print(f"{name}: no data saved, left out of the group data set")
+                continue
+            with open(path) as f:
+                metadata[name] = json.load(f)
+        return metadata
+
+    def _align_streams(self, metadata_files):
+        """Start sample of every stream so that the triggers line up, and the common length"""
+        metadata = self._load_metadata(metadata_files)
+        if not metadata:
+            return None
+        samples = {name: md.get('Writer', {}).get('WrittenSamples', md['ActualNumberOfSamples'])
+                   for name, md in metadata.items()}
+        triggers = {name: md.get('TriggerSample') for name, md in metadata.items()}
+        aligned = all(trigger is not None for trigger in triggers.values())
+        if aligned:
+            first = min(triggers.values())
+            starts = {name: trigger - first for name, trigger in triggers.items()}
+        else:
+            print("Not every unit saw the trigger; streams are aligned on their start")
+            starts = {name: 0 for name in metadata}
+        return {
+            'Aligned': aligned,
+            'TriggerSample': triggers,
+            'StartSample': starts,
+            'Samples': int(min(samples[name] - starts[name] for name in metadata)),
+        }
+
+    def _align_chunks(self, metadata_files, by_trigger_time):
+        """Chunk index of every unit for each trigger seen by all units"""
+        metadata = self._load_metadata(metadata_files)
+        if not metadata:
+            return None
+        times = {}
+        for name, md in metadata.items():
+            base = os.path.join(os.path.dirname(metadata_files[name]), md['DataFile'][:-len('_chunks.dat')])
+            store = ChunkStoreReader(base)
+            times[name] = np.array(store.trigger_times, dtype=np.float64)
+            store.close()
+        names = list(metadata)
+
+        if not by_trigger_time:
+            count = min(len(t) for t in times.values())
+            chunks = [[i] * len(names) for i in range(count)]
+            return {'Devices': names, 'Chunks': chunks, 'MaxTriggerTimeDifference, s': None}
+
+        # match every chunk of the first unit with the nearest unused chunk of each other unit
+        reference = times[names[0]]
+        chunks = []
+        max_difference = 0.0
+        used = {name: set() for name in names}
+        for i, t in enumerate(reference):
+            row = [i]
+            for name in names[1:]:
+                other = times[name]
+                j = int(np.argmin(np.abs(other - t))) if len(other) else None
+                if j is None or j in used[name] or abs(other[j] - t) > self.TRIGGER_MATCH_TOLERANCE:
+                    break
+                row.append(j)
+            if len(row) == len(names):
+                for name, j in zip(names[1:], row[1:]):
+                    used[name].add(j)
+                max_difference = max([max_difference] + [abs(times[n][j] - t) for n, j in zip(names, row)])
+                chunks.append(row)
+        unmatched = {name: len(times[name]) - len(chunks) for name in names if len(times[name]) > len(chunks)}
+        if unmatched:
+            print(f"Chunks without a match on every unit (left out): {unmatched}")
+        return {'Devices': names, 'Chunks': chunks, 'MaxTriggerTimeDifference, s': max_difference,
+                'UnmatchedChunks': unmatched}
+
+    def _save_group(self, group_dir, measurement_set_name, mode, metadata_files, alignment):
+        group = {
+            'GroupName': self.name,
+            'MeasurementSetName': measurement_set_name,
+            'Mode': mode,
+            'Timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'Trigger': self.trigger,
+            'Devices': [{
+                'Name': device.get_name(),
+                'Serial': device.serial_number,
+                'MetadataFile': os.path.relpath(metadata_files[device.get_name()], group_dir)
+                if metadata_files.get(device.get_name()) else None,
+            } for device in self.devices],
+            'Alignment': alignment,
+        }
+        group_file = os.path.join(group_dir, f"{measurement_set_name}_group.json")
+        with open(group_file, 'w') as f:
+            json.dump(group, f, indent='\t')
+        print(f"Group metadata saved to {group_file}")
+        return group_file
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class StreamWriter:
+    """
+    Writes streamed (channels, samples) blocks to disk on a dedicated thread.
+
+    put() is called from the driver callback and only copies the block into a preallocated staging ring. The
+    writer thread collects the staged samples into large writes (WRITE_BYTES, a multiple of 4 KiB) and issues them
+    sequentially to a file preallocated to the expected size.
+
+    Layouts:
+    - 'interleaved': samples x channels, i.e. A0 B0 A1 B1 ... (the format run_streaming always wrote),
+    - 'channels_first': all samples of the first channel, then the next, ... Each channel region is sized for
+      `expected_samples`; samples beyond it are dropped and counted, a shorter stream is compacted on close.
+
+    If the writer cannot keep up and the staging ring fills, new blocks are dropped and counted in
+    `dropped_samples` rather than blocking the driver callback.
+    """
+
+    LAYOUTS = ('interleaved', 'channels_first')
+    WRITE_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, file_path, num_channels, expected_samples, layout='interleaved', staging_seconds=1.0,
+                 sample_rate=None, dtype=np.int16):
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"Unknown file layout {layout}, expected one of {self.LAYOUTS}")
+        self.file_path = file_path
+        self.num_channels = num_channels
+        self.expected_samples = int(expected_samples)
+        self.layout = layout
+        self._dtype = np.dtype(dtype)
+
+        # Samples per channel per write, so each write (and each channel row) is a multiple of 4 KiB
+        self._write_samples = max(4096, self.WRITE_BYTES // (self._dtype.itemsize * num_channels)) // 4096 * 4096
+        staging_samples = self._write_samples * 4
+        if sample_rate:
+            staging_samples = max(staging_samples, int(staging_seconds * sample_rate))
+        self._staging = np.empty((num_channels, staging_samples), dtype=self._dtype)
+        self._interleave = np.empty((self._write_samples, num_channels), dtype=self._dtype)
+        self._capacity = staging_samples
+        self._head = 0  # total samples put
+        self._tail = 0  # total samples written
+        self._condition = threading.Condition()
+        self._closing = False
+
+        self.written_samples = 0  # Samples per channel on disk
+        self.dropped_samples = 0  # Samples per channel lost because the staging ring was full
+        self.truncated_samples = 0  # Samples per channel beyond expected_samples (channels_first only)
+        self.writes = 0
+        self.write_time = 0.0  # Seconds spent in file writes
+        self.max_backlog = 0  # Largest number of staged samples waiting for the writer
+        self.error = None
+        self._elapsed = None
+
+        self._file = open(file_path, 'w+b')
+        # Preallocate the expected size so the file system does not grow the file write by write
+        self._file.truncate(self._bytes(self.expected_samples))
+        self._thread = threading.Thread(target=self._run, name=f'StreamWriter-{os.path.basename(file_path)}',
+                                        daemon=True)
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def _bytes(self, samples):
+        return samples * self.num_channels * self._dtype.itemsize
+
+    def put(self, block, blocking=False):
+        """Stage a (channels, n) block; called from the driver callback. Waits for space only if blocking"""
+        n = block.shape[1]
+        with self._condition:
+            if blocking:
+                self._condition.wait_for(lambda: self._head - self._tail + n <= self._capacity or self.error)
+            if self._head - self._tail + n > self._capacity:
+                self.dropped_samples += n
+                return False
+            start = self._head % self._capacity
+            first = min(n, self._capacity - start)
+            self._staging[:, start:start + first] = block[:, :first]
+            if first < n:
+                self._staging[:, :n - first] = block[:, first:]
+            self._head += n
+            self.max_backlog = max(self.max_backlog, self._head - self._tail)
+            if self._head - self._tail >= self._write_samples:
+                self._condition.notify_all()
+        return True
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._head - self._tail >= self._write_samples or self._closing)
+                    available = self._head - self._tail
+                    if available == 0 and self._closing:
+                        break
+                # Only this thread moves the tail, so the staged samples can be written outside the lock
+                n = min(available, self._write_samples)
+                start = self._tail % self._capacity
+                n = min(n, self._capacity - start)  # contiguous part; the rest follows in the next pass
+                self._write(self._staging[:, start:start + n])
+                with self._condition:
+                    self._tail += n
+                    self._condition.notify_all()
+        except Exception as e:
+            with self._condition:
+                self.error = str(e)
+                self._condition.notify_all()
+            print(f"StreamWriter {self.file_path}: write failed: {e}")
+
+    def _write(self, piece):
+        n = piece.shape[1]
+        t_start = time.perf_counter()
+        if self.layout == 'interleaved':
+            out = self._interleave[:n]
+            out[:] = piece.T
+            self._file.write(memoryview(out))
+            self.written_samples += n
+        else:
+            keep = min(n, self.expected_samples - self.written_samples)
+            self.truncated_samples += n - keep
+            if keep > 0:
+                row_bytes = self.expected_samples * self._dtype.itemsize
+                for channel in range(self.num_channels):
+                    self._file.seek(channel * row_bytes + self.written_samples * self._dtype.itemsize)
+                    self._file.write(memoryview(piece[channel, :keep]))
+                self.written_samples += keep
+        self.write_time += time.perf_counter() - t_start
+        self.writes += 1
+
+    def close(self):
+        """Write the remaining staged samples, trim the file to the data written and close it"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+        if self.layout == 'channels_first' and self.written_samples < self.expected_samples:
+            self._compact()
+        self._file.truncate(self._bytes(self.written_samples))
+        self._file.close()
+        self._elapsed = time.perf_counter() - self._started
+        if self.dropped_samples:
+            print(f"StreamWriter {self.file_path}: dropped {self.dropped_samples} samples (writer too slow)")
+
+    def _compact(self):
+        """Move the channel regions of a short channels_first stream next to each other"""
+        itemsize = self._dtype.itemsize
+        row_bytes = self.expected_samples * itemsize
+        chunk = self._write_samples * itemsize
+        for channel in range(1, self.num_channels):
+            src = channel * row_bytes
+            dst = channel * self.written_samples * itemsize
+            remaining = self.written_samples * itemsize
+            while remaining > 0:
+                size = min(chunk, remaining)
+                self._file.seek(src)
+                data = self._file.read(size)
+                self._file.seek(dst)
+                self._file.write(data)
+                src += size
+                dst += size
+                remaining -= size
+
+    def stats(self):
+        """Write statistics for the metadata"""
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        written_bytes = self._bytes(self.written_samples)
+        return {
+            'Layout': self.layout,
+            'WrittenSamples': self.written_samples,
+            'DroppedSamples': self.dropped_samples,
+            'TruncatedSamples': self.truncated_samples,
+            'Writes': self.writes,
+            'WriteThroughput, MB/s': written_bytes / self.write_time / 1e6 if self.write_time else None,
+            'MaxBacklogSamples': self.max_backlog,
+            'Elapsed, s': elapsed,
+        }
@@ -2,9 +2,17 @@ import numpy as np
 import os
 import time
 import json
+import math
+import ctypes
 from datetime import datetime
 from picoscope import ps5000a
 
+from controllers.utils.SampleRingBuffer import SampleRingBuffer
+from controllers.picoscope.StreamWriter import StreamWriter
+from controllers.picoscope.ChunkWriter import ChunkWriter
+from controllers.picoscope.ChunkStore import ChunkStoreWriter
+from controllers.picoscope.LockInDemodulator import LockInDemodulator
+
 class PicoInterface:
     """Interface class for controlling PicoScope 5444D acquisition.
 
@@ -13,15 +21,45 @@ class PicoInterface:
     """
     # Static class variables for callbacks
     _device_data = {}  # Dictionary to store data for each device handle
-    _save_files = {}  # Dictionary to store file handles
+    _stream_writers = {}  # StreamWriter (file writer thread) of the running stream for each device
     _user_callbacks = {}  # Dictionary to store user callbacks
     _enabled_channels = {}  # Dictionary to store enabled channels for each device
     _total_samples = {}  # Track total samples for each device
+    _live_buffers = {}  # Ring buffers holding the newest streamed samples for live preview
+    _stream_stats = {}  # Per-stream callback statistics (overflows, largest block, auto stop)
+    _stream_processors = {}  # Processing stages (e.g. LockInDemodulator) fed by the running stream of each device
+
+    # Streaming poll interval: poll when the driver buffer is at most this full, within the given bounds (s)
+    POLL_BUFFER_FRACTION = 0.25
+    MIN_POLL_INTERVAL = 0.001
+    MAX_POLL_INTERVAL = 0.1
+
+    # Chunk buffers queued for the writer thread in multi-block acquisitions
+    CHUNK_QUEUE_DEPTH = 4
+
+    # Driver down sampling modes (PS5000A_RATIO_MODE); 'aggregate' returns the max and min of each group
+    DOWN_SAMPLE_MODES = {'none': 0, 'aggregate': 1, 'decimate': 2, 'average': 4}
 
-    def __init__(self, name=None):
-        """Initialize the PicoScope interface."""
+    # Applied settings that have to be issued again after a change of another setting: the timebase and the
+    # samples available per channel depend on resolution, memory segments and enabled channels, the trigger
+    # level in counts on the channel range and offset, and the streaming buffers on the sample count and interval
+    _INVALIDATES = {'resolution': ('sampling', 'stream_buffers'),
+                    'segments': ('sampling', 'stream_buffers'),
+                    'channel': ('sampling', 'trigger', 'stream_buffers'),
+                    'sampling': ('stream_buffers',)}
+
+    # Samples per channel kept for live preview while streaming (int16, 2 MB per channel)
+    LIVE_BUFFER_SAMPLES = 1_000_000
+
+    def __init__(self, name=None, serial=None):
+        """Initialize the PicoScope interface.
+
+        Args:
+            serial (str, optional): Serial number of the unit to open (the first unit found if None)
+        """
         self.ps = None
         self.name = name
+        self.serial = serial
         self.handle = None  # Will store the device handle
         self.channels_enabled = {'A': False, 'B': False, 'C': False, 'D': False}
         self.channel_ranges = {'A': 5, 'B': 5, 'C': 5, 'D': 5}  # Voltage ranges in V
@@ -37,6 +75,19 @@ class PicoInterface:
         self.sampling_interval = 1e-7  # Default sampling interval (1/frequency)
         self.actual_sampling_interval = None  # Default sampling interval (1/frequency)
         self.is_open = False
+        self.file_layout = 'interleaved'  # Streaming data file layout, see StreamWriter
+        self.streaming = False  # True while run_streaming is collecting data
+        self.live_buffer = None  # SampleRingBuffer of the current/last stream, (channels, samples) raw ADC counts
+        self.live_channels = []  # Rows stored in live_buffer ('A', or 'A_max', 'A_min' when aggregating)
+        self.down_sample_ratio = 1  # Streaming defaults, set from the UI
+        self.down_sample_mode = 'none'
+        self.stream_sample_rate = None  # Rate of the stored samples of the current/last stream (after down sampling)
+        self.last_metadata_file = None  # Metadata file of the last saved stream or measurement set
+        # Hardware state applied since open(): setting key -> (applied value, driver call result); see _apply
+        self._applied = {}
+        self._stream_buffer = None  # Registered streaming buffer, reused while the channels and mode are unchanged
+        self.driver_calls = {'issued': 0, 'skipped': 0}
+        self.stream_processors = []  # Stages fed with every streamed block, see add_lockin
 
     @staticmethod
     def streaming_callback(handle, num_samples, start_index, overflow,
@@ -47,24 +98,48 @@ class PicoInterface:
         """
         # Get the data buffer and other parameters for this specific device
         data = PicoInterface._device_data.get(handle)
-        save_file = PicoInterface._save_files.get(handle)
+        stream_writer = PicoInterface._stream_writers.get(handle)
         user_callback = PicoInterface._user_callbacks.get(handle)
         enabled_channels = PicoInterface._enabled_channels.get(handle, [])
 
         # Update total samples counter for this device
         PicoInterface._total_samples[handle] += num_samples
 
+        stats = PicoInterface._stream_stats.get(handle)
+        if stats is not None:
+            stats['callbacks'] += 1
+            stats['largest_block'] = max(stats['largest_block'], num_samples)
+            if num_samples >= stats['buffer_samples']:
+                # the driver buffer was full when read: samples may have been dropped
+                stats['full_buffer_reads'] += 1
+            if overflow:
+                # overflow is a bit field of channels whose input exceeded the range (bit 0 = A)
+                for channel in enabled_channels:
+                    if overflow & (1 << (ord(channel) - ord('A'))):
+                        stats['overflows'][channel] += 1
+            if auto_stop:
+                stats['auto_stopped'] = True
+            if triggered and stats['trigger_sample'] is None:
+                # stored sample index of the trigger, counted from the start of the stream
+                stats['trigger_sample'] = PicoInterface._total_samples[handle] - num_samples + trigger_at
+
         end_index = start_index + num_samples
 
-        # Extract the data from the buffer
-        if len(enabled_channels) == 1:
-            data_slice = data[start_index:end_index]
-        else:
-            data_slice = data[:, start_index:end_index].T
+        # Extract the data from the buffer, always (channels, samples)
+        block = data[:, start_index:end_index]
+
+        # Copy into the live preview ring buffer
+        live_buffer = PicoInterface._live_buffers.get(handle)
+        if live_buffer is not None:
+            live_buffer.write(block)
 
-        # Save to file if file object exists
-        if save_file:
-            data_slice.tofile(save_file)
+        # Stage for the writer thread; no file I/O or transposes in the driver callback
+        if stream_writer is not None:
+            stream_writer.put(block)
+
+        # Processing stages only queue the block, their own threads do the work
+        for processor in PicoInterface._stream_processors.get(handle, ()):
+            processor.put(block)
 
     def get_name(self):
         if self.name:
@@ -76,9 +151,10 @@ class PicoInterface:
         """Open connection to the PicoScope."""
         if not self.is_open:
             try:
-                self.ps = ps5000a.PS5000a()
+                self.ps = ps5000a.PS5000a(serialNumber=self.serial)
                 self.handle = self.ps.handle  # Store the device handle
                 self.is_open = True
+                self._invalidate()
                 # Set default resolution
                 self.set_resolution(self.resolution)
                 print("PicoScope connected successfully")
@@ -97,18 +173,26 @@ class PicoInterface:
                 # Clean up any static data for this device
                 if self.handle in PicoInterface._device_data:
                     del PicoInterface._device_data[self.handle]
-                if self.handle in PicoInterface._save_files:
-                    if PicoInterface._save_files[self.handle]:
-                        PicoInterface._save_files[self.handle].close()
-                    del PicoInterface._save_files[self.handle]
+                if self.handle in PicoInterface._stream_writers:
+                    if PicoInterface._stream_writers[self.handle]:
+                        PicoInterface._stream_writers[self.handle].close()
+                    del PicoInterface._stream_writers[self.handle]
                 if self.handle in PicoInterface._user_callbacks:
                     del PicoInterface._user_callbacks[self.handle]
                 if self.handle in PicoInterface._enabled_channels:
                     del PicoInterface._enabled_channels[self.handle]
+                if self.handle in PicoInterface._live_buffers:
+                    del PicoInterface._live_buffers[self.handle]
+                if self.handle in PicoInterface._stream_stats:
+                    del PicoInterface._stream_stats[self.handle]
+                if self.handle in PicoInterface._stream_processors:
+                    self._close_processors()
+                    del PicoInterface._stream_processors[self.handle]
 
                 self.ps.stop()
                 self.ps.close()
                 self.is_open = False
+                self._invalidate()
                 print("PicoScope disconnected")
                 return True
             except Exception as e:
@@ -118,6 +202,43 @@ class PicoInterface:
             print("PicoScope is already closed")
             return True
 
+    def _apply(self, key, value, call):
+        """
+        Issue a driver call only if the setting `key` is not already applied with `value`.
+        Returns the result of the call (or of the call that applied the same value before).
+        """
+        applied = self._applied.get(key)
+        if applied is not None and applied[0] == value:
+            self.driver_calls['skipped'] += 1
+            return applied[1]
+        # forget the old value first, so a failed call is retried next time
+        self._applied.pop(key, None)
+        result = call()
+        self._applied[key] = (value, result)
+        self.driver_calls['issued'] += 1
+        dependent = self._INVALIDATES.get(key[0] if isinstance(key, tuple) else key)
+        if dependent:
+            self._invalidate(*dependent)
+        return result
+
+    def _invalidate(self, *keys):
+        """Forget applied settings (all if no keys), so the next call reaches the driver"""
+        if not keys:
+            self._applied.clear()
+            self._stream_buffer = None
+            return
+        for key in keys:
+            self._applied.pop(key, None)
+            if key == 'stream_buffers':
+                self._stream_buffer = None
+
+    def _set_segments(self, num_segments, num_captures=None):
+        """Memory segments and captures per run; returns the max samples per segment"""
+        max_samples = self._apply('segments', num_segments, lambda: self.ps.memorySegments(num_segments))
+        num_captures = num_segments if num_captures is None else num_captures
+        self._apply('captures', num_captures, lambda: self.ps.setNoOfCaptures(num_captures))
+        return max_samples
+
     def set_channel(self, channel, enabled=True, coupling='DC', voltage_range=5, offset=0.0):
         """Configure a specific channel.
 
@@ -137,14 +258,14 @@ class PicoInterface:
             return False
 
         try:
-            self.ps.setChannel(
+            self._apply(('channel', channel), (enabled, coupling, voltage_range, offset), lambda: self.ps.setChannel(
                 channel=channel,
                 enabled=enabled,
                 coupling=coupling,
                 VRange=voltage_range,
                 VOffset=offset,
                 BWLimited=False
-            )
+            ))
             self.channels_enabled[channel] = enabled
             self.channel_ranges[channel] = voltage_range
             self.channel_couplings[channel] = coupling
@@ -217,7 +338,7 @@ class PicoInterface:
             return False
 
         try:
-            self.ps.setResolution(str(resolution))
+            self._apply('resolution', resolution, lambda: self.ps.setResolution(str(resolution)))
             self.resolution = resolution
             return True
         except Exception as e:
@@ -242,7 +363,8 @@ class PicoInterface:
         self.acquisition_time = acq_time
         try:
             self.sample_freq = frequency
-            result = self.ps.setSamplingFrequency(self.sample_freq, self.num_samples)
+            result = self._apply('sampling', ('frequency', self.sample_freq, self.num_samples),
+                                 lambda: self.ps.setSamplingFrequency(self.sample_freq, self.num_samples))
             self.actual_sample_freq = result[0]
             # Update sampling interval and acquisition time
             self.sampling_interval = 1.0 / self.actual_sample_freq
@@ -271,7 +393,8 @@ class PicoInterface:
         try:
             self.sampling_interval = dt
             self.sample_freq = 1/dt
-            dt_set, num_samples_set, _ = self.ps.setSamplingInterval(dt, acq_time)
+            dt_set, num_samples_set, _ = self._apply('sampling', ('interval', dt, acq_time),
+                                                     lambda: self.ps.setSamplingInterval(dt, acq_time))
             self.actual_sample_freq = 1/dt_set
             # Update sampling interval and acquisition time
             self.actual_sampling_interval = dt_set
@@ -301,30 +424,180 @@ class PicoInterface:
         if channel == 'NONE':
             try:
                 # Disable trigger
-                self.ps.setSimpleTrigger(None, enabled=False)
+                self._apply('trigger', None, lambda: self.ps.setSimpleTrigger(None, enabled=False))
                 return True
             except Exception as e:
                 print(f"Error disabling trigger: {e}")
                 return False
         else:
             try:
-                self.ps.setSimpleTrigger(
+                timeout = timeout_ms if auto_trigger else 0
+                self._apply('trigger', (channel, threshold, direction, delay, timeout), lambda: self.ps.setSimpleTrigger(
                     channel,
                     threshold_V=threshold,
                     direction=direction,
                     delay=delay,
                     enabled=True,
-                    timeout_ms=timeout_ms if auto_trigger else 0
-                )
+                    timeout_ms=timeout
+                ))
                 return True
             except Exception as e:
                 print(f"Error setting trigger: {e}")
                 return False
 
+    @property
+    def serial_number(self):
+        """Serial number of the open unit (the requested one if it cannot be read)"""
+        if self.ps is not None:
+            try:
+                return self.ps.getUnitInfo('BatchAndSerial')
+            except Exception:
+                pass
+        return self.serial
+
+    @property
+    def max_adc(self):
+        """ADC count corresponding to the full scale of a channel range at the current resolution"""
+        # pico-python's getMaxValue() is a fixed 32764 for every resolution of the 5000a series
+        return ps5000a.PS5000a.MAX_VALUE_8BIT if self.resolution == 8 else ps5000a.PS5000a.MAX_VALUE_OTHER
+
+    def volts_per_count(self, channel):
+        """Factor converting raw ADC counts of a channel (or a stream row such as 'A_max') to volts, without offset"""
+        return self.channel_ranges[channel.split('_')[0]] / self.max_adc
+
+    def counts_to_volts(self, channel, counts):
+        """Raw ADC counts of a channel (or a stream row such as 'A_max') in volts, less the analogue offset"""
+        return counts * self.volts_per_count(channel) - self.channel_offsets[channel.split('_')[0]]
+
+    @classmethod
+    def down_sample_mode_value(cls, mode):
+        """Driver ratio mode for a mode name or value"""
+        if isinstance(mode, str):
+            if mode.lower() not in cls.DOWN_SAMPLE_MODES:
+                raise ValueError(f"Unknown down sample mode {mode}, expected one of {list(cls.DOWN_SAMPLE_MODES)}")
+            return cls.DOWN_SAMPLE_MODES[mode.lower()]
+        if mode not in cls.DOWN_SAMPLE_MODES.values():
+            raise ValueError(f"Unknown down sample mode {mode}")
+        return int(mode)
+
+    @classmethod
+    def down_sample_mode_name(cls, mode):
+        value = cls.down_sample_mode_value(mode)
+        return next(name for name, v in cls.DOWN_SAMPLE_MODES.items() if v == value)
+
+    @classmethod
+    def stream_rows(cls, enabled_channels, down_sample_mode):
+        """Row labels of the streamed (rows, samples) blocks: the channels, or their max and min when aggregating"""
+        if cls.down_sample_mode_value(down_sample_mode) == cls.DOWN_SAMPLE_MODES['aggregate']:
+            return [f'{channel}_{kind}' for channel in enabled_channels for kind in ('max', 'min')]
+        return list(enabled_channels)
+
+    def _allocate_aggregate_buffers(self, enabled_channels, buffer_samples, mode):
+        """
+        Register a max and a min buffer per channel (ps5000aSetDataBuffers, not wrapped by pico-python).
+        Returns one (2 * channels, buffer_samples) array with rows ordered as stream_rows.
+        """
+        data = np.zeros((2 * len(enabled_channels), buffer_samples), dtype=np.int16)
+        for i, channel in enumerate(enabled_channels):
+            m = self.ps.lib.ps5000aSetDataBuffers(
+                ctypes.c_int16(self.ps.handle),
+                ctypes.c_int(self.ps.CHANNELS[channel]),
+                data[2 * i].ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),
+                data[2 * i + 1].ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),
+                ctypes.c_int32(buffer_samples),
+                ctypes.c_uint32(0),
+                ctypes.c_int(mode))
+            self.ps.checkResult(m)
+        return data
+
+    def _prepare_live_buffer(self, rows):
+        """Reuse the live preview buffer if the row count is unchanged, otherwise allocate a new one"""
+        if self.live_buffer is None or self.live_buffer.num_channels != len(rows):
+            self.live_buffer = SampleRingBuffer(len(rows), self.LIVE_BUFFER_SAMPLES)
+        else:
+            self.live_buffer.clear()
+        self.live_channels = list(rows)
+        PicoInterface._live_buffers[self.handle] = self.live_buffer
+
+    def add_lockin(self, name, channel, reference_frequency, **kwargs):
+        """Demodulate a channel at reference_frequency during every stream (kwargs: see LockInDemodulator)"""
+        self.remove_lockin(name)
+        lockin = LockInDemodulator(name, channel, reference_frequency, **kwargs)
+        self.stream_processors.append(lockin)
+        return lockin
+
+    def remove_lockin(self, name):
+        self.stream_processors = [p for p in self.stream_processors if p.name != name]
+
+    def _start_processors(self, processors, rows, sample_rate, record_path, expected_samples):
+        """Start the processing stages whose channel is enabled for this stream (fed its first row, e.g. A_max)"""
+        active = []
+        row_channels = [row.split('_')[0] for row in rows]
+        for processor in processors:
+            if processor.channel not in row_channels:
+                print(f"{processor.name}: channel {processor.channel} is not enabled, skipped")
+                continue
+            try:
+                processor.start(sample_rate, self.volts_per_count(processor.channel),
+                                self.channel_offsets[processor.channel], row_channels.index(processor.channel),
+                                record_path=record_path, expected_samples=expected_samples)
+                active.append(processor)
+            except Exception as e:
+                print(f"Error starting {processor.name}: {e}")
+        PicoInterface._stream_processors[self.handle] = active
+        return active
+
+    def _close_processors(self):
+        processors = PicoInterface._stream_processors.get(self.handle, [])
+        PicoInterface._stream_processors[self.handle] = []
+        for processor in processors:
+            processor.close()
+        return processors
+
+    def _streaming_buffer(self, enabled_channels, down_sample_mode):
+        """(rows, samples) streaming buffer registered with the driver; reused if channels and mode are unchanged"""
+        key = (tuple(enabled_channels), down_sample_mode)
+        applied = self._applied.get('stream_buffers')
+        if self._stream_buffer is not None and applied is not None and applied[0] == key:
+            self.driver_calls['skipped'] += 1
+            return self._stream_buffer
+        self._invalidate('stream_buffers')
+        data_buffer = self.ps.allocateDataBuffers(
+            channels=enabled_channels,
+            numSamples=0,  # Zero for streaming mode
+            downSampleMode=down_sample_mode
+        )
+        # The callback slices (channels, samples) blocks; the reshape is a view of the driver buffer
+        data_buffer = data_buffer.reshape(len(enabled_channels), -1)
+        if down_sample_mode == self.DOWN_SAMPLE_MODES['aggregate']:
+            # pico-python registers only the max buffers; replace them by max/min pairs of the same length
+            data_buffer = self._allocate_aggregate_buffers(enabled_channels, data_buffer.shape[1], down_sample_mode)
+        self._stream_buffer = data_buffer
+        self._applied['stream_buffers'] = (key, None)
+        self.driver_calls['issued'] += 1
+        return data_buffer
+
+    def streaming_poll_interval(self, buffer_samples, down_sample_ratio=1):
+        """Poll interval (s) that reads the driver buffer before it is POLL_BUFFER_FRACTION full"""
+        if not self.actual_sample_freq:
+            return self.MAX_POLL_INTERVAL
+        fill_time = buffer_samples * down_sample_ratio / self.actual_sample_freq
+        return min(max(fill_time * self.POLL_BUFFER_FRACTION, self.MIN_POLL_INTERVAL), self.MAX_POLL_INTERVAL)
+
     def run_streaming(self, duration=None, data_dir=None, filename=None, pre_trigger=0.0, auto_stop=True,
-                      down_sample_ratio=1, down_sample_mode=0, callback=None, callback_param=None,
-                      additional_metadata=None):
-        """Run in streaming mode with software trigger."""
+                      down_sample_ratio=None, down_sample_mode=None, callback=None, callback_param=None,
+                      additional_metadata=None, job=None, file_layout=None, processors=None):
+        """Run in streaming mode with software trigger.
+
+        Args:
+            down_sample_ratio (int, optional): Driver down sampling ratio, default self.down_sample_ratio
+            down_sample_mode (str or int, optional): 'none', 'aggregate' (max and min rows per channel), 'decimate'
+                or 'average', default self.down_sample_mode
+            processors (list, optional): Stages fed with every block (e.g. LockInDemodulator), default
+                self.stream_processors. Their output is saved next to the data file.
+            file_layout (str, optional): 'interleaved' or 'channels_first' data file layout, default self.file_layout
+            job (Job, optional): Background job to report progress to; the stream stops early when it is cancelled
+        """
         if not self.is_open:
             print("PicoScope not open")
             return None
@@ -338,6 +611,8 @@ class PicoInterface:
             # self.actual_sample_freq, _ = self.ps.setSamplingFrequency(self.sample_freq, self.num_samples)
             # self.sampling_interval = 1/self.actual_sample_freq
             # For redundancy - make sure picoscope is configured before starting the stream
+            # (only settings that changed reach the driver, see _apply)
+            self._set_segments(1)
             _, _ = self.set_sampling_period(self.sampling_interval, self.acquisition_time)
             self.sample_freq = 1/self.sampling_interval
             print(f"REQUESTED: Samples {self.num_samples} Frequency {self.sample_freq}")
@@ -359,8 +634,30 @@ class PicoInterface:
         # Initialize the total samples counter for this device
         PicoInterface._total_samples[self.handle] = 0
 
+        if not self.actual_sample_freq:
+            print("Sampling frequency not set")
+            return None
+
+        # Driver down sampling: data volume and stored sample rate are reduced by the ratio
+        try:
+            down_sample_ratio = max(1, int(down_sample_ratio or self.down_sample_ratio))
+            down_sample_mode = self.down_sample_mode_value(
+                self.down_sample_mode if down_sample_mode is None else down_sample_mode)
+        except ValueError as e:
+            print(f"Error setting down sampling: {e}")
+            return None
+        if down_sample_ratio > 1 and down_sample_mode == self.DOWN_SAMPLE_MODES['none']:
+            print("A down sample ratio above 1 needs a down sample mode (aggregate, decimate or average)")
+            return None
+        rows = self.stream_rows(enabled_channels, down_sample_mode)
+        self.stream_sample_rate = self.actual_sample_freq / down_sample_ratio
+
+        # Stop on the number of collected samples, not on wall-clock time
+        target_samples = math.ceil(self.acquisition_time * self.actual_sample_freq / down_sample_ratio)
+
         # Determine if we're saving to a file
         saving_to_file = data_dir is not None and filename is not None
+        file_layout = file_layout or self.file_layout
 
         # Open file for saving if path provided
         if saving_to_file:
@@ -375,67 +672,111 @@ class PicoInterface:
                 # Create full file path for binary data
                 full_path = os.path.join(data_dir, f"{filename}.bin")
 
-                # Open the file
-                PicoInterface._save_files[self.handle] = open(full_path, 'wb')
+                # Open the file; the writer thread preallocates it and writes in large blocks
+                PicoInterface._stream_writers[self.handle] = StreamWriter(
+                    full_path, len(rows), target_samples, layout=file_layout, sample_rate=self.stream_sample_rate)
             except Exception as e:
                 print(f"Error opening file for saving: {e}")
-                PicoInterface._save_files[self.handle] = None
+                PicoInterface._stream_writers[self.handle] = None
                 saving_to_file = False
         else:
-            PicoInterface._save_files[self.handle] = None
+            PicoInterface._stream_writers[self.handle] = None
 
         # Set user callback
         PicoInterface._user_callbacks[self.handle] = callback
-        self.ps.setNoOfCaptures(noCaptures=1)
-        self.ps.memorySegments(noSegments=1)
+        self._prepare_live_buffer(rows)
+        stream_writer = PicoInterface._stream_writers.get(self.handle)
+        self._start_processors(self.stream_processors if processors is None else processors, rows,
+                               self.stream_sample_rate,
+                               stream_writer.file_path if stream_writer else None, target_samples)
 
         try:
-            # Allocate data buffers for streaming
-            data_buffer = self.ps.allocateDataBuffers(
-                channels=enabled_channels,
-                numSamples=0,  # Zero for streaming mode
-                downSampleMode=down_sample_mode
-            )
-            data_buffer.squeeze()
+            data_buffer = self._streaming_buffer(enabled_channels, down_sample_mode)
 
             # Store buffer for this device
             PicoInterface._device_data[self.handle] = data_buffer
 
+            buffer_samples = data_buffer.shape[1]
+            poll_interval = self.streaming_poll_interval(buffer_samples, down_sample_ratio)
+            stats = {'callbacks': 0, 'largest_block': 0, 'buffer_samples': buffer_samples, 'full_buffer_reads': 0,
+                     'overflows': {channel: 0 for channel in enabled_channels}, 'auto_stopped': False,
+                     'trigger_sample': None}
+            PicoInterface._stream_stats[self.handle] = stats
+            print(f"Streaming {target_samples} samples, driver buffer {buffer_samples} samples, "
+                  f"polling every {poll_interval * 1e3:.1f} ms")
+
             # Start streaming
             self.ps.runStreaming(
                 bAutoStop=auto_stop,
                 downSampleMode=down_sample_mode,
                 downSampleRatio=down_sample_ratio
             )
-            time.sleep(0.2) # Slack to give picoscope time to arm?
+            self.streaming = True
+            # Slack to give picoscope time to arm, no longer than the driver buffer takes to fill
+            time.sleep(min(0.2, poll_interval))
 
-            # print(f"REQUESTED STREAM DURATION: {self.acquisition_time}")
             # Process streaming data
-            elapsed_time = 0
-            starting_time = datetime.now()
-            while elapsed_time < self.acquisition_time:
+            # Deadline-based polling so the time spent in the driver call does not stretch the interval;
+            # the wall-clock timeout only guards against a scope that stops delivering data
+            starting_time = time.perf_counter()
+            timeout = 2 * self.acquisition_time + 1.0
+            next_poll = starting_time
+            while PicoInterface._total_samples[self.handle] < target_samples:
                 self.ps.getStreamingLatestValues(callback=PicoInterface.streaming_callback)
-                elapsed_time = (datetime.now() - starting_time).total_seconds()
-                time.sleep(0.1)  # Small delay to prevent CPU hogging
+                if stats['auto_stopped']:
+                    break
+                if job is not None:
+                    total = PicoInterface._total_samples[self.handle]
+                    job.update(total / target_samples, f"{total} samples")
+                    if job.cancelled:
+                        print("Streaming cancelled")
+                        break
+                now = time.perf_counter()
+                if now - starting_time > timeout:
+                    print(f"Streaming timed out after {now - starting_time:.1f} s")
+                    break
+                next_poll = max(next_poll + poll_interval, now)
+                time.sleep(next_poll - now)
             # Stop acquisition
             self.ps.stop()
+            self.streaming = False
+            elapsed_time = time.perf_counter() - starting_time
             print(f"Elapsed time: {elapsed_time}")
+            if stats['full_buffer_reads']:
+                print(f"Warning: driver buffer was full on {stats['full_buffer_reads']} reads, samples may be lost")
+            for channel, count in stats['overflows'].items():
+                if count:
+                    print(f"Warning: channel {channel} over range in {count} blocks")
 
             # Update actual values based on collected samples
             self.actual_num_samples = PicoInterface._total_samples.get(self.handle, 0)
-            self.actual_acquisition_time = self.actual_num_samples / self.actual_sample_freq
+            self.actual_acquisition_time = self.actual_num_samples / self.stream_sample_rate
 
-            # Close file if opened
-            if self.handle in PicoInterface._save_files and PicoInterface._save_files[self.handle]:
-                PicoInterface._save_files[self.handle].close()
-                PicoInterface._save_files[self.handle] = None
+            # Flush the staged samples and close the file
+            stream_writer = PicoInterface._stream_writers.get(self.handle)
+            PicoInterface._stream_writers[self.handle] = None
+            if stream_writer:
+                stream_writer.close()
+            processors = self._close_processors()
 
             # Save metadata if we're saving to a file
             if saving_to_file:
-                metadata = self.generate_metadata(additional_metadata)
+                metadata = self.generate_metadata(additional_metadata, down_sample_ratio, down_sample_mode)
+                metadata['StreamRows'] = rows
+                metadata['PollInterval, s'] = poll_interval
+                metadata['DriverBufferSamples'] = buffer_samples
+                metadata['FullBufferReads'] = stats['full_buffer_reads']
+                metadata['OverflowBlocks'] = stats['overflows']
+                metadata['TriggerSample'] = stats['trigger_sample']
+                metadata['StorageFormat'] = ('Raw_Int16_Channels_First' if file_layout == 'channels_first'
+                                             else 'Raw_Int16_Interleaved')
+                metadata['Writer'] = stream_writer.stats()
+                if processors:
+                    metadata['Processors'] = {processor.name: processor.stats() for processor in processors}
                 metadata_file = os.path.join(data_dir, f"{filename}_header.json")
                 with open(metadata_file, 'w') as f:
                     json.dump(metadata, f, indent='\t')
+                self.last_metadata_file = metadata_file
                 print(f"Metadata saved to {metadata_file}")
 
             # Return data buffer only if not saving to file
@@ -443,17 +784,21 @@ class PicoInterface:
 
         except Exception as e:
             print(f"Error in streaming mode: {e}")
+            self.streaming = False
             # Clean up in case of error
-            if self.handle in PicoInterface._save_files and PicoInterface._save_files[self.handle]:
-                PicoInterface._save_files[self.handle].close()
-                PicoInterface._save_files[self.handle] = None
+            if self.handle in PicoInterface._stream_writers and PicoInterface._stream_writers[self.handle]:
+                PicoInterface._stream_writers[self.handle].close()
+                PicoInterface._stream_writers[self.handle] = None
+            self._close_processors()
             return None
 
-    def generate_metadata(self, additional_metadata=None):
+    def generate_metadata(self, additional_metadata=None, down_sample_ratio=1, down_sample_mode='none'):
         """Generate metadata dictionary for the current configuration.
 
         Args:
             additional_metadata (dict): Optional additional metadata to include
+            down_sample_ratio (int): Driver down sampling ratio of the recorded data
+            down_sample_mode (str or int): Driver down sampling mode of the recorded data
 
         Returns:
             dict: Complete metadata dictionary
@@ -464,6 +809,8 @@ class PicoInterface:
         # Build basic metadata
         metadata = {
             'Timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'Device': self.get_name(),
+            'Serial': self.serial_number,
             'RequestedSamplingFrequency, Hz': self.sample_freq,
             'ActualSamplingFrequency, Hz': self.actual_sample_freq,
             'SamplingInterval, s': self.actual_sampling_interval,
@@ -472,6 +819,11 @@ class PicoInterface:
             'RequestedNumberOfSamples': self.num_samples,
             'ActualNumberOfSamples': self.actual_num_samples,
             'Bit depth': self.resolution,
+            'MaxADC': self.max_adc,
+            'DownSampleRatio': down_sample_ratio,
+            'DownSampleMode': self.down_sample_mode_name(down_sample_mode),
+            'StoredSamplingFrequency, Hz': self.actual_sample_freq / down_sample_ratio if self.actual_sample_freq
+            else None,
             'EnabledChannels': enabled_channels,
         }
 
@@ -489,19 +841,36 @@ class PicoInterface:
         return metadata
 
 
+    def _wait_ready(self, job=None):
+        """Wait for a block capture; returns False (and stops the scope) if the job is cancelled meanwhile"""
+        if job is None:
+            self.ps.waitReady(spin_delay=0)
+            return True
+        while not self.ps.isReady():
+            if job.cancelled:
+                self.ps.stop()
+                return False
+            time.sleep(0.001)
+        return True
+
     def run_multi_block_acquisition(self, data_dir, measurement_set_name, num_chunks,
-                                    pre_trigger_percent=0, additional_metadata=None):
-        """Run multiple block acquisitions with external trigger, saving each to separate files.
+                                    pre_trigger_percent=0, additional_metadata=None, job=None):
+        """Run multiple block acquisitions with external trigger, saving them to one ChunkStore.
 
-        This method creates a folder with the measurement set name, prepares multiple files
-        for faster data writing, and saves each triggered acquisition to a separate file.
+        This method creates a folder with the measurement set name and appends each triggered acquisition
+        as a record of <name>_chunks.dat, with its actual samples, trigger time and overflow flags in
+        <name>_chunks.idx (read back with ChunkStoreReader). Chunks are written by a ChunkWriter thread,
+        so the scope is re-armed right after each readout; arm latency, trigger wait, readout and write
+        times are reported.
 
         Args:
             data_dir (str): Base directory to save data
             measurement_set_name (str): Name of the measurement set (will be used as folder name)
-            num_chunks (int): Number of separate acquisitions/files to create
+            num_chunks (int): Number of triggered acquisitions
             pre_trigger_percent (float): Percentage of samples before trigger (0-100)
             additional_metadata (dict, optional): Additional metadata to include
+            job (Job, optional): Background job to report progress to; remaining chunks are skipped when it is
+                cancelled
 
         Returns:
             bool: Success status
@@ -527,101 +896,114 @@ class PicoInterface:
             os.makedirs(measurement_dir, exist_ok=True)
             print(f"Created measurement directory: {measurement_dir}")
 
-            # Prepare file handles list
-            file_handles = []
-            filenames = []
-
-            # Create and open all files
-            for i in range(num_chunks):
-                filename = f"{measurement_set_name}_chunk_{i:04d}"
-                filepath = os.path.join(measurement_dir, f"{filename}.bin")
-                filenames.append(filename)
-
-                try:
-                    file_handle = open(filepath, 'wb')
-                    file_handles.append(file_handle)
-                    print(f"Opened file: {filepath}")
-                except Exception as e:
-                    print(f"Error opening file {filepath}: {e}")
-                    # Close any already opened files
-                    for fh in file_handles:
-                        fh.close()
-                    return False
-
             # Set up acquisition parameters
             try:
                 self.sample_freq = 1 / self.sampling_interval
                 # Set memory segments and captures
-                self.ps.memorySegments(1)
-                self.ps.setNoOfCaptures(1)
+                self._set_segments(1)
+                # getDataRaw registers its own buffers, the streaming buffers have to be set again afterwards
+                self._invalidate('stream_buffers')
 
                 print(f"Acquisition setup: {self.num_samples} samples at {self.actual_sample_freq / 1e6:.3f} MHz")
 
             except Exception as e:
                 print(f"Error setting up acquisition parameters: {e}")
-                # Close all files
-                for fh in file_handles:
-                    fh.close()
                 return False
 
+            num_channels = len(enabled_channels)
+
+            # All chunks go into one container file with an index
+            store = ChunkStoreWriter(os.path.join(measurement_dir, measurement_set_name), enabled_channels,
+                                     self.num_samples, description={'MeasurementSetName': measurement_set_name})
+
+            def write_chunk(index, data, info):
+                store.append(data, actual_samples=info['actual_samples'], trigger_time=info['trigger_time'],
+                             overflow=info['overflow'])
+
+            # Chunks are written on a separate thread while the scope is re-armed for the next trigger
+            writer = ChunkWriter(write_chunk, (num_channels, self.num_samples), num_buffers=self.CHUNK_QUEUE_DEPTH)
+
             # Perform acquisitions
             successful_acquisitions = 0
-            num_channels = len(enabled_channels)
-            # Store actual samples for each chunk to add to metadata
-            chunks_actual_samples = []
+            timing = {'arm': [], 'trigger_wait': [], 'readout': []}
+            readout_end = None
 
             for i in range(num_chunks):
                 print(f"Waiting for trigger {i + 1}/{num_chunks}...")
+                if job is not None:
+                    job.update(i / num_chunks, f"Waiting for trigger {i + 1}/{num_chunks}")
+                    if job.cancelled:
+                        print("Multi-block acquisition cancelled")
+                        break
 
                 try:
-                    # Start block mode acquisition
+                    # Start block mode acquisition right after the previous readout
+                    t_arm = time.perf_counter()
                     self.ps.runBlock(pretrig=pre_trigger_percent / 100.0, segmentIndex=0)
-                    self.ps.waitReady(spin_delay=0)
-
-                    # Pre-allocate all arrays at once - (channels, samples)
-                    temp_arrays = np.empty((num_channels, self.num_samples), dtype=np.int16)
+                    t_armed = time.perf_counter()
+                    # arm latency: scope idle time since the previous readout (first chunk: the runBlock call)
+                    timing['arm'].append(t_armed - (readout_end if readout_end is not None else t_arm))
+                    if not self._wait_ready(job):
+                        print("Multi-block acquisition cancelled while waiting for trigger")
+                        break
+                    t_triggered = time.perf_counter()
+                    trigger_time = time.time()
+                    timing['trigger_wait'].append(t_triggered - t_armed)
+
+                    # Buffer from the writer's pool - (channels, samples), each row C-contiguous
+                    temp_arrays = writer.get_buffer()
                     actual_samples_list = []
+                    overflow_bits = 0
 
-                    # Get data for each channel
-                    for ch_idx, channel in enumerate(enabled_channels):
-                        # Use a row from the temp array (each row IS C-contiguous)
-                        channel_buffer = temp_arrays[ch_idx]
-
-                        _, actual_num_samples, overflow = self.ps.getDataRaw(
-                            channel=channel,
-                            numSamples=self.num_samples,
-                            segmentIndex=0,
-                            data=channel_buffer
-                        )
-
-                        actual_samples_list.append(actual_num_samples)
-
-                        if overflow:
-                            print(f"Warning: Overflow detected on channel {channel}")
+                    try:
+                        # Get data for each channel
+                        for ch_idx, channel in enumerate(enabled_channels):
+                            _, actual_num_samples, overflow = self.ps.getDataRaw(
+                                channel=channel,
+                                numSamples=self.num_samples,
+                                segmentIndex=0,
+                                data=temp_arrays[ch_idx]
+                            )
+
+                            actual_samples_list.append(actual_num_samples)
+
+                            if overflow:
+                                print(f"Warning: Overflow detected on channel {channel}")
+                                overflow_bits |= 1 << (ord(channel) - ord('A'))
+                    except Exception:
+                        writer.release(temp_arrays)
+                        raise
+                    readout_end = time.perf_counter()
+                    timing['readout'].append(readout_end - t_triggered)
 
                     # Update actual acquisition time and number of samples to not have errors in metadata generation
                     self.actual_acquisition_time = actual_samples_list[0]/self.actual_sample_freq
                     self.actual_num_samples = actual_samples_list[0]
-                    # Store actual samples for this chunk
-                    chunks_actual_samples.append(actual_samples_list.copy())
-
-                    try:
-                        # Save directly
-                        temp_arrays.tofile(file_handles[i])
-                        print(f"Saved acquisition {i + 1} to {filenames[i]}.bin")
-                        successful_acquisitions += 1
-
-                    except Exception as e:
-                        print(f"Error writing data for acquisition {i + 1}: {e}")
+                    # Hand over to the writer thread
+                    writer.submit(i, temp_arrays, {'actual_samples': actual_samples_list,
+                                                   'trigger_time': trigger_time, 'overflow': overflow_bits})
+                    successful_acquisitions += 1
 
                 except Exception as e:
                     print(f"Error during acquisition {i + 1}: {e}")
+                    readout_end = None
                     continue
 
-            # Close all file handles
-            for fh in file_handles:
-                fh.close()
-            print("All files closed")
+            # Wait for the queued chunks to be written
+            writer.close()
+            store.close()
+            for index, error in writer.errors.items():
+                print(f"Error writing data for acquisition {index + 1}: {error}")
+                successful_acquisitions -= 1
+            write_times = [writer.write_times[i] for i in sorted(writer.write_times)]
+            print("All files written")
+
+            def summary(values):
+                return {'mean': float(np.mean(values)), 'max': float(np.max(values))} if values else None
+
+            for name, values in list(timing.items()) + [('write', write_times)]:
+                if values:
+                    print(f"{name}: mean {1e3 * np.mean(values):.2f} ms, max {1e3 * np.max(values):.2f} ms")
 
             # Create metadata and summary files
             try:
@@ -630,21 +1012,29 @@ class PicoInterface:
                 metadata['NumberOfChunks'] = num_chunks
                 metadata['SuccessfulAcquisitions'] = successful_acquisitions
                 metadata['PreTriggerPercent'] = pre_trigger_percent
-                metadata['StorageFormat'] = 'Raw_Int16_Channels_First'
+                metadata['StorageFormat'] = 'ChunkStore'
                 metadata['DataType'] = 'Raw_ADC_Counts'
-                metadata['ArrayShape'] = f'(channels={num_channels}, samples={self.num_samples})'
+                metadata['DataFile'] = os.path.basename(store.data_path)
+                metadata['IndexFile'] = os.path.basename(store.index_path)
+                metadata['StoredChunks'] = store.num_chunks
+                metadata['ArrayShape'] = f'(chunks={store.num_chunks}, channels={num_channels}, ' \
+                                         f'samples={self.num_samples})'
                 metadata[
-                    'Note'] = 'Actual samples per channel/chunk in metadata. Unused samples contain undefined data.'
-
-                # Add actual samples for each chunk to metadata
-                for chunk_idx, samples_list in enumerate(chunks_actual_samples):
-                        metadata[f'{filenames[chunk_idx]}'] = samples_list
+                    'Note'] = 'Actual samples per channel/chunk in the index file. Unused samples contain undefined data.'
+                metadata['ChunkTiming, s'] = {
+                    'ArmLatency': summary(timing['arm']),
+                    'TriggerWait': summary(timing['trigger_wait']),
+                    'Readout': summary(timing['readout']),
+                    'Write': summary(write_times),
+                    'BufferWait': writer.buffer_wait,
+                }
 
                 metadata_file = os.path.join(measurement_dir, f"{measurement_set_name}_metadata.json")
                 with open(metadata_file, 'w') as f:
                     # for key, value in metadata.items():
                     #     f.write(f"{key}:\t{value}\n")
                     json.dump(metadata, f, indent='\t')
+                self.last_metadata_file = metadata_file
                 print(f"Metadata saved to {metadata_file}")
 
             except Exception as e:
@@ -655,4 +1045,156 @@ class PicoInterface:
 
         except Exception as e:
             print(f"Error in multi-block acquisition: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def _get_values_bulk(self, enabled_channels, data, down_sample_ratio=1, down_sample_mode=0):
+        """Read all captured segments of all channels with one GetValuesBulk call.
+
+        Args:
+            enabled_channels (list): Channels in the order of data's second axis
+            data (np.ndarray): C-contiguous int16 array of shape (segments, channels, samples) to fill
+
+        Returns:
+            np.ndarray: Per segment overflow bit field (bit 0 = channel A)
+        """
+        num_segments, _, num_samples = data.shape
+        try:
+            for ch_idx, channel in enumerate(enabled_channels):
+                for segment in range(num_segments):
+                    # each (segment, channel) row is contiguous and becomes the driver buffer for that segment
+                    self.ps._lowLevelSetDataBufferBulk(self.ps.CHANNELS[channel], data[segment, ch_idx],
+                                                       segment, down_sample_mode)
+            overflow = np.zeros(num_segments, dtype=np.int16)
+            self.ps._lowLevelGetValuesBulk(num_samples, 0, num_segments - 1, down_sample_ratio, down_sample_mode,
+                                           overflow)
+        finally:
+            # don't leave the driver pointing at our arrays
+            for channel in enabled_channels:
+                for segment in range(num_segments):
+                    self.ps._lowLevelClearDataBuffer(self.ps.CHANNELS[channel], segment)
+        return overflow
+
+    def run_rapid_block_acquisition(self, data_dir, measurement_set_name, num_segments,
+                                    pre_trigger_percent=0, additional_metadata=None, job=None):
+        """Capture num_segments triggers back-to-back in segmented scope memory (rapid block mode).
+
+        The scope re-arms in hardware between triggers, so there is no per-trigger round trip to the PC. After the
+        last trigger all segments are read with a single bulk call into one (segments, channels, samples) int16
+        array, which is appended to a ChunkStore with a single write.
+
+        Args:
+            data_dir (str): Base directory to save data
+            measurement_set_name (str): Name of the measurement set (will be used as folder name)
+            num_segments (int): Number of triggers to capture
+            pre_trigger_percent (float): Percentage of samples before trigger (0-100)
+            additional_metadata (dict, optional): Additional metadata to include
+            job (Job, optional): Background job to report progress to; cancelling stops the capture
+
+        Returns:
+            bool: Success status
+        """
+        if not self.is_open:
+            print("PicoScope not open")
+            return False
+
+        # Get list of enabled channels
+        enabled_channels = [ch for ch, enabled in self.channels_enabled.items() if enabled]
+
+        if not enabled_channels:
+            print("No channels enabled")
+            return False
+
+        try:
+            # Attach time stamp to the folder name
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            measurement_dir = os.path.join(data_dir, "_".join([timestamp, measurement_set_name]))
+            os.makedirs(measurement_dir, exist_ok=True)
+
+            # Partition the scope memory; each segment must hold one capture of all enabled channels
+            # (memorySegments returns the samples per segment shared by the enabled channels)
+            max_segment_samples = self._apply('segments', num_segments, lambda: self.ps.memorySegments(num_segments))
+            segment_samples = self.num_samples * len(enabled_channels)
+            if segment_samples > max_segment_samples:
+                print(f"{self.num_samples} samples x {len(enabled_channels)} channels do not fit in {num_segments} "
+                      f"segments (max {max_segment_samples} samples per segment)")
+                return False
+            self._apply('captures', num_segments, lambda: self.ps.setNoOfCaptures(num_segments))
+            # the bulk readout clears the driver buffers, including the streaming ones
+            self._invalidate('stream_buffers')
+            print(f"Rapid block setup: {num_segments} segments of {self.num_samples} samples "
+                  f"at {self.actual_sample_freq / 1e6:.3f} MHz")
+
+            if job is not None:
+                job.update(0.0, f"Waiting for {num_segments} triggers")
+            t_start = time.perf_counter()
+            self.ps.runBlock(pretrig=pre_trigger_percent / 100.0, segmentIndex=0)
+            if not self._wait_ready(job):
+                print("Rapid block acquisition cancelled")
+                return False
+            capture_time = time.perf_counter() - t_start
+
+            if job is not None:
+                job.update(0.9, "Reading segments")
+            t_start = time.perf_counter()
+            data = np.empty((num_segments, len(enabled_channels), self.num_samples), dtype=np.int16)
+            overflow = self._get_values_bulk(enabled_channels, data)
+            readout_time = time.perf_counter() - t_start
+
+            for channel in enabled_channels:
+                overflowed = int(np.count_nonzero(overflow & (1 << (ord(channel) - ord('A')))))
+                if overflowed:
+                    print(f"Warning: Overflow detected on channel {channel} in {overflowed} segments")
+
+            trigger_offsets = None
+            try:
+                times, _ = self.ps._lowLevelGetValuesTriggerTimeOffsetBulk(0, num_segments - 1)
+                trigger_offsets = times.tolist()
+            except Exception as e:
+                print(f"Trigger time offsets not available: {e}")
+
+            # One write for the whole measurement set, in the same container as multi-block acquisitions
+            t_start = time.perf_counter()
+            store = ChunkStoreWriter(os.path.join(measurement_dir, measurement_set_name), enabled_channels,
+                                     self.num_samples, description={'MeasurementSetName': measurement_set_name,
+                                                                    'AcquisitionMode': 'RapidBlock'})
+            store.append_many(data, overflow=overflow)
+            store.close()
+            write_time = time.perf_counter() - t_start
+            print(f"Captured {num_segments} triggers in {capture_time:.3f} s, read out in {readout_time:.3f} s, "
+                  f"written in {write_time:.3f} s to {store.data_path}")
+
+            self.actual_num_samples = self.num_samples
+            self.actual_acquisition_time = self.num_samples / self.actual_sample_freq
+
+            metadata = self.generate_metadata(additional_metadata)
+            metadata['MeasurementSetName'] = measurement_set_name
+            metadata['AcquisitionMode'] = 'RapidBlock'
+            metadata['NumberOfSegments'] = num_segments
+            metadata['PreTriggerPercent'] = pre_trigger_percent
+            metadata['StorageFormat'] = 'ChunkStore'
+            metadata['DataType'] = 'Raw_ADC_Counts'
+            metadata['DataFile'] = os.path.basename(store.data_path)
+            metadata['IndexFile'] = os.path.basename(store.index_path)
+            metadata['ArrayShape'] = f'(chunks={num_segments}, channels={len(enabled_channels)}, ' \
+                                     f'samples={self.num_samples})'
+            metadata['SegmentOverflow'] = overflow.tolist()
+            metadata['TriggerTimeOffsets'] = trigger_offsets
+            metadata['CaptureTime, s'] = capture_time
+            metadata['ReadoutTime, s'] = readout_time
+            metadata_file = os.path.join(measurement_dir, f"{measurement_set_name}_metadata.json")
+            with open(metadata_file, 'w') as f:
+                json.dump(metadata, f, indent='\t')
+            self.last_metadata_file = metadata_file
+            print(f"Metadata saved to {metadata_file}")
+            return True
+
+        except Exception as e:
+            print(f"Error in rapid block acquisition: {e}")
+            return False
+
+        finally:
+            # Back to a single segment for streaming and single block captures
+            try:
+                self._set_segments(1)
+            except Exception as e:
+                print(f"Error restoring single segment mode: {e}")
@@ -0,0 +1,100 @@
+"""
+Submission of parameterized ARTIQ experiments.
+
+The Sinara templates (urukul_as_freq_gen.py, move_particle.py, mirny_as_freq_gen.py, mirny_scan.py) take their
+settings as experiment arguments (setattr_argument), so the dashboard passes the values on the artiq_run command
+line instead of rewriting the scripts by line number.
+
+ARTIQ folds argument values into the kernel as constants, so a compiled kernel is only valid for the values it was
+compiled with. ArtiqRunner compiles each (script, arguments) combination once with artiq_compile and keeps the
+kernel in cache_dir; running a combination again (e.g. switching back to a previous frequency) runs the stored
+kernel and skips the compilation. Changing the script invalidates its kernels. Updates that should not compile at
+all go through the persistent Sinara worker (ArtiqWorkerClient).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from controllers.sinara.run_artiq_script import run_artiq_in_clang64_visible, compile_artiq_in_clang64
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'qavity_artiq_kernels')
+
+
+class ArtiqRunner:
+    """Runs Sinara experiments with arguments, caching their compiled kernels"""
+
+    def __init__(self, cache_dir=CACHE_DIR, use_cache=True):
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.hits = 0
+        self.misses = 0
+        self.last_run_time = None  # Duration of the last run, including compilation (s)
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def normalize_arguments(arguments):
+        """Argument values as written to the command line: booleans stay booleans, numbers become floats"""
+        normalized = {}
+        for name, value in sorted((arguments or {}).items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                normalized[name] = value
+            else:
+                normalized[name] = float(value)
+        return normalized
+
+    def kernel_path(self, script_path, arguments):
+        """Cache file of the kernel compiled from the current version of the script with these arguments"""
+        stat = os.stat(script_path)
+        key = repr((os.path.abspath(script_path), stat.st_mtime_ns, stat.st_size,
+                    sorted(self.normalize_arguments(arguments).items())))
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(script_path))[0]
+        return os.path.join(self.cache_dir, f"{name}_{digest}.elf")
+
+    def compile(self, script_path, arguments=None):
+        """Compiled kernel of the script for these arguments (from the cache if possible), or None on failure"""
+        arguments = self.normalize_arguments(arguments)
+        path = self.kernel_path(script_path, arguments)
+        if os.path.isfile(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        if compile_artiq_in_clang64(script_path, path, arguments):
+            return path
+        print(f"Compiling {script_path} failed")
+        return None
+
+    def run(self, script_path, **arguments):
+        """
+        Run the experiment with the given arguments and wait for it to finish. Runs the cached kernel if
+        there is one, otherwise compiles it first; falls back to artiq_run of the script if compiling fails.
+        Raises RuntimeError if artiq_run fails, so a queued job ends as failed.
+        """
+        # Sinara runs one experiment at a time
+        with self._lock:
+            t_start = time.perf_counter()
+            print(f"Running {os.path.basename(script_path)} with {self.normalize_arguments(arguments)}")
+            kernel = self.compile(script_path, arguments) if self.use_cache else None
+            if kernel is not None:
+                result = run_artiq_in_clang64_visible(kernel)
+            else:
+                result = run_artiq_in_clang64_visible(script_path, self.normalize_arguments(arguments))
+            self.last_run_time = time.perf_counter() - t_start
+            if result is None:
+                raise RuntimeError(f"Running {os.path.basename(script_path)} failed")
+            return result
+
+    def clear_cache(self):
+        """Delete all compiled kernels"""
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.elf'):
+                os.remove(os.path.join(self.cache_dir, name))
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'CachedKernels': len([n for n in os.listdir(self.cache_dir) if n.endswith('.elf')]),
+                'Hits': self.hits, 'Misses': self.misses, 'LastRunTime, s': self.last_run_time}
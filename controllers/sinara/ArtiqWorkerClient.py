@@ -0,0 +1,242 @@
+"""
+Dashboard side of the persistent Sinara worker (sinara_worker.py).
+
+ArtiqWorkerClient sends parameter updates to the running worker over its socket (worker_protocol.py) and returns
+once Sinara has applied them, typically within milliseconds, instead of rewriting and artiq_run-ing a template
+script for every change. ArtiqWorkerStandIn serves the same protocol without hardware, for testing the dashboard
+and the client; run it with
+
+    python -m controllers.sinara.ArtiqWorkerClient [port] [time_scale]
+"""
+import json
+import socket
+import sys
+import threading
+import time
+
+from controllers.sinara.worker_protocol import (CommandServer, new_state, update_state, is_worker_running,
+                                                WORKER_HOST, WORKER_PORT)
+from controllers.sinara.run_artiq_script import start_artiq_in_clang64
+
+WORKER_SCRIPT = 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/sinara_worker.py'
+
+
+class ArtiqWorkerClient:
+    """
+    Connection to the persistent Sinara worker. Thread safe: requests of different threads are sent one at a time.
+    Every method raises RuntimeError if the worker is not reachable or could not apply the command.
+    """
+
+    def __init__(self, host=WORKER_HOST, port=WORKER_PORT, timeout=5.0, worker_script=WORKER_SCRIPT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout  # Reply timeout on top of the time the command itself takes (s)
+        self.worker_script = worker_script
+        self.last_state = None
+        self.last_latency = None  # Round trip of the last request (s)
+        self.process = None  # Worker started by start_worker
+        self._socket = None
+        self._file = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def connect(self, timeout=None):
+        """Connect to the worker; returns True if connected"""
+        with self._lock:
+            return self._connect(timeout)
+
+    def _connect(self, timeout=None):
+        if self._socket is not None:
+            return True
+        try:
+            self._socket = socket.create_connection((self.host, self.port), timeout=timeout or self.timeout)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._file = self._socket.makefile('rwb')
+            return True
+        except OSError:
+            self._close()
+            return False
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        for closeable in (self._file, self._socket):
+            if closeable is not None:
+                try:
+                    closeable.close()
+                except OSError:
+                    pass
+        self._file = None
+        self._socket = None
+
+    def is_available(self):
+        """True if the worker is running (connects if needed, without waiting long)"""
+        return self.connect(timeout=0.2)
+
+    def start_worker(self, wait=30.0):
+        """
+        Start the worker with artiq_run unless it is already running, then wait up to `wait` seconds for it to
+        accept connections (wait=0: do not wait). Returns True if the worker is available.
+        """
+        if is_worker_running(self.host, self.port):
+            return True
+        print(f"Starting Sinara worker {self.worker_script}")
+        self.process = start_artiq_in_clang64(self.worker_script)
+        if self.process is None:
+            return False
+        return self.wait_for_start(wait)
+
+    def process_alive(self):
+        """True if the worker started by start_worker is still running, including while it starts up"""
+        return self.process is not None and self.process.poll() is None
+
+    def wait_for_start(self, timeout=30.0):
+        """Wait up to timeout seconds for a starting worker to accept connections; returns True if it does"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if is_worker_running(self.host, self.port):
+                return True
+            if time.monotonic() >= deadline or (self.process is not None and not self.process_alive()):
+                return False
+            time.sleep(0.5)
+
+    def request(self, command, run_time=0.0, **params):
+        """Send a command and wait for Sinara to apply it (run_time: time the command takes, s); returns the state"""
+        with self._lock:
+            if not self._connect():
+                raise RuntimeError(f"Sinara worker not running on {self.host}:{self.port}")
+            self._next_id += 1
+            message = {'id': self._next_id, 'command': command, 'params': params}
+            t_start = time.perf_counter()
+            try:
+                self._socket.settimeout(self.timeout + run_time)
+                self._file.write((json.dumps(message) + '\n').encode())
+                self._file.flush()
+                line = self._file.readline()
+                if not line:
+                    raise OSError("connection closed by the worker")
+                response = json.loads(line)
+            except (OSError, ValueError) as e:
+                # the reply can no longer be matched to its request
+                self._close()
+                raise RuntimeError(f"Sinara worker {command} failed: {e}")
+            self.last_latency = time.perf_counter() - t_start
+        if not response.get('ok'):
+            raise RuntimeError(f"Sinara worker {command} failed: {response.get('error')}")
+        self.last_state = response.get('result')
+        return self.last_state
+
+    # Commands
+
+    def ping(self):
+        return self.request('ping')
+
+    def state(self):
+        """Outputs set through the worker: {'urukul': {channel: {...}}, 'mirny': {channel: {...}}, ...}"""
+        return self.request('state')
+
+    def set_urukul(self, channel, frequency, amplitude, attenuation, on):
+        """Frequency in Hz, amplitude 0..1, attenuation in dB"""
+        return self.request('urukul', channel=int(channel), frequency=float(frequency), amplitude=float(amplitude),
+                            attenuation=float(attenuation), on=bool(on))
+
+    def set_mirny(self, channel, frequency, attenuation, on):
+        """Frequency in Hz, attenuation in dB"""
+        return self.request('mirny', channel=int(channel), frequency=float(frequency),
+                            attenuation=float(attenuation), on=bool(on))
+
+    def move_particles(self, detuning, duration, frequency, amplitude_load, attenuation_load,
+                       amplitude_science, attenuation_science):
+        """Detune the science AOM by detuning (Hz) for duration (s); frequency of both AOMs in Hz"""
+        return self.request('move', run_time=float(duration), detuning=float(detuning), duration=float(duration),
+                            frequency=float(frequency), amplitude_load=float(amplitude_load),
+                            attenuation_load=float(attenuation_load), amplitude_science=float(amplitude_science),
+                            attenuation_science=float(attenuation_science))
+
+    def mirny_ramp(self, start_frequency, end_frequency, step, delay, turn_off=False):
+        """Step the Mirny frequency from start to end (Hz) by step (Hz, positive), delay (s) per step"""
+        steps = abs(end_frequency - start_frequency) / step + 1 if step > 0 else 1
+        return self.request('mirny_ramp', run_time=steps * delay, start_frequency=float(start_frequency),
+                            end_frequency=float(end_frequency), step=float(step), delay=float(delay),
+                            turn_off=bool(turn_off))
+
+    def stop_worker(self):
+        """End the worker experiment"""
+        state = self.request('stop')
+        self.close()
+        return state
+
+
+class ArtiqWorkerStandIn:
+    """
+    Local stand-in for the Sinara worker: answers the worker protocol and keeps the output state without any
+    hardware. Commands that take time on Sinara (move, mirny_ramp) sleep for that time multiplied by time_scale.
+    """
+
+    def __init__(self, host=WORKER_HOST, port=WORKER_PORT, time_scale=1.0):
+        self.server = CommandServer(host, port)
+        self.time_scale = time_scale
+        self.state = new_state()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.port
+
+    def start(self):
+        self.server.start()
+        self._thread = threading.Thread(target=self._run, name='SinaraWorkerStandIn', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            request = self.server.get()
+            if request.command in ('ping', 'state'):
+                request.reply(self.state)
+                continue
+            try:
+                request.values()
+                time.sleep(self._duration(request.command, request.params) * self.time_scale)
+                update_state(self.state, request.command, request.params)
+                request.reply(self.state)
+            except Exception as e:
+                request.reply(error=e)
+            if request.command == 'stop':
+                break
+        self.server.stop()
+
+    @staticmethod
+    def _duration(command, params):
+        if command == 'move':
+            return params['duration']
+        if command == 'mirny_ramp' and params['step'] > 0:
+            return (abs(params['end_frequency'] - params['start_frequency']) / params['step'] + 1) * params['delay']
+        return 0.0
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.server.requests.put(_StopRequest())
+            self._thread.join()
+
+
+class _StopRequest:
+    command = 'stop'
+    params = {}
+
+    def values(self):
+        return []
+
+    def reply(self, result=None, error=None):
+        pass
+
+
+if __name__ == '__main__':
+    stand_in = ArtiqWorkerStandIn(port=int(sys.argv[1]) if len(sys.argv) > 1 else WORKER_PORT,
+                                  time_scale=float(sys.argv[2]) if len(sys.argv) > 2 else 1.0).start()
+    try:
+        stand_in._thread.join()
+    except KeyboardInterrupt:
+        stand_in.stop()
@@ -0,0 +1,109 @@
+"""
+Single command queue in front of Sinara.
+
+Sinara can't run experiments in parallel, and running one (artiq_run of a template, or a command of the persistent
+worker) can take seconds. Instead of calling them from Dash callbacks, the generators submit them here: submit()
+returns a Job (controllers.utils.JobManager) immediately, and one background thread runs the queued jobs in order.
+
+Jobs that set the same output (same coalesce_key, e.g. the single tone of a Mirny channel) supersede each other:
+a job still waiting in the queue is dropped when a newer one with the same key arrives, so a burst of UI changes
+results in a single update with the latest values instead of a backlog of outdated ones.
+"""
+import collections
+import threading
+
+from controllers.utils.JobManager import Job
+
+
+class SinaraCommandQueue:
+    """Runs Sinara jobs one at a time on a background thread; see the module docstring"""
+
+    def __init__(self, keep_finished=50):
+        self._pending = collections.deque()  # (job, target, args, kwargs), in submission order
+        self._jobs = {}
+        self._current = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._keep_finished = keep_finished
+        self.coalesced = 0  # Jobs dropped because a newer job superseded them
+
+    def submit(self, name, target, *args, coalesce_key=None, **kwargs):
+        """
+        Queue target(*args, job=job, **kwargs) and return the Job without waiting. A queued job with the same
+        coalesce_key that has not started yet is dropped (finished as cancelled, 'Superseded by <id>').
+        """
+        job = Job(name, key=coalesce_key)
+        with self._condition:
+            if coalesce_key is not None:
+                for entry in [entry for entry in self._pending if entry[0].key == coalesce_key]:
+                    self._pending.remove(entry)
+                    entry[0].skip(f"Superseded by {job.id}")
+                    self.coalesced += 1
+            self._pending.append((job, target, args, kwargs))
+            self._jobs[job.id] = job
+            self._prune()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='SinaraCommandQueue', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        print(f"Sinara job {name} ({job.id}) queued, {len(self._pending)} waiting")
+        return job
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                job, target, args, kwargs = self._pending.popleft()
+                self._current = job
+            if job.cancelled:
+                job.skip("Cancelled before it ran")
+            else:
+                job._run(target, args, kwargs)
+            with self._condition:
+                self._current = None
+                self._condition.notify_all()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond keep_finished"""
+        finished = [job for job in self._jobs.values() if job.is_finished]
+        for job in sorted(finished, key=lambda j: j.created)[:max(0, len(finished) - self._keep_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.as_dict() if job is not None else None
+
+    def cancel(self, job_id):
+        """Cancel a job; a queued job is dropped, a running one is only flagged (Sinara can't be interrupted)"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel()
+        with self._condition:
+            for entry in [entry for entry in self._pending if entry[0] is job]:
+                self._pending.remove(entry)
+                job.skip("Cancelled before it ran")
+        return job
+
+    @property
+    def current(self):
+        """The job Sinara is running now, or None"""
+        return self._current
+
+    def pending(self):
+        """Jobs waiting to run, in order"""
+        with self._condition:
+            return [entry[0] for entry in self._pending]
+
+    def wait_idle(self, timeout=None):
+        """Block until the queue is empty and nothing runs; returns True if it is"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and self._current is None, timeout)
+
+
+# Shared by all Sinara modules (Urukul, Mirny)
+sinara_queue = SinaraCommandQueue()
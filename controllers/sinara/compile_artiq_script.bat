@@ -0,0 +1,3 @@
+@echo off
+call C:/msys64/msys2_shell.cmd -clang64 -here -no-start -defterm -c "artiq_compile %*; status=$?; echo 'Command completed'; exit $status"
+exit /b %ERRORLEVEL%
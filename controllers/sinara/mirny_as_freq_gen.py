@@ -1,10 +1,11 @@
 from artiq.experiment import *
 """
 This is a template script to scan the drive frequency of Mirny frequency generator.
-The experiment-specific purpose of the script is to scan across the cavity resonance 
+The experiment-specific purpose of the script is to scan across the cavity resonance
 to measure TEM00-TEM01 separation, or to measure FSR, or to change detuning between
-the tweezer and the cavity. The script is ran directly on Sinara and is executed 
-with command artiq_run script_name.py.
+the tweezer and the cavity. The script is ran directly on Sinara and is executed
+with command artiq_run script_name.py, with the output set through arguments, e.g.
+artiq_run mirny_as_freq_gen.py drive_freq_kHz=420000.0 att_dB=28.0 turn_on=True
 
 For more details read Artiq manual.
 """
@@ -17,26 +18,26 @@ class MirnyAsFreqGen(EnvExperiment):
         self.setattr_device("mirny0_cpld")
         self.setattr_device('mirny0_ch0')
 
-    @kernel
-    def run(self):
         # Define output frequency and attenuation
-        drive_freq_kHz = 420000.0
-        att_dB = 28.0
+        self.setattr_argument("drive_freq_kHz", NumberValue(420000.0, unit="kHz", scale=1.0))
+        self.setattr_argument("att_dB", NumberValue(28.0, unit="dB", scale=1.0))
         # Set the output on or off
-        turn_on = True
+        self.setattr_argument("turn_on", BooleanValue(True))
 
+    @kernel
+    def run(self):
         # Scan
         self.core.reset()
         #### Initialising cpld (Either of the 2 functions)
         self.mirny0_cpld.init()
-        self.mirny0_cpld.set_att(0, att_dB * dB)
+        self.mirny0_cpld.set_att(0, self.att_dB * dB)
         delay(50 * us)
         self.mirny0_ch0.init()
-        self.mirny0_ch0.set_att(att_dB * dB)
-        self.mirny0_ch0.set_frequency(drive_freq_kHz * kHz)
+        self.mirny0_ch0.set_att(self.att_dB * dB)
+        self.mirny0_ch0.set_frequency(self.drive_freq_kHz * kHz)
 
         #### Turning ON the OUTPUT terminal
-        if (turn_on):
+        if (self.turn_on):
             self.mirny0_ch0.sw.on()
         else: # Just to be sure
             self.mirny0_ch0.sw.off()
@@ -4,7 +4,8 @@ This is a template script to scan the drive frequency of Mirny frequency generat
 The experiment-specific purpose of the script is to scan across the cavity resonance 
 to measure TEM00-TEM01 separation, or to measure FSR, or to change detuning between
 the tweezer and the cavity. The script is ran directly on Sinara and is executed 
-with command artiq_run script_name.py.
+with command artiq_run script_name.py, with the scan set through arguments, e.g.
+artiq_run mirny_scan.py start_freq_kHz=420000.0 end_freq_kHz=488800.0 step_kHz=1.0 step_delay=0.01
 
 For more details read Artiq manual.
 """
@@ -19,17 +20,22 @@ class MirnyRamp(EnvExperiment):
         # TTL channel to signal change of drive frequency
         self.setattr_device("ttl4")
 
-    @kernel
-    def run(self):
         # Define scan parameters
-        start_freq_kHz = 420000.0
-        end_freq_kHz = 488800.0
+        self.setattr_argument("start_freq_kHz", NumberValue(420000.0, unit="kHz", scale=1.0))
+        self.setattr_argument("end_freq_kHz", NumberValue(488800.0, unit="kHz", scale=1.0))
         # STEP HAS TO ALWAYS BE POSITIVE
-        step_kHz = 1.0
+        self.setattr_argument("step_kHz", NumberValue(1.0, unit="kHz", scale=1.0, min=0.0))
         # Delay between steps, seconds
-        step_delay = 0.01
+        self.setattr_argument("step_delay", NumberValue(0.01, unit="s", min=0.0))
         # Turn off the generator at the end
-        turn_off = False
+        self.setattr_argument("turn_off", BooleanValue(False))
+
+    @kernel
+    def run(self):
+        start_freq_kHz = self.start_freq_kHz
+        end_freq_kHz = self.end_freq_kHz
+        step_kHz = self.step_kHz
+        step_delay = self.step_delay
 
         # Scan
         self.core.reset()
@@ -66,6 +72,6 @@ class MirnyRamp(EnvExperiment):
                     delay(step_delay)
                 curr_freq_kHz -= step_kHz  # Reduce drive frequency
 
-        if (turn_off):
+        if (self.turn_off):
             #### Turning OFF the OUTPUT terminal
             self.mirny0_ch0.sw.off()
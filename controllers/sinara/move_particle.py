@@ -10,41 +10,40 @@ class AOM_ctr(EnvExperiment):
         self.setattr_device("urukul0_ch0")  # Channel 0 drives Loading chamber AOM
         self.setattr_device("urukul0_ch1")  # Channel 1 drives Science chamber AOM
 
-    @kernel  # This code runs on the FPGA
-    def run(self):
-        # Externally set parameters
-        detuning = 40000.0 # Conveyor belt detuning, <0 for transport to science chamber
-        transport_time = 120.0 # time for which to move the particle
+        # Externally set parameters, e.g. artiq_run move_particle.py detuning=-40000.0 transport_time=3.0
+        self.setattr_argument("detuning", NumberValue(40000.0, unit="kHz"))  # Conveyor belt detuning, Hz, <0 for transport to science chamber
+        self.setattr_argument("transport_time", NumberValue(120.0, unit="s", min=0.0))  # time for which to move the particle
         # Loading AOM (CH0)
-        # freq_load = 110000000
-        freq_load = 110000000.0
-        amp_load = 0.45
-        att_load = 15.0
+        self.setattr_argument("freq_load", NumberValue(110000000.0, unit="MHz"))
+        self.setattr_argument("amp_load", NumberValue(0.45, min=0.0, max=1.0))
+        self.setattr_argument("att_load", NumberValue(15.0, unit="dB", scale=1.0))
         # Science AOM (CH1)
-        amp_sci = 0.44
-        att_sci = 15.0
+        self.setattr_argument("amp_sci", NumberValue(0.44, min=0.0, max=1.0))
+        self.setattr_argument("att_sci", NumberValue(15.0, unit="dB", scale=1.0))
 
+    @kernel  # This code runs on the FPGA
+    def run(self):
         self.core.reset()
         self.urukul0_cpld.init()  # initialises CPLD
         self.urukul0_cpld.get_att_mu() # Needed to not reset attenuation to default during the init phase
         delay(50 * us) # Slack needed after the get_att_mu() function
 
         # Loading side AOM
-        self.urukul0_ch0.set_att(att_load)  # writes attenuation to urukul channel
-        self.urukul0_ch0.set(frequency=freq_load,
-                             amplitude=amp_load)  # writes frequency and amplitude variables to urukul channel thus outputting function
+        self.urukul0_ch0.set_att(self.att_load)  # writes attenuation to urukul channel
+        self.urukul0_ch0.set(frequency=self.freq_load,
+                             amplitude=self.amp_load)  # writes frequency and amplitude variables to urukul channel thus outputting function
         # Science side AOM
-        self.urukul0_ch1.set_att(att_sci)  # writes attenuation to urukul channel
-        self.urukul0_ch1.set(frequency=freq_load,
-                             amplitude=amp_sci)
+        self.urukul0_ch1.set_att(self.att_sci)  # writes attenuation to urukul channel
+        self.urukul0_ch1.set(frequency=self.freq_load,
+                             amplitude=self.amp_sci)
 
         self.urukul0_ch0.sw.on()  # switches urukul channel on
         self.urukul0_ch1.sw.on()  # switches urukul channel on
 
-        self.urukul0_ch1.set(frequency=freq_load+detuning,
-                             amplitude=amp_sci)
-        delay(transport_time)
-        self.urukul0_ch1.set(frequency=freq_load,
-                             amplitude=amp_sci)
+        self.urukul0_ch1.set(frequency=self.freq_load+self.detuning,
+                             amplitude=self.amp_sci)
+        delay(self.transport_time)
+        self.urukul0_ch1.set(frequency=self.freq_load,
+                             amplitude=self.amp_sci)
 
 
@@ -1,2 +1,3 @@
 @echo off
-call C:/msys64/msys2_shell.cmd -clang64 -here -no-start -defterm -c "artiq_run %1; echo 'Command completed';
\ No newline at end of file
+call C:/msys64/msys2_shell.cmd -clang64 -here -no-start -defterm -c "artiq_run %*; status=$?; echo 'Command completed'; exit $status"
+exit /b %ERRORLEVEL%
@@ -1,8 +1,24 @@
 import subprocess
 import os
 
-def run_artiq_in_clang64_visible(script_path):
-    batch_file = 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/run_artiq_script.bat'
+batch_file = 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/run_artiq_script.bat'
+compile_batch_file = 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/compile_artiq_script.bat'
+
+
+def format_arguments(arguments):
+    """
+    Experiment arguments as name=value command line items of artiq_run / artiq_compile.
+    Values are written as Python literals (PYON), e.g. freq_ch0=110000000.0 ch0_on=True
+    """
+    return [f"{name}={value!r}" for name, value in (arguments or {}).items()]
+
+
+def run_artiq_in_clang64_visible(script_path, arguments=None):
+    """
+    Runs artiq_run on a script (or a kernel compiled with artiq_compile) in an MSYS2 window
+    and waits for it to finish. arguments: {name: value} of the experiment's arguments.
+    Returns None if artiq_run could not be started or exited with an error.
+    """
     try:
 #         # Path to MSYS2 clang64 executable - update this path as needed
 #         msys2_path = "C:/msys64"
@@ -21,12 +37,46 @@ def run_artiq_in_clang64_visible(script_path):
         # Execute the batch file
         # subprocess.run(
         #     'C:\\Users\\CavLev\\Documents\\Experiment_control_scripts\\artiq\\artiq-master\\artiq_run_script.bat')
-        subprocess.run([batch_file, script_path])
+        completed = subprocess.run([batch_file, script_path] + format_arguments(arguments))
         # Clean up the batch file
         # os.remove(batch_file)
 
+        if completed.returncode != 0:
+            print(f"artiq_run {script_path} failed with exit status {completed.returncode}")
+            return None
         return "Command executed in MSYS2 window"
 
     except Exception as e:
         print("Exception occurred:", str(e))
-        return None
\ No newline at end of file
+        return None
+
+
+def compile_artiq_in_clang64(script_path, output_path, arguments=None):
+    """
+    Compiles the kernel of a script with the given arguments with artiq_compile, so that it can
+    be run later without compiling. Returns True if the compiled kernel was written to output_path.
+    """
+    try:
+        completed = subprocess.run([compile_batch_file, script_path, '-o', output_path.replace('\\', '/')]
+                                   + format_arguments(arguments))
+        if completed.returncode != 0:
+            print(f"artiq_compile {script_path} failed with exit status {completed.returncode}")
+            if os.path.isfile(output_path):
+                os.remove(output_path)  # possibly incomplete, must not be cached
+            return False
+        return os.path.isfile(output_path)
+    except Exception as e:
+        print("Exception occurred:", str(e))
+        return False
+
+
+def start_artiq_in_clang64(script_path, arguments=None):
+    """
+    Starts artiq_run of the script in an MSYS2 window without waiting for it to finish,
+    e.g. for the persistent Sinara worker. Returns the process, or None if it could not be started.
+    """
+    try:
+        return subprocess.Popen([batch_file, script_path] + format_arguments(arguments))
+    except Exception as e:
+        print("Exception occurred:", str(e))
+        return None
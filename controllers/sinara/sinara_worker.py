@@ -0,0 +1,212 @@
+from artiq.experiment import *
+import os
+import sys
+import time
+"""
+Persistent Sinara worker. Started once with artiq_run sinara_worker.py (see ArtiqWorkerClient.start_worker), it
+compiles and uploads a single kernel that stays on the core device and executes commands sent by the dashboard
+over a local socket (worker_protocol.py), instead of a new artiq_run of a template script for every change.
+
+The kernel asks the host for the next command through an RPC, applies it to Urukul / Mirny and reports back, so
+an update costs an RPC round trip instead of starting ARTIQ and compiling an experiment. Commands:
+    urukul      set frequency, amplitude, attenuation and switch of an Urukul channel (move_particle.py outputs)
+    mirny       set frequency, attenuation and switch of the Mirny channel (mirny_as_freq_gen.py)
+    move        move particles with the conveyor belt AOMs (move_particle.py)
+    mirny_ramp  step the Mirny frequency with a TTL4 pulse per step (mirny_scan.py)
+    stop        end the kernel and the worker
+
+For more details read Artiq manual.
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from worker_protocol import CommandServer, new_state, update_state, WORKER_HOST, WORKER_PORT
+
+# Opcodes of the commands handled by the kernel
+OP_IDLE = 0
+OP_STOP = 1
+OP_URUKUL = 2
+OP_MIRNY = 3
+OP_MOVE = 4
+OP_MIRNY_RAMP = 5
+OPCODES = {'stop': OP_STOP, 'urukul': OP_URUKUL, 'mirny': OP_MIRNY, 'move': OP_MOVE, 'mirny_ramp': OP_MIRNY_RAMP}
+
+# Mirny CPLD attenuation set before initialization; 27 dB is set specifically for the EOM of the cavity setup.
+# Check that it does not fry whatever you're driving.
+MIRNY_INIT_ATTENUATION = 27.0
+
+
+class SinaraWorker(EnvExperiment):
+    """Persistent Sinara worker"""
+
+    def build(self):
+        self.setattr_device("core")
+        # Urukul
+        self.setattr_device('urukul0_cpld')
+        self.setattr_device("urukul0_ch0")  # Channel 0 drives Loading chamber AOM
+        self.setattr_device("urukul0_ch1")  # Channel 1 drives Science chamber AOM
+        self.setattr_device("urukul0_ch2")
+        self.setattr_device("urukul0_ch3")
+        self.urukul_channels = [self.urukul0_ch0, self.urukul0_ch1, self.urukul0_ch2, self.urukul0_ch3]
+        # Mirny, only channel 0 for now
+        self.setattr_device("mirny0_cpld")
+        self.setattr_device('mirny0_ch0')
+        # TTL channel to signal change of drive frequency
+        self.setattr_device("ttl4")
+
+        self.server = None
+        self.request = None
+        self.stopped = False
+        self.state = new_state()
+
+    def prepare(self):
+        self.server = CommandServer(WORKER_HOST, WORKER_PORT)
+
+    def run(self):
+        self.server.start()
+        try:
+            while not self.stopped:
+                try:
+                    self.serve()
+                except Exception as e:
+                    # e.g. the core device was reset; answer the command and upload the kernel again
+                    print(f"Sinara worker kernel stopped: {e}")
+                    if self.request is not None:
+                        self.request.reply(error=e)
+                        self.request = None
+                    time.sleep(1.0)
+            if self.request is not None:
+                self.request.reply(self.state)
+                self.request = None
+        finally:
+            self.server.stop()
+
+    # Host side, called from the kernel
+
+    def next_command(self) -> TList(TFloat):
+        """Wait for the next command for the core device as [opcode, parameters...]; answers host-only ones"""
+        request = self.server.get(timeout=1.0)
+        while request is not None:
+            if request.command in ('ping', 'state'):
+                request.reply(self.state)
+            else:
+                try:
+                    values = request.values()
+                    self.request = request
+                    if request.command == 'stop':
+                        self.stopped = True
+                    return [float(OPCODES[request.command])] + values
+                except Exception as e:
+                    request.reply(error=e)
+            request = self.server.get(timeout=0)
+        # lets the kernel loop come back regularly, so the experiment can be terminated
+        return [float(OP_IDLE)]
+
+    @rpc(flags={"async"})
+    def command_done(self):
+        request, self.request = self.request, None
+        update_state(self.state, request.command, request.params)
+        request.reply(self.state)
+
+    @rpc(flags={"async"})
+    def command_failed(self):
+        request, self.request = self.request, None
+        request.reply(error="RTIO underflow while applying the command")
+
+    # Kernel
+
+    @kernel
+    def serve(self):
+        self.core.reset()
+        self.ttl4.output()
+        self.urukul0_cpld.init()  # initialises CPLD
+        self.urukul0_cpld.get_att_mu()  # Needed to not reset attenuation to default during the init phase
+        delay(50 * us)  # Slack needed after the get_att_mu() function
+        # This line is crucial to not turn off channel output during device initialization
+        self.mirny0_cpld.init()
+        self.mirny0_cpld.set_att(0, MIRNY_INIT_ATTENUATION * dB)
+        delay(50 * us)
+        self.mirny0_ch0.init()
+
+        while True:
+            command = self.next_command()
+            op = int(command[0])
+            if op == OP_STOP:
+                break
+            if op == OP_IDLE:
+                continue
+            self.core.break_realtime()
+            try:
+                if op == OP_URUKUL:
+                    self.set_urukul(int(command[1]), command[2], command[3], command[4], command[5] > 0.5)
+                elif op == OP_MIRNY:
+                    self.set_mirny(command[2], command[3], command[4] > 0.5)
+                elif op == OP_MOVE:
+                    self.move(command[1], command[2], command[3], command[4], command[5], command[6], command[7])
+                elif op == OP_MIRNY_RAMP:
+                    self.mirny_ramp(command[1], command[2], command[3], command[4], command[5] > 0.5)
+                # reply once the outputs have actually changed
+                self.core.wait_until_mu(now_mu())
+                self.command_done()
+            except RTIOUnderflow:
+                self.command_failed()
+
+    @kernel
+    def set_urukul(self, channel, frequency, amplitude, attenuation, on):
+        urukul = self.urukul_channels[channel]
+        urukul.set_att(attenuation)  # writes attenuation to urukul channel
+        urukul.set(frequency=frequency, amplitude=amplitude)
+        delay(50 * us)
+        if on:
+            urukul.sw.on()
+        else:
+            urukul.sw.off()
+
+    @kernel
+    def set_mirny(self, frequency, attenuation, on):
+        self.mirny0_ch0.set_att(attenuation * dB)
+        self.mirny0_ch0.set_frequency(frequency)
+        if on:
+            self.mirny0_ch0.sw.on()
+        else:
+            self.mirny0_ch0.sw.off()
+
+    @kernel
+    def move(self, detuning, duration, frequency, amp_load, att_load, amp_sci, att_sci):
+        # Loading side AOM
+        self.urukul0_ch0.set_att(att_load)
+        self.urukul0_ch0.set(frequency=frequency, amplitude=amp_load)
+        # Science side AOM
+        self.urukul0_ch1.set_att(att_sci)
+        self.urukul0_ch1.set(frequency=frequency, amplitude=amp_sci)
+
+        self.urukul0_ch0.sw.on()
+        self.urukul0_ch1.sw.on()
+
+        self.urukul0_ch1.set(frequency=frequency + detuning, amplitude=amp_sci)
+        delay(duration)
+        self.urukul0_ch1.set(frequency=frequency, amplitude=amp_sci)
+
+    @kernel
+    def mirny_ramp(self, start_freq, end_freq, step, step_delay, turn_off):
+        # STEP HAS TO ALWAYS BE POSITIVE
+        self.mirny0_ch0.set_frequency(start_freq)
+        self.mirny0_ch0.sw.on()
+
+        curr_freq = start_freq
+        if end_freq > start_freq:
+            while curr_freq <= end_freq:
+                with parallel:
+                    self.mirny0_ch0.set_frequency(curr_freq)
+                    self.ttl4.pulse(100 * us)  # Trigger for external acquisition
+                    delay(step_delay)
+                curr_freq += step  # Increase drive frequency
+        elif end_freq < start_freq:
+            while curr_freq >= end_freq:
+                with parallel:
+                    self.mirny0_ch0.set_frequency(curr_freq)
+                    self.ttl4.pulse(100 * us)  # Trigger for external acquisition
+                    delay(step_delay)
+                curr_freq -= step  # Reduce drive frequency
+
+        if turn_off:
+            self.mirny0_ch0.sw.off()
@@ -12,53 +12,42 @@ class AOM_ctr(EnvExperiment):
         self.setattr_device("urukul0_ch2")  # Channel 2
         self.setattr_device("urukul0_ch3")  # Channel 3
 
+        # Externally set parameters, e.g. artiq_run urukul_as_freq_gen.py freq_ch0=110e6 ch0_on=True
+        for ch, freq in enumerate([20000000.0, 10000000.0, 300000.0, 300000.0]):
+            self.setattr_argument(f"freq_ch{ch}", NumberValue(freq, unit="MHz"))  # Frequencies, Hz
+        for ch, amp in enumerate([0.45, 0.44, 0.5, 0.5]):
+            self.setattr_argument(f"amp_ch{ch}", NumberValue(amp, min=0.0, max=1.0))  # Amplitudes
+        for ch in range(4):
+            self.setattr_argument(f"att_ch{ch}", NumberValue(15.0, unit="dB", scale=1.0))  # Attenuations
+        for ch in range(4):
+            self.setattr_argument(f"ch{ch}_on", BooleanValue(False))  # Output state
+
     @kernel  # This code runs on the FPGA
     def run(self):
-        # Frequencies
-        freq_ch0 = 20000000.0
-        freq_ch1 = 10000000.0
-        freq_ch2 = 300000.0
-        freq_ch3 = 300000.0
-        # Amplitudes
-        amp_ch0 = 0.45
-        amp_ch1 = 0.44
-        amp_ch2 = 0.5
-        amp_ch3 = 0.5
-        # Attenuations
-        att_ch0 = 15.0
-        att_ch1 = 15.0
-        att_ch2 = 15.0
-        att_ch3 = 15.0
-        # Output state
-        ch0_on = False
-        ch1_on = False
-        ch2_on = False
-        ch3_on = False
-
         self.core.reset()
         self.urukul0_cpld.init()  # initialises CPLD
         self.urukul0_cpld.get_att_mu() # Needed to not reset attenuation to default during the init phase
         delay(50 * us) # Slack needed after the get_att_mu() function
 
         # Channel 0 parameters
-        self.urukul0_ch0.set_att(att_ch0)  # writes attenuation to urukul channel
-        self.urukul0_ch0.set(frequency=freq_ch0,
-                             amplitude=amp_ch0)  # writes frequency and amplitude variables to urukul channel thus outputting function
+        self.urukul0_ch0.set_att(self.att_ch0)  # writes attenuation to urukul channel
+        self.urukul0_ch0.set(frequency=self.freq_ch0,
+                             amplitude=self.amp_ch0)  # writes frequency and amplitude variables to urukul channel thus outputting function
         delay(50 * us)
         # Channel 1 parameters
-        self.urukul0_ch1.set_att(att_ch1)  # writes attenuation to urukul channel
-        self.urukul0_ch1.set(frequency=freq_ch1,
-                             amplitude=amp_ch1)
+        self.urukul0_ch1.set_att(self.att_ch1)  # writes attenuation to urukul channel
+        self.urukul0_ch1.set(frequency=self.freq_ch1,
+                             amplitude=self.amp_ch1)
         delay(50 * us)
         # Channel 2 parameters
-        self.urukul0_ch2.set_att(att_ch2)  # writes attenuation to urukul channel
-        self.urukul0_ch2.set(frequency=freq_ch2,
-                             amplitude=amp_ch2)
+        self.urukul0_ch2.set_att(self.att_ch2)  # writes attenuation to urukul channel
+        self.urukul0_ch2.set(frequency=self.freq_ch2,
+                             amplitude=self.amp_ch2)
         delay(50 * us)
         # Channel 3 parameters
-        self.urukul0_ch3.set_att(att_ch3)  # writes attenuation to urukul channel
-        self.urukul0_ch3.set(frequency=freq_ch3,
-                             amplitude=amp_ch3)
+        self.urukul0_ch3.set_att(self.att_ch3)  # writes attenuation to urukul channel
+        self.urukul0_ch3.set(frequency=self.freq_ch3,
+                             amplitude=self.amp_ch3)
         delay(50 * us)
 
         self.urukul0_ch0.sw.off()
@@ -66,13 +55,13 @@ class AOM_ctr(EnvExperiment):
         self.urukul0_ch2.sw.off()
         self.urukul0_ch3.sw.off()
 
-        if ch0_on: # switches urukul channel 0 on
+        if self.ch0_on: # switches urukul channel 0 on
             self.urukul0_ch0.sw.on()
-        if ch1_on: # switches urukul channel 0 on
+        if self.ch1_on: # switches urukul channel 0 on
             self.urukul0_ch1.sw.on()
-        if ch2_on: # switches urukul channel 0 on
+        if self.ch2_on: # switches urukul channel 0 on
             self.urukul0_ch2.sw.on()
-        if ch3_on: # switches urukul channel 0 on
+        if self.ch3_on: # switches urukul channel 0 on
             self.urukul0_ch3.sw.on()
 
 
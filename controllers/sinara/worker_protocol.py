@@ -0,0 +1,169 @@
+"""
+Socket protocol of the persistent Sinara worker (see sinara_worker.py and ArtiqWorkerClient.py).
+
+Clients connect over TCP and send one JSON object per line:
+    {"id": 1, "command": "urukul", "params": {"channel": 0, "frequency": 110e6, ...}}
+and receive one JSON line per request, in order:
+    {"id": 1, "ok": true, "result": {...}, "elapsed": 0.002}
+    {"id": 1, "ok": false, "error": "..."}
+
+Commands of all clients go through a single queue and are executed one at a time, since Sinara can't run
+experiments in parallel. Only the standard library is used here, so that the module can be imported by the ARTIQ
+experiment as well as by the dashboard.
+"""
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+WORKER_HOST = '127.0.0.1'
+WORKER_PORT = 3270
+
+# Commands understood by the worker and the parameters they take, in the order the kernel receives them
+COMMANDS = {
+    'ping': (),
+    'state': (),
+    'urukul': ('channel', 'frequency', 'amplitude', 'attenuation', 'on'),
+    'mirny': ('channel', 'frequency', 'attenuation', 'on'),
+    'move': ('detuning', 'duration', 'frequency', 'amplitude_load', 'attenuation_load',
+             'amplitude_science', 'attenuation_science'),
+    'mirny_ramp': ('start_frequency', 'end_frequency', 'step', 'delay', 'turn_off'),
+    'stop': (),
+}
+
+
+class Request:
+    """A command waiting in the worker queue; the executor answers it with reply()"""
+
+    def __init__(self, request_id, command, params):
+        self.id = request_id
+        self.command = command
+        self.params = params
+        self.received = time.perf_counter()
+        self.response = None
+        self._done = threading.Event()
+
+    def values(self):
+        """Parameters as floats in COMMANDS order (booleans as 0/1), as passed to the kernel"""
+        missing = [name for name in COMMANDS[self.command] if name not in self.params]
+        if missing:
+            raise ValueError(f"{self.command}: missing parameters {missing}")
+        return [float(self.params[name]) for name in COMMANDS[self.command]]
+
+    def reply(self, result=None, error=None):
+        self.response = {'id': self.id, 'ok': error is None, 'elapsed': time.perf_counter() - self.received}
+        if error is None:
+            self.response['result'] = result
+        else:
+            self.response['error'] = str(error)
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server.command_server
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+                request = Request(message.get('id'), message['command'], message.get('params') or {})
+                if request.command not in COMMANDS:
+                    request.reply(error=f"Unknown command {request.command}")
+                else:
+                    server.requests.put(request)
+                    request.wait()
+            except Exception as e:
+                request = Request(None, None, None)
+                request.reply(error=f"Invalid request: {e}")
+            try:
+                self.wfile.write((json.dumps(request.response) + '\n').encode())
+            except OSError:
+                break
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class CommandServer:
+    """
+    Accepts worker commands on host:port and queues them; the executor takes them with get() and answers each one
+    with Request.reply(). The answer is sent back to the client that issued the command.
+    """
+
+    def __init__(self, host=WORKER_HOST, port=WORKER_PORT):
+        self.host = host
+        self.port = port
+        self.requests = queue.Queue()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self._server = _TCPServer((self.host, self.port), _Handler)
+        self._server.command_server = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='SinaraWorkerServer', daemon=True)
+        self._thread.start()
+        print(f"Sinara worker listening on {self.host}:{self.port}")
+
+    def get(self, timeout=None):
+        """Next queued request, or None if there was none within timeout"""
+        try:
+            return self.requests.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        # answer whatever is still queued, so that no client waits forever
+        while True:
+            request = self.get(timeout=0)
+            if request is None:
+                break
+            request.reply(error="Sinara worker stopped")
+
+
+def new_state():
+    """Output state kept by the worker and returned with every reply"""
+    return {'urukul': {}, 'mirny': {}, 'commands': 0}
+
+
+def update_state(state, command, params):
+    """Record the outputs left by a command executed on Sinara"""
+    if command == 'urukul':
+        state['urukul'][str(int(params['channel']))] = {
+            name: params[name] for name in ('frequency', 'amplitude', 'attenuation', 'on')}
+    elif command == 'mirny':
+        state['mirny'][str(int(params['channel']))] = {
+            name: params[name] for name in ('frequency', 'attenuation', 'on')}
+    elif command == 'move':
+        # both AOMs are left on at the loading frequency
+        for channel, suffix in (('0', 'load'), ('1', 'science')):
+            state['urukul'][channel] = {'frequency': params['frequency'], 'amplitude': params[f'amplitude_{suffix}'],
+                                        'attenuation': params[f'attenuation_{suffix}'], 'on': True}
+    elif command == 'mirny_ramp':
+        channel = state['mirny'].setdefault('0', {})
+        channel['frequency'] = params['end_frequency']
+        channel['on'] = not params['turn_off']
+    state['commands'] += 1
+    return state
+
+
+def is_worker_running(host=WORKER_HOST, port=WORKER_PORT, timeout=0.2):
+    """True if something accepts connections on the worker port"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
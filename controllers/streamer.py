@@ -1,43 +1,78 @@
-from quart import websocket
+from quart import websocket, request, Response
 from server import webcam_server
 import asyncio
 import base64
+import json
+import time
+from collections import namedtuple
 import cv2
 
+from controllers.utils.FramePacer import FramePacer, StreamStats
+
+
+# Output size and JPEG quality of a stream. Frames are resized and encoded once per variant and shared by all
+# viewers requesting the same variant. A missing width or height keeps the aspect ratio, scale is only used when
+# neither is given; without any of them the full resolution is sent. Frames are never upscaled.
+StreamVariant = namedtuple('StreamVariant', ['width', 'height', 'scale', 'quality'])
+FULL_RESOLUTION = StreamVariant(None, None, None, 95)
+
+MJPEG_BOUNDARY = b'frame'
+
 
 class WebcamStreamer:
-    def __init__(self, camera, path):
+    # How often the sensor frame rate is queried from the camera (s)
+    SENSOR_RATE_REFRESH_S = 1.0
+
+    def __init__(self, camera, path, grabber=None, accumulator=None):
         self._camera = camera
         self._path = path
+        # Optional FrameGrabber acquiring frames on its own thread; without it frames are acquired on demand
+        self._grabber = grabber
+        # Optional FrameAccumulator (listening to the grabber); its averaged image is streamed while active
+        self._accumulator = accumulator
+        self._stats = StreamStats()
+        self._sensor_fps = None
+        self._sensor_fps_checked = None
+        self._late_frames = 0
+
+        # Latest acquired frame, shared by all viewers
+        self._frame = None
+        self._frame_seq = 0
+        self._frame_time = None
+        # Per variant caches: resize destination buffers and the encoded JPEG of the latest frame
+        self._resize_buffers = {}
+        self._encoded = {}  # variant -> (frame_seq, jpeg bytes)
+
         self._register_endpoint()
         print(f"WebcamStreamer initialized for camera {self._camera.id} on path {self._path}")
 
     def _register_endpoint(self):
-        """Register the websocket route once during initialization"""
+        """
+        Register the websocket route once during initialization.
+        Each viewer selects its variant with query parameters (e.g. /stream1?width=480&quality=80&fps=5) and can
+        change it at any time by sending a JSON message with the same keys.
+        """
 
         @webcam_server.websocket(self._path, endpoint=self._camera.id)
         async def stream_handler():
-            print(f'CAMERA {self._camera.id} WEBSOCKET CONNECTED')
+            viewer = self.parse_viewer_settings(websocket.args)
+            print(f'CAMERA {self._camera.id} WEBSOCKET CONNECTED ({viewer})')
 
-            try:
+            async def receive_settings():
                 while True:
-                    if not self._camera.streamOn:
-                        # If streaming is off, wait a bit and check again
-                        await asyncio.sleep(1.0)
-                        continue
-
-                    # Streaming is active, get and send frames
-                    # if self._camera.framerate is not None:
-                    #     await asyncio.sleep(1 / self._camera.framerate)
-
-                    frame = self._camera.get_frame()
-                    if frame is not None:
-                        # print('STREAMER SIDE: FRAME IS NOT NONE')
-                        _, jpeg = cv2.imencode('.jpg', frame)
-                        await websocket.send(jpeg.tobytes())
-                        jpeg = None
-                        # await websocket.send(jpeg.tobytes())
-                    await asyncio.sleep(1 / self._camera.framerate)
+                    message = await websocket.receive()
+                    try:
+                        viewer.update(self.parse_viewer_settings(json.loads(message), defaults=viewer))
+                        print(f'CAMERA {self._camera.id} VIEWER SETTINGS: {viewer}')
+                    except (ValueError, TypeError, AttributeError) as e:
+                        print(f'CAMERA {self._camera.id}: invalid viewer settings {message!r}: {e}')
+
+            settings_task = asyncio.create_task(receive_settings())
+            try:
+                async for jpeg in self._frames(viewer):
+                    t_send = time.perf_counter()
+                    await websocket.send(jpeg)
+                    self._stats.record_send(time.perf_counter() - t_send)
             except asyncio.CancelledError:
                 print(f'CAMERA {self._camera.id} WEBSOCKET DISCONNECTED')
             except Exception as e:
@@ -45,9 +80,191 @@ class WebcamStreamer:
                 import traceback
                 traceback.print_exc()
             finally:
+                settings_task.cancel()
                 print(f'CAMERA {self._camera.id} STREAM HANDLER EXITED')
 
+        @webcam_server.route(self.mjpeg_path, endpoint=f'{self._camera.id}_mjpeg')
+        async def mjpeg_handler():
+            """
+            multipart/x-mixed-replace stream that an <img> element displays directly, without websocket messages,
+            Blob URLs or Dash callbacks. Accepts the same query parameters as the websocket.
+            """
+            viewer = self.parse_viewer_settings(request.args)
+            print(f'CAMERA {self._camera.id} MJPEG VIEWER CONNECTED ({viewer})')
+
+            async def parts():
+                try:
+                    async for jpeg in self._frames(viewer):
+                        yield (b'--' + MJPEG_BOUNDARY + b'\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                               + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+                finally:
+                    print(f'CAMERA {self._camera.id} MJPEG VIEWER DISCONNECTED')
+
+            response = Response(parts(), mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY.decode()}')
+            response.headers['Cache-Control'] = 'no-cache, no-store'
+            response.timeout = None  # the stream runs until the client disconnects
+            return response
+
+    async def _frames(self, viewer):
+        """Paced JPEG frames of the viewer's variant, waiting while the camera stream is stopped"""
+        pacer = FramePacer(self.stream_fps)
+        last_seq = None
+        while True:
+            if not self._camera.streamOn:
+                # If streaming is off, wait a bit and check again
+                pacer.reset()
+                self._stats.clear()
+                await asyncio.sleep(1.0)
+                continue
+
+            # Streaming is active, get and send frames
+            fps = self.stream_fps
+            if viewer['max_fps']:
+                fps = min(fps, viewer['max_fps']) if fps else viewer['max_fps']
+            pacer.fps = fps
+            seq = self._latest_frame(max_age=0.5 * pacer.interval)
+            if seq is not None and seq != last_seq:
+                jpeg = self._encode(viewer['variant'])
+                if jpeg is not None:
+                    last_seq = seq
+                    yield jpeg
+            await pacer.wait()
+            self._late_frames = pacer.late_frames
+
+    @property
+    def mjpeg_path(self):
+        """HTTP path of the MJPEG stream, e.g. /stream1.mjpg"""
+        return f'{self._path}.mjpg'
+
+    def mjpeg_url(self, host='http://127.0.0.1:5000', **params):
+        """URL of the MJPEG stream with the given viewer settings, usable as an <img> src"""
+        query = '&'.join(f'{key}={value}' for key, value in params.items() if value is not None)
+        return f'{host}{self.mjpeg_path}' + (f'?{query}' if query else '')
+
+    @staticmethod
+    def parse_viewer_settings(params, defaults=None):
+        """
+        Build viewer settings from query parameters or a handshake message.
+        Keys: width, height (pixels), scale (fraction of full size, used if width/height are missing),
+        quality (JPEG quality 1-100) and fps (maximum frame rate for this viewer).
+        """
+        variant = defaults['variant'] if defaults else FULL_RESOLUTION
+        max_fps = defaults['max_fps'] if defaults else None
+
+        def number(key, cast):
+            value = params.get(key)
+            return cast(value) if value not in (None, '') else None
+
+        size = {'width': number('width', int), 'height': number('height', int), 'scale': number('scale', float)}
+        if any(value is not None for value in size.values()):
+            variant = variant._replace(**size)
+        quality = number('quality', int)
+        if quality is not None:
+            variant = variant._replace(quality=min(max(quality, 1), 100))
+        fps = number('fps', float)
+        if fps is not None:
+            max_fps = fps if fps > 0 else None
+        return {'variant': variant, 'max_fps': max_fps}
+
+    def _latest_frame(self, max_age):
+        """Sequence number of a frame no older than max_age (s), acquiring a new one if needed"""
+        if self._grabber is not None:
+            if self._frame is not None and self._grabber.seq == self._frame_seq:
+                return self._frame_seq  # no new frame, skip copying the current one again
+            seq, frame, _ = self._grabber.latest()
+            if frame is None:
+                return None
+            if seq != self._frame_seq:
+                if self._accumulator is not None and self._accumulator.active:
+                    frame = self._accumulator.get_display_frame()
+                    if frame is None:
+                        return None
+                self._frame = frame
+                self._frame_seq = seq
+                self._stats.record_frame(self._grabber.acquire_s)
+            return seq
+        now = time.monotonic()
+        if self._frame is not None and now - self._frame_time < max_age:
+            return self._frame_seq
+        t_start = time.perf_counter()
+        frame = self._camera.get_frame()
+        if frame is None:
+            return None
+        self._stats.record_frame(time.perf_counter() - t_start)
+        self._frame = frame
+        self._frame_seq += 1
+        self._frame_time = now
+        return self._frame_seq
+
+    @staticmethod
+    def _output_size(variant, frame_shape):
+        height, width = frame_shape[:2]
+        if variant.width is None and variant.height is None:
+            scale = min(variant.scale or 1.0, 1.0)
+            return max(1, round(width * scale)), max(1, round(height * scale))
+        if variant.height is None:
+            out_width = min(variant.width, width)
+            return out_width, max(1, round(height * out_width / width))
+        if variant.width is None:
+            out_height = min(variant.height, height)
+            return max(1, round(width * out_height / height)), out_height
+        return min(variant.width, width), min(variant.height, height)
+
+    def _encode(self, variant):
+        """JPEG of the latest frame for a variant, resized and encoded at most once per frame"""
+        cached = self._encoded.get(variant)
+        if cached is not None and cached[0] == self._frame_seq:
+            return cached[1]
+        t_start = time.perf_counter()
+        frame = self._frame
+        out_width, out_height = self._output_size(variant, frame.shape)
+        if (out_width, out_height) != (frame.shape[1], frame.shape[0]):
+            key = (out_width, out_height, frame.dtype.str, frame.shape[2:])
+            buffer = self._resize_buffers.get(key)
+            if buffer is None:
+                buffer = cv2.resize(frame, (out_width, out_height), interpolation=cv2.INTER_AREA)
+                self._resize_buffers[key] = buffer
+            else:
+                cv2.resize(frame, (out_width, out_height), dst=buffer, interpolation=cv2.INTER_AREA)
+            frame = buffer
+        success, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, variant.quality])
+        if not success:
+            return None
+        jpeg = jpeg.tobytes()
+        self._encoded[variant] = (self._frame_seq, jpeg)
+        self._stats.record_encode(time.perf_counter() - t_start)
+        return jpeg
+
+    @property
+    def sensor_fps(self):
+        """Frame rate the sensor actually delivers, refreshed at most once per SENSOR_RATE_REFRESH_S"""
+        now = time.monotonic()
+        if self._sensor_fps_checked is None or now - self._sensor_fps_checked > self.SENSOR_RATE_REFRESH_S:
+            self._sensor_fps_checked = now
+            get_rate = getattr(self._camera, 'get_sensor_frame_rate', None)
+            self._sensor_fps = get_rate() if get_rate is not None else None
+        return self._sensor_fps
+
+    @property
+    def stream_fps(self):
+        """Requested frame rate, capped at the measured sensor rate"""
+        fps = self._camera.framerate
+        sensor_fps = self.sensor_fps
+        if sensor_fps:
+            fps = min(fps, sensor_fps) if fps else sensor_fps
+        return fps
+
+    @property
+    def stats(self):
+        """Achieved fps, acquisition/encode/send times (ms) and pacing info for the dashboard"""
+        stats = self._stats.as_dict()
+        stats['target_fps'] = self._camera.framerate
+        stats['sensor_fps'] = self._sensor_fps
+        stats['late_frames'] = self._late_frames
+        stats['variants'] = len(self._encoded)
+        return stats
+
     def stream(self):
         """Start streaming"""
         print(f'STARTING CAMERA {self._camera.id} STREAM')
-        self._camera.streamOn = True
\ No newline at end of file
+        self._camera.streamOn = True
@@ -0,0 +1,81 @@
+from quart import websocket
+from server import webcam_server
+import asyncio
+import json
+import struct
+import time
+
+import numpy
+
+
+class ParticleAnalysisStreamer:
+    """
+    Publishes the time series of a ParticleAnalyzer over a websocket, in the same binary format as DAQDataStreamer:
+    timestamp (double) and number of series (int), then per series the name length (int), UTF-8 name, number of
+    values (int) and the values (doubles), all big-endian. The 'time' series holds the frame times in seconds
+    relative to the newest frame.
+
+    Clients connecting with ?format=json (the loading page) get the same series as a JSON message instead,
+    {"timestamp", "time": [...], field: [...], ...} with missing values as null, which a clientside callback can
+    parse synchronously.
+    """
+
+    def __init__(self, analyzer, path, update_rate=10, max_points=2000):
+        self._analyzer = analyzer
+        self._path = path
+        self._update_rate = update_rate
+        self._max_points = max_points
+        self._register_endpoint()
+        print(f"ParticleAnalysisStreamer initialized on path {self._path}, update rate {self._update_rate} Hz")
+
+    def _register_endpoint(self):
+        """Register the websocket route for the analysis time series"""
+
+        @webcam_server.websocket(self._path)
+        async def stream_handler():
+            as_json = websocket.args.get('format') == 'json'
+            print(f'PARTICLE ANALYSIS WEBSOCKET CONNECTED ({self._path}, {"json" if as_json else "binary"})')
+            last_count = None
+            try:
+                while True:
+                    count = self._analyzer.frame_count
+                    if count != last_count:
+                        last_count = count
+                        series = self._analyzer.get_series(self._max_points)
+                        await websocket.send(self.to_json(series) if as_json else self.pack(series))
+                    await asyncio.sleep(1.0 / self._update_rate)
+            except asyncio.CancelledError:
+                print(f'PARTICLE ANALYSIS WEBSOCKET DISCONNECTED ({self._path})')
+            except Exception as e:
+                print(f'ERROR IN PARTICLE ANALYSIS STREAM: {str(e)}')
+                import traceback
+                traceback.print_exc()
+            finally:
+                print(f'PARTICLE ANALYSIS STREAM HANDLER EXITED ({self._path})')
+
+    @staticmethod
+    def pack(series):
+        """Binary message of a {name: values} dictionary"""
+        times = series['time']
+        if len(times):
+            series = dict(series, time=times - times[-1])
+        parts = [struct.pack('!di', time.time(), len(series))]
+        for name, values in series.items():
+            name_bytes = name.encode('utf-8')
+            parts.append(struct.pack('!i', len(name_bytes)))
+            parts.append(name_bytes)
+            parts.append(struct.pack('!i', len(values)))
+            parts.append(numpy.asarray(values, dtype='>f8').tobytes())
+        return b''.join(parts)
+
+    @staticmethod
+    def to_json(series):
+        """JSON message of a {name: values} dictionary; NaN (frames without a particle) becomes null"""
+        times = series['time']
+        if len(times):
+            series = dict(series, time=times - times[-1])
+        message = {'timestamp': time.time()}
+        for name, values in series.items():
+            values = numpy.asarray(values, dtype=float)
+            message[name] = numpy.where(numpy.isnan(values), None, values).tolist()
+        return json.dumps(message)
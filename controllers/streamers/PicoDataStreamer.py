@@ -0,0 +1,122 @@
+from quart import websocket
+from server import webcam_server
+import asyncio
+import json
+import time
+
+import numpy
+
+
+class PicoDataStreamer:
+    """
+    Live preview of a PicoScope stream over a websocket.
+
+    Reads the newest `window` seconds from the PicoInterface live ring buffer while run_streaming is collecting
+    (file writing is unaffected), reduces them to at most `max_points` points per channel with min/max decimation
+    (so short spikes stay visible), converts ADC counts to volts and sends a JSON message:
+    {"timestamp", "sample_rate", "total_samples", "time": [s, relative to the newest sample],
+     "channels": {"A": [V, ...], ...},
+     "lockin": {name: {"channel", "reference_frequency", "time": [s], "amplitude": [V], "phase": [rad]}, ...}}.
+    The lock-in traces cover the newest `lockin_window` seconds of each demodulator in pico.stream_processors.
+    JSON is used instead of the DAQ binary format so the clientside callback can parse messages synchronously.
+    """
+
+    def __init__(self, pico, path, update_rate=10, window=0.01, max_points=2000, lockin_window=1.0):
+        self._pico = pico
+        self._path = path
+        self._update_rate = update_rate  # 10 Hz default
+        self._window = window  # 10 ms default
+        self._max_points = max_points
+        self._lockin_window = lockin_window  # 1 s default
+        self._register_endpoint()
+        print(f"PicoDataStreamer initialized on path {self._path}, update rate {self._update_rate} Hz, "
+              f"window {self._window} s")
+
+    def _register_endpoint(self):
+        """Register the websocket route for the PicoScope preview"""
+
+        @webcam_server.websocket(self._path)
+        async def stream_handler():
+            print(f'PICOSCOPE WEBSOCKET CONNECTED ({self._path})')
+            last_total = None
+            try:
+                while True:
+                    live_buffer = self._pico.live_buffer
+                    if live_buffer is not None and live_buffer.total_written != last_total:
+                        last_total = live_buffer.total_written
+                        message = self.get_preview()
+                        if message is not None:
+                            await websocket.send(json.dumps(message))
+                    await asyncio.sleep(1.0 / self._update_rate)
+            except asyncio.CancelledError:
+                print(f'PICOSCOPE WEBSOCKET DISCONNECTED ({self._path})')
+            except Exception as e:
+                print(f'ERROR IN PICOSCOPE STREAM: {str(e)}')
+                import traceback
+                traceback.print_exc()
+            finally:
+                print(f'PICOSCOPE STREAM HANDLER EXITED ({self._path})')
+
+    @staticmethod
+    def decimate(block, max_points):
+        """
+        Reduce a (channels, samples) block to at most max_points columns.
+        Returns (values, indices): min and max of each group of samples, interleaved, with the sample index of
+        each column. Blocks that already fit are returned unchanged.
+        """
+        num_samples = block.shape[1]
+        if num_samples <= max_points:
+            return block, numpy.arange(num_samples)
+        step = -(-2 * num_samples // max_points)  # samples per min/max pair
+        groups = num_samples // step
+        # drop the oldest samples that do not fill a group
+        grouped = block[:, num_samples - groups * step:].reshape(block.shape[0], groups, step)
+        values = numpy.empty((block.shape[0], 2 * groups), dtype=block.dtype)
+        numpy.min(grouped, axis=2, out=values[:, 0::2])
+        numpy.max(grouped, axis=2, out=values[:, 1::2])
+        starts = num_samples - groups * step + numpy.arange(groups) * step
+        indices = numpy.repeat(starts + step // 2, 2)
+        return values, indices
+
+    def get_preview(self):
+        """Preview message of the newest window, None if no samples were streamed yet"""
+        live_buffer = self._pico.live_buffer
+        sample_rate = self._pico.stream_sample_rate or self._pico.actual_sample_freq
+        if live_buffer is None or not sample_rate or len(live_buffer) == 0:
+            return None
+        block = live_buffer.latest(max(2, int(self._window * sample_rate)))
+        values, indices = self.decimate(block, self._max_points)
+        times = (indices - (block.shape[1] - 1)) / sample_rate
+        channels = {}
+        for row, channel in enumerate(self._pico.live_channels):
+            volts = self._pico.counts_to_volts(channel, values[row])
+            channels[channel] = numpy.round(volts, 6).tolist()
+        return {
+            'timestamp': time.time(),
+            'sample_rate': sample_rate,
+            'total_samples': live_buffer.total_written,
+            'streaming': self._pico.streaming,
+            'time': numpy.round(times, 9).tolist(),
+            'channels': channels,
+            'lockin': self.get_lockin_preview(),
+        }
+
+    def get_lockin_preview(self):
+        """Amplitude and phase of the newest lockin_window of every demodulator with output"""
+        lockin = {}
+        for processor in self._pico.stream_processors:
+            if not processor.output_rate:
+                continue
+            latest = processor.latest(max(2, int(self._lockin_window * processor.output_rate)))
+            if latest is None:
+                continue
+            times, amplitude, phase = latest
+            values, indices = self.decimate(numpy.vstack((amplitude, phase)), self._max_points)
+            lockin[processor.name] = {
+                'channel': processor.channel,
+                'reference_frequency': processor.reference_frequency,
+                'time': numpy.round(times[indices], 9).tolist(),
+                'amplitude': numpy.round(values[0], 6).tolist(),
+                'phase': numpy.round(values[1], 4).tolist(),
+            }
+        return lockin
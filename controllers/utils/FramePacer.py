@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import deque
+
+
+class FramePacer:
+    """
+    Paces a frame loop with monotonic deadlines.
+    Each frame is scheduled one interval after the previous deadline, so time spent acquiring, encoding and sending
+    is absorbed instead of added to the sleep. When the loop falls behind, the sleep is skipped and the schedule is
+    re-anchored to the current time, so a slow frame does not trigger a burst of catch-up frames.
+    """
+
+    def __init__(self, fps=10):
+        self.fps = fps
+        self.late_frames = 0  # Number of frames that missed their deadline
+        self._deadline = None
+
+    @property
+    def interval(self):
+        return 1.0 / self.fps if self.fps else 0.0
+
+    def reset(self):
+        """Restart the schedule, e.g. after the stream was paused"""
+        self._deadline = None
+        self.late_frames = 0
+
+    async def wait(self):
+        """Sleep until the next frame is due (yields to the event loop even when behind)"""
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        self._deadline += self.interval
+        remaining = self._deadline - now
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+            return
+        self.late_frames += 1
+        if -remaining > self.interval:
+            self._deadline = now
+        await asyncio.sleep(0)
+
+
+class StreamStats:
+    """
+    Rolling statistics of a frame stream: achieved frame rate over the last `window_s` seconds and exponentially
+    averaged acquisition, encode and send times (in ms). Frames are counted once when acquired, encode and send
+    times are recorded per encoded variant and per viewer.
+    """
+
+    def __init__(self, window_s=2.0, smoothing=0.1):
+        self.window_s = window_s
+        self.smoothing = smoothing
+        self._frame_times = deque()
+        self.acquire_ms = 0.0
+        self.encode_ms = 0.0
+        self.send_ms = 0.0
+        self.frame_count = 0
+
+    def record_frame(self, acquire_s):
+        """Count one newly acquired frame and its acquisition time (s)"""
+        now = time.monotonic()
+        self._frame_times.append(now)
+        self._trim(now)
+        self.acquire_ms = self._smooth(self.acquire_ms, acquire_s)
+        self.frame_count += 1
+
+    def record_encode(self, encode_s):
+        self.encode_ms = self._smooth(self.encode_ms, encode_s)
+
+    def record_send(self, send_s):
+        self.send_ms = self._smooth(self.send_ms, send_s)
+
+    def _smooth(self, average_ms, value_s):
+        # The first value initializes the average
+        a = self.smoothing if average_ms else 1.0
+        return average_ms + a * (value_s * 1e3 - average_ms)
+
+    def _trim(self, now):
+        while self._frame_times and now - self._frame_times[0] > self.window_s:
+            self._frame_times.popleft()
+
+    @property
+    def fps(self):
+        """Frames acquired per second over the rolling window"""
+        self._trim(time.monotonic())
+        if len(self._frame_times) < 2:
+            return 0.0
+        span = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def clear(self):
+        self._frame_times.clear()
+        self.acquire_ms = self.encode_ms = self.send_ms = 0.0
+        self.frame_count = 0
+
+    def as_dict(self):
+        return {'fps': self.fps,
+                'acquire_ms': self.acquire_ms,
+                'encode_ms': self.encode_ms,
+                'send_ms': self.send_ms,
+                'frame_count': self.frame_count}
@@ -0,0 +1,164 @@
+import threading
+import time
+import traceback
+import uuid
+
+
+class Job:
+    """
+    A long running task executed on its own thread.
+
+    The task function receives the job as its `job` keyword argument; it reports progress with job.update() and
+    should return early once job.cancelled is set.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+    def __init__(self, name, key=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.key = key  # Resource the job uses (e.g. a device name); one running job per key
+        self.status = Job.PENDING
+        self.progress = 0.0  # 0..1
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def is_finished(self):
+        return self.status in Job.FINISHED
+
+    def cancel(self):
+        """Request cancellation; the task stops at its next check"""
+        self._cancel_event.set()
+
+    def update(self, progress=None, message=None):
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def skip(self, message, status=CANCELLED):
+        """Finish a job that never ran, e.g. one superseded in a queue"""
+        self.status = status
+        self.message = message
+        self.finished = time.time()
+        self._done_event.set()
+
+    def wait(self, timeout=None):
+        """Block until the job finished; returns True if it did"""
+        return self._done_event.wait(timeout)
+
+    def as_dict(self):
+        """JSON-serializable status for the dashboard"""
+        end = self.finished or time.time()
+        return {
+            'id': self.id,
+            'name': self.name,
+            'key': self.key,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'elapsed': end - self.started if self.started else 0.0,
+        }
+
+    def _run(self, target, args, kwargs):
+        self.status = Job.RUNNING
+        self.started = time.time()
+        try:
+            self.result = target(*args, job=self, **kwargs)
+            self.status = Job.CANCELLED if self.cancelled else Job.DONE
+            if self.status == Job.DONE:
+                self.progress = 1.0
+        except Exception as e:
+            self.status = Job.FAILED
+            self.error = str(e)
+            print(f"Job {self.name} ({self.id}) failed: {e}")
+            traceback.print_exc()
+        finally:
+            self.finished = time.time()
+            self._done_event.set()
+            print(f"Job {self.name} ({self.id}) {self.status} after {self.finished - self.started:.1f} s")
+
+
+class JobManager:
+    """
+    Runs acquisitions and other long tasks as background jobs, so Dash callbacks return immediately instead of
+    holding one of the server's worker threads for the whole task. The UI polls jobs by id.
+
+    Jobs sharing a key (the device they drive) are never run concurrently; submitting a second one raises
+    RuntimeError while the first is running.
+    """
+
+    def __init__(self, keep_finished=50):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._keep_finished = keep_finished
+
+    def submit(self, name, target, *args, key=None, **kwargs):
+        """Start target(*args, job=job, **kwargs) on a new thread and return the Job"""
+        with self._lock:
+            running = self._running_for(key)
+            if running is not None:
+                raise RuntimeError(f"{key} is busy with job {running.name} ({running.id})")
+            job = Job(name, key=key)
+            self._jobs[job.id] = job
+            self._prune()
+        job._thread = threading.Thread(target=job._run, args=(target, args, kwargs), name=f'Job-{name}-{job.id}',
+                                       daemon=True)
+        job._thread.start()
+        print(f"Job {name} ({job.id}) started")
+        return job
+
+    def _running_for(self, key):
+        if key is None:
+            return None
+        for job in self._jobs.values():
+            if job.key == key and not job.is_finished:
+                return job
+        return None
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond keep_finished"""
+        finished = [job for job in self._jobs.values() if job.is_finished]
+        for job in sorted(finished, key=lambda j: j.created)[:max(0, len(finished) - self._keep_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.as_dict() if job is not None else None
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def jobs(self, key=None):
+        """All known jobs (optionally for one key), newest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if key is None or job.key == key]
+        return sorted(jobs, key=lambda j: j.created, reverse=True)
+
+
+# Shared by the dashboard components
+job_manager = JobManager()
@@ -0,0 +1,59 @@
+import threading
+
+import numpy as np
+
+
+class SampleRingBuffer:
+    """
+    Preallocated multi-channel ring buffer for raw samples, shape (channels, capacity).
+
+    Blocks of shape (channels, n) are copied in with at most two slice assignments (no per-sample Python work), so
+    it can be filled from a driver callback. Readers get chronologically ordered copies of the newest samples.
+    """
+
+    def __init__(self, num_channels, capacity, dtype=np.int16):
+        self.num_channels = num_channels
+        self.capacity = int(capacity)
+        self._data = np.zeros((num_channels, self.capacity), dtype=dtype)
+        self._lock = threading.Lock()
+        self._write_index = 0
+        self.total_written = 0  # Samples per channel written since the last clear
+
+    def write(self, block):
+        """Append a (channels, n) block"""
+        n = block.shape[-1]
+        if n == 0:
+            return
+        with self._lock:
+            if n >= self.capacity:
+                # only the newest samples fit
+                self._data[:] = block[:, n - self.capacity:]
+                self._write_index = 0
+            else:
+                end = self._write_index + n
+                if end <= self.capacity:
+                    self._data[:, self._write_index:end] = block
+                else:
+                    first = self.capacity - self._write_index
+                    self._data[:, self._write_index:] = block[:, :first]
+                    self._data[:, :n - first] = block[:, first:]
+                self._write_index = end % self.capacity
+            self.total_written += n
+
+    def latest(self, n=None):
+        """Copy of the newest n samples per channel (all available if None), oldest first"""
+        with self._lock:
+            available = min(self.total_written, self.capacity)
+            n = available if n is None else min(n, available)
+            start = self._write_index - n
+            if start >= 0:
+                return self._data[:, start:self._write_index].copy()
+            return np.concatenate((self._data[:, start:], self._data[:, :self._write_index]), axis=1)
+
+    def clear(self):
+        with self._lock:
+            self._write_index = 0
+            self.total_written = 0
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
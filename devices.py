@@ -9,13 +9,22 @@ from thorlabs_tsi_sdk.tl_camera import TLCameraSDK
 
 from controllers.cameras.ThorCam import ThorCam
 from controllers.cameras.Xenics import Xenics
+from controllers.cameras.FrameGrabber import FrameGrabber
+from controllers.analysis.ParticleAnalyzer import ParticleAnalyzer
+from controllers.analysis.FrameAccumulator import FrameAccumulator
 from controllers.streamer import WebcamStreamer
 from controllers.frequency_generators.Urukul import UrukulFrequencyGenerator
 from controllers.frequency_generators.Mirny import MirnyFrequencyGenerator
+from controllers.sinara.ArtiqWorkerClient import ArtiqWorkerClient
+from controllers.sinara.ArtiqRunner import ArtiqRunner
 from controllers.other.RelayBoard import RelayBoard
 from controllers.DAQ.NI_cDAQ9174 import cDAQ9174
 from controllers.streamers.DAQDataStreamer import DAQDataStreamer
+from controllers.streamers.ParticleAnalysisStreamer import ParticleAnalysisStreamer
+from controllers.streamers.PicoDataStreamer import PicoDataStreamer
 from controllers.picoscope.ps5000a_wrapper import PicoInterface
+from controllers.picoscope.PicoGroup import PicoGroup
+from config import config
 
 def save_as_bin(data, file_path):
     """
@@ -38,11 +47,43 @@ thorcam_2.initialize(10, 20, rotate_img=True)
 # xenics_cam.initialize(1, 0.01)
 # CAMERA STREAMERS (sockets)
 time.sleep(0.1)
-streamer1 = WebcamStreamer(thorcam_1, "/stream1")
-streamer2 = WebcamStreamer(thorcam_2, "/stream2")
-# streamer3 = WebcamStreamer(xenics_cam, "/stream3")
+# Capture threads: acquire frames at the sensor rate while a camera stream is on
+grabber1 = FrameGrabber(thorcam_1)
+grabber2 = FrameGrabber(thorcam_2)
+# Frame averaging / dark subtraction, selectable per camera in CameraInterfaceAIO
+accumulator1 = FrameAccumulator()
+accumulator2 = FrameAccumulator()
+grabber1.add_listener(accumulator1)
+grabber2.add_listener(accumulator2)
+grabber1.start()
+grabber2.start()
+streamer1 = WebcamStreamer(thorcam_1, "/stream1", grabber=grabber1, accumulator=accumulator1)
+streamer2 = WebcamStreamer(thorcam_2, "/stream2", grabber=grabber2, accumulator=accumulator2)
+# grabber3 = FrameGrabber(xenics_cam)
+# accumulator3 = FrameAccumulator()
+# grabber3.add_listener(accumulator3)
+# grabber3.start()
+# streamer3 = WebcamStreamer(xenics_cam, "/stream3", grabber=grabber3, accumulator=accumulator3)
+
+# PARTICLE ANALYSIS on the science chamber camera, runs on its capture thread
+particle_analyzer = ParticleAnalyzer(downsample=2)
+grabber2.add_listener(particle_analyzer)
+particle_streamer = ParticleAnalysisStreamer(particle_analyzer, "/particle_stream")
 
 # FREQUENCY GENERATORS
+# Sinara is driven in one of two ways, chosen by the "sinara" section of static/config.json:
+# - default ("use_worker": false): every update runs a parameterized template script with artiq_run; ArtiqRunner
+#   caches the compiled kernel of each argument set, so repeated settings skip the compilation.
+# - "use_worker": true: updates go to the persistent Sinara worker (sinara_worker.py), which holds the core device
+#   while it runs. It is only started from here with "start_worker": true, otherwise it has to be started by hand.
+#   Jobs wait for a starting worker and fail if it is not running, unless "script_fallback" is true.
+sinara_config = config.get('sinara', {})
+artiq_runner = ArtiqRunner()
+sinara_worker = ArtiqWorkerClient() if sinara_config.get('use_worker', False) else None
+if sinara_worker is not None and sinara_config.get('start_worker', False):
+    sinara_worker.start_worker(wait=0)
+sinara_script_fallback = sinara_config.get('script_fallback', False)
+
 urukul_loading_params = {0 : {'frequency': 110000.0e03, 'amplitude': 0.45, 'attenuation': 15.0, 'on': False},
                          1 : {'frequency': 110000.0e03, 'amplitude': 0.44, 'attenuation': 15.0, 'on': False},
                          2 : {'frequency': 300.0e03, 'amplitude': 0.5, 'attenuation': 15.0, 'on': False},
@@ -50,14 +91,18 @@ urukul_loading_params = {0 : {'frequency': 110000.0e03, 'amplitude': 0.45, 'atte
 urukul_loading_conn_params = {'ip_address': '10.34.16.100'}
 urukul_loading = UrukulFrequencyGenerator(device_id='0',
                                           channel_params=urukul_loading_params,
-                                          connection_params=urukul_loading_conn_params)
+                                          connection_params=urukul_loading_conn_params,
+                                          worker=sinara_worker, runner=artiq_runner,
+                                          script_fallback=sinara_script_fallback)
 
 # Only 1 channel for now
 mirny_channel_params = {0: {'frequency': 400.0e06, 'attenuation': 27, 'on': False}
                         }
 mirny_cavity_drive = MirnyFrequencyGenerator(device_id='0',
                                              channel_params=mirny_channel_params,
-                                             connection_params=urukul_loading_conn_params)
+                                             connection_params=urukul_loading_conn_params,
+                                             worker=sinara_worker, runner=artiq_runner,
+                                             script_fallback=sinara_script_fallback)
 
 # RELAY BOARD CONTROLLING AUTOMATIC VALVES
 valve_ports = {"Pump": 1,
@@ -81,4 +126,12 @@ daq_streamer = DAQDataStreamer(
 )
 
 # Picoscope
-pico = PicoInterface(name='picoscope_1')
\ No newline at end of file
+# "pico_group": {"serials": [...]} in static/config.json lists the units that acquire together on a shared EXT
+# trigger; pico is the first of them and the others are picoscope_2, ... Without serials pico opens the first unit
+# found and the group has only that unit.
+pico_serials = config.get('pico_group', {}).get('serials', [])
+pico = PicoInterface(name='picoscope_1', serial=pico_serials[0] if pico_serials else None)
+pico_group = PicoGroup([pico] + [PicoInterface(name=f'picoscope_{i + 2}', serial=serial)
+                                 for i, serial in enumerate(pico_serials[1:])], name='pico_group')
+# Live preview of the newest 10 ms of a PicoScope stream
+pico_streamer = PicoDataStreamer(pico, "/pico_stream", update_rate=10, window=0.01)
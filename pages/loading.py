@@ -1,5 +1,5 @@
 import dash
-from dash import callback, Input, Output, State, MATCH, ALL, callback_context, html
+from dash import callback, clientside_callback, Input, Output, State, MATCH, ALL, callback_context, html, dcc
 
 import dash_mantine_components as dmc
 
@@ -9,16 +9,23 @@ from components.RelayBoardAIO import RelayBoardAIO
 from dash_extensions import WebSocket
 
 from devices import *
-from controllers.sinara.modify_experiment import update_script_values_by_lines
-from controllers.sinara.run_artiq_script import run_artiq_in_clang64_visible
-
-exp_path = r'C:\Users\CavLev\Documents\Qavity\controllers\sinara\move_particle.py'
+from config import config
 
 dash.register_page(__name__)
 
 def layout():
     img1 = "./static/img/thorcam_1.jpeg"
     img2 = "./static/img/thorcam_2.jpeg"
+    # Camera transport: 'websocket' (frames through ws1/ws2 and the clientside callbacks) or 'mjpeg' (the <img>
+    # reads the streamer's multipart HTTP stream itself)
+    mjpeg = config.get('camera_stream', {}).get('transport', 'websocket') == 'mjpeg'
+    stream_url1 = streamer1.mjpeg_url(width=480, quality=80) if mjpeg else None
+    stream_url2 = streamer2.mjpeg_url(width=480, quality=80) if mjpeg else None
+    websockets = [] if mjpeg else [
+        WebSocket(url=f"ws://127.0.0.1:5000/stream1?width=480&quality=80", id="ws1"),
+        WebSocket(url=f"ws://127.0.0.1:5000/stream2?width=480&quality=80", id="ws2"),
+        # WebSocket(url=f"ws://127.0.0.1:5000/stream3?width=480&quality=80", id="ws3"),
+    ]
 
 
     loading_card = dmc.Card([], withBorder=True, padding='xs', style={'margin': '10px'})
@@ -66,25 +73,69 @@ def layout():
     relay_control_card = RelayBoardAIO(aio_id="relay_controller_interface",
                                        device=valve_control_board)
 
+    # Particle position from the analyzer on the science chamber camera (webcam_2)
+    particle_card = dmc.Card([
+        dmc.CardSection([dmc.Text('Particle position', size='xl')], withBorder=True, py="xs", inheritPadding=True),
+        dcc.Graph(id='particle-graph', config={'displayModeBar': False}, style={'width': '400px'}),
+        WebSocket(url="ws://127.0.0.1:5000/particle_stream?format=json", id="ws-particle"),
+    ], withBorder=True, padding='xs', style={'margin': '10px'})
+
     return dmc.MantineProvider(
         [dmc.Flex(
             [
-                CameraInterfaceAIO(aio_id='webcam_1', camera=thorcam_1, streamer=streamer1, name='Loading chamber'),
+                CameraInterfaceAIO(aio_id='webcam_1', camera=thorcam_1, streamer=streamer1, name='Loading chamber',
+                                   accumulator=accumulator1, stream_url=stream_url1),
                 CameraInterfaceAIO(aio_id='webcam_2', camera=thorcam_2, streamer=streamer2,
-                                   name='Science chamber outside'),
+                                   name='Science chamber outside', accumulator=accumulator2, stream_url=stream_url2),
                 # CameraInterfaceAIO(aio_id='webcam_3', camera=xenics_cam, streamer=streamer3,
-                #                    name='Science chamber inside'),
-                WebSocket(url=f"ws://127.0.0.1:5000/stream1", id="ws1"),
-                WebSocket(url=f"ws://127.0.0.1:5000/stream2", id="ws2"),
-                # WebSocket(url=f"ws://127.0.0.1:5000/stream3", id="ws3"),
+                #                    name='Science chamber inside', accumulator=accumulator3),
+            ] + websockets + [
                 # CameraInterfaceAIO(aio_id='webcam_1', placeholder=img1),
                 # CameraInterfaceAIO(aio_id='webcam_2', placeholder=img2),
                 loading_card,
-                relay_control_card
+                relay_control_card,
+                particle_card
             ]),
         ])
 
 #%% CALLBACKS DEFINITION
+# Particle analysis time series (JSON messages of ParticleAnalysisStreamer), plotted in the browser
+clientside_callback(
+    """
+    function(message) {
+        if (!message || typeof message.data !== 'string') {
+            return dash_clientside.no_update;
+        }
+        const series = JSON.parse(message.data);
+        const traces = [
+            {x: series.time, y: series.centroid_x, name: 'x', mode: 'lines', type: 'scattergl',
+             line: {color: '#339af0', width: 1}, hoverinfo: 'none'},
+            {x: series.time, y: series.centroid_y, name: 'y', mode: 'lines', type: 'scattergl',
+             line: {color: '#ff6b6b', width: 1}, hoverinfo: 'none'},
+            {x: series.time, y: series.sum, name: 'Sum', mode: 'lines', type: 'scattergl', yaxis: 'y2',
+             line: {color: '#20c997', width: 1}, hoverinfo: 'none'}
+        ];
+        return {
+            data: traces,
+            layout: {
+                height: 250,
+                margin: {l: 50, r: 50, t: 10, b: 40},
+                plot_bgcolor: '#25262b',
+                paper_bgcolor: '#25262b',
+                font: {color: '#c1c2c5'},
+                xaxis: {title: 'Time (s)', gridcolor: '#373A40'},
+                yaxis: {title: 'Centroid (px)', gridcolor: '#373A40'},
+                yaxis2: {title: 'Sum', overlaying: 'y', side: 'right', showgrid: false},
+                legend: {orientation: 'h', y: 1.1}
+            }
+        };
+    }
+    """,
+    Output('particle-graph', 'figure'),
+    Input('ws-particle', 'message'),
+    prevent_initial_call=True
+)
+
 @callback(
     Input("sync-all-button", "n_clicks"),
     running=[(Output("sync-all-button", "loading"), True, False)],
@@ -92,12 +143,10 @@ def layout():
 )
 def update_and_run_script(n_clicks):
     print('RUNNING SCRIPT CALLBACK')
-    script_path_gen = 'C:/Users/CavLev/Documents/Qavity/controllers/sinara/urukul_as_freq_gen.py'
-    starting_line = 17
     # if n_clicks is None:
     #     return dash.no_update
-    urukul_loading.update_freq_gen_script(script_path_gen, starting_line)
-    run_artiq_in_clang64_visible(script_path_gen)
+    # Goes through the Sinara worker if it is running, otherwise runs urukul_as_freq_gen.py with the channel arguments
+    urukul_loading.run_freq_gen_script()
     # This callback must return a list with one value for each matching output
     # Set all Update chips to True to indicate they have been updated
     # return 'Script ran successfully'
@@ -129,12 +178,7 @@ def update_all_generators(n_clicks):
     prevent_initial_call=True
 )
 def move_particles(btn_clicked, detuning, time):
-    # global exp_path
     print('BUTTON CLICKED')
-    # update_dict = {
-    #     15: detuning,
-    #     16: time
-    # }
-    # update_script_values_by_lines(exp_path, update_dict)
-    urukul_loading.move_particles(detuning, time)
-    return ['Running...']
+    # Queued on the Sinara command queue, the callback does not wait for it
+    job = urukul_loading.move_particles(detuning, time)
+    return [f'Moving particles (job {job.id})']
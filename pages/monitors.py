@@ -5,7 +5,7 @@ import plotly.graph_objs as go
 from dash_extensions import WebSocket
 import json
 
-from devices import daq_streamer, daq_card, pico, mirny_cavity_drive
+from devices import daq_streamer, daq_card, pico, pico_group, mirny_cavity_drive
 from components.PicoscopeInterfaceAIO import PicoscopeInterfaceAIO
 from components.CavityDriveAIO import CavityDriveAIO
 from config import config  # Import the config
@@ -193,7 +193,8 @@ def layout():
         dmc.Flex([graphs[0], graphs[2]], gap="xs", style={"width": "100%"}, mt='sm', direction='column'),
         dmc.Flex([graphs[1], graphs[3]], gap="xs", style={"width": "100%"}, mt='sm', direction='column'),
     ], direction='row')
-    pico_interface = PicoscopeInterfaceAIO(aio_id='picoscope_1', name='picoscope_1', device=pico)
+    pico_interface = PicoscopeInterfaceAIO(aio_id='picoscope_1', name='picoscope_1', device=pico,
+                                          stream_url="ws://127.0.0.1:5000/pico_stream", group=pico_group)
     cavity_drive_interface = dmc.Flex([
         CavityDriveAIO(aio_id='cavity_drive', name='Fiber EOM cavity drive', device=mirny_cavity_drive, ch=0)
         ])
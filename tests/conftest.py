@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules are imported from the repository root, as app.py does
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'thorlabs_tsi_sdk-0.0.8'))  # SDK package shipped with the repository
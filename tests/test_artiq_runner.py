@@ -0,0 +1,55 @@
+import pytest
+
+import controllers.sinara.ArtiqRunner as artiq_runner
+from controllers.sinara.ArtiqRunner import ArtiqRunner
+from controllers.sinara.SinaraCommandQueue import SinaraCommandQueue
+from controllers.utils.JobManager import Job
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / 'experiment.py'
+    path.write_text('# experiment\n')
+    return str(path)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Replaces artiq_compile / artiq_run; set calls['run_result'] = None to make artiq_run fail"""
+    calls = {'compile': [], 'run': [], 'run_result': 'ok'}
+
+    def compile_kernel(script_path, output_path, arguments=None):
+        calls['compile'].append((script_path, arguments))
+        with open(output_path, 'w') as f:
+            f.write('kernel')
+        return True
+
+    def run(path, arguments=None):
+        calls['run'].append((path, arguments))
+        return calls['run_result']
+
+    monkeypatch.setattr(artiq_runner, 'compile_artiq_in_clang64', compile_kernel)
+    monkeypatch.setattr(artiq_runner, 'run_artiq_in_clang64_visible', run)
+    return calls
+
+
+def test_kernel_is_compiled_once_per_arguments(tmp_path, script, calls):
+    runner = ArtiqRunner(cache_dir=str(tmp_path / 'kernels'))
+    runner.run(script, frequency=1e6)
+    runner.run(script, frequency=1e6)
+    runner.run(script, frequency=2e6)
+    assert len(calls['compile']) == 2
+    assert (runner.hits, runner.misses) == (1, 2)
+    assert all(path.endswith('.elf') for path, _ in calls['run'])
+
+
+def test_failed_run_raises_and_fails_the_job(tmp_path, script, calls):
+    runner = ArtiqRunner(cache_dir=str(tmp_path / 'kernels'))
+    calls['run_result'] = None
+    with pytest.raises(RuntimeError):
+        runner.run(script, frequency=1e6)
+
+    queue = SinaraCommandQueue()
+    job = queue.submit('run', lambda job=None: runner.run(script, frequency=1e6))
+    assert job.wait(5)
+    assert job.status == Job.FAILED
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from controllers.picoscope.ChunkStore import ChunkStoreReader, ChunkStoreWriter, HEADER_SIZE
+
+
+def chunks(n, channels=2, samples=1000, seed=0):
+    return np.random.default_rng(seed).integers(-32768, 32767, size=(n, channels, samples), dtype=np.int16)
+
+
+class FailingFile:
+    """Data file that writes part of the next record and then fails, like a full disk"""
+
+    def __init__(self, file):
+        self._file = file
+        self.fail = False
+
+    def write(self, data):
+        if self.fail:
+            self._file.write(data[:len(data) // 3])
+            raise OSError("No space left on device")
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def test_round_trip(tmp_path):
+    base = str(tmp_path / 'set')
+    data = chunks(5)
+    writer = ChunkStoreWriter(base, ['A', 'B'], 1000, description={'Note': 'test'})
+    assert writer.append(data[0], trigger_time=1.5) == 0
+    assert writer.append_many(data[1:4], actual_samples=[[1000, 1000], [600, 700], [1000, 1000]],
+                              trigger_times=[2.0, 3.0, 4.0], overflow=[0, 2, 0]) == 1
+    writer.append(data[4], overflow=1)
+    writer.close()
+
+    reader = ChunkStoreReader(base)
+    assert reader.shape == (5, 2, 1000)
+    assert reader.header['description'] == {'Note': 'test'}
+    np.testing.assert_array_equal(reader[:], data)
+    np.testing.assert_array_equal(reader.trigger_times[:4], [1.5, 2.0, 3.0, 4.0])
+    assert np.isnan(reader.trigger_times[4])
+    np.testing.assert_array_equal(reader.overflow, [0, 0, 2, 0, 1])
+    np.testing.assert_array_equal(reader.chunk(2), data[2, :, :600])
+    np.testing.assert_array_equal(reader.chunk(2, 'B'), data[2, 1, :600])
+    reader.close()
+
+
+def test_failed_write_is_truncated_and_later_chunks_stay_aligned(tmp_path):
+    base = str(tmp_path / 'set')
+    data = chunks(3)
+    writer = ChunkStoreWriter(base, ['A', 'B'], 1000)
+    writer.append(data[0])
+    writer._data_file = FailingFile(writer._data_file)
+    writer._data_file.fail = True
+    with pytest.raises(OSError):
+        writer.append(data[1])
+    writer._data_file.fail = False
+    assert writer.append(data[2]) == 1
+    writer.close()
+
+    reader = ChunkStoreReader(base)
+    assert len(reader) == 2
+    np.testing.assert_array_equal(reader[0], data[0])
+    np.testing.assert_array_equal(reader[1], data[2])
+
+
+def test_reader_ignores_incomplete_chunks(tmp_path):
+    base = str(tmp_path / 'set')
+    data = chunks(3)
+    writer = ChunkStoreWriter(base, ['A', 'B'], 1000)
+    writer.append_many(data)
+    writer.close()
+    # a record cut short (interrupted measurement) has no complete data on disk
+    with open(writer.data_path, 'r+b') as f:
+        f.truncate(HEADER_SIZE + 2 * writer.record_bytes + 10)
+    reader = ChunkStoreReader(base)
+    assert len(reader) == 2
+    np.testing.assert_array_equal(reader[:], data[:2])
+
+
+def test_empty_store(tmp_path):
+    base = str(tmp_path / 'set')
+    ChunkStoreWriter(base, ['A'], 100).close()
+    reader = ChunkStoreReader(base)
+    assert reader.shape == (0, 1, 100)
+
+
+def test_rejects_mismatched_chunk(tmp_path):
+    writer = ChunkStoreWriter(str(tmp_path / 'set'), ['A', 'B'], 1000)
+    with pytest.raises(ValueError):
+        writer.append(np.zeros((2, 999), dtype=np.int16))
+    with pytest.raises(ValueError):
+        writer.append(np.zeros((2, 1000), dtype=np.float32))
+    writer.close()
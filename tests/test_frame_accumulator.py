@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from controllers.analysis.FrameAccumulator import FrameAccumulator
+
+
+def frames(n, shape=(4, 6), seed=0):
+    return np.random.default_rng(seed).integers(0, 4096, size=(n,) + shape, dtype=np.uint16)
+
+
+def accumulate(mode, stack, frames_setting=10):
+    accumulator = FrameAccumulator(mode, frames_setting)
+    for frame in stack:
+        accumulator(frame)
+    return accumulator
+
+
+def test_mean():
+    stack = frames(25)
+    accumulator = accumulate('mean', stack)
+    assert accumulator.count == 25
+    np.testing.assert_allclose(accumulator.get_image(), stack.mean(axis=0), rtol=1e-5)
+
+
+def test_ema():
+    stack = frames(25)
+    accumulator = accumulate('ema', stack, 4)
+    alpha = 2 / (4 + 1)
+    expected = stack[0].astype(np.float64)
+    for frame in stack[1:]:
+        expected += alpha * (frame - expected)
+    np.testing.assert_allclose(accumulator.get_image(), expected, rtol=1e-4)
+
+
+@pytest.mark.parametrize('n', [3, 7, 23])
+def test_boxcar_averages_last_frames(n):
+    stack = frames(n)
+    accumulator = accumulate('boxcar', stack, 7)
+    assert accumulator.count == min(n, 7)
+    np.testing.assert_allclose(accumulator.get_image(), stack[-7:].mean(axis=0), rtol=1e-5)
+
+
+def test_dark_subtraction():
+    dark = frames(5, seed=1)
+    light = frames(10, seed=2)
+    accumulator = FrameAccumulator('mean')
+    accumulator.capture_dark(5)
+    for frame in dark:
+        accumulator.add(frame)
+    assert accumulator.has_dark
+    assert accumulator.get_image() is None  # dark frames are not averaged
+    for frame in light:
+        accumulator.add(frame)
+    np.testing.assert_allclose(accumulator.get_image(), light.mean(axis=0) - dark.mean(axis=0), rtol=1e-4, atol=1e-2)
+    accumulator.clear_dark()
+    assert not accumulator.has_dark
+
+
+def test_configure_restarts_and_reallocates_on_new_shape():
+    accumulator = accumulate('mean', frames(5))
+    accumulator.configure(mode='boxcar', frames=3)
+    assert accumulator.count == 0
+    stack = frames(4, shape=(8, 2))
+    for frame in stack:
+        accumulator.add(frame)
+    np.testing.assert_allclose(accumulator.get_image(), stack[-3:].mean(axis=0), rtol=1e-5)
+    with pytest.raises(ValueError):
+        accumulator.configure(mode='median')
+
+
+def test_display_frame_is_normalized():
+    accumulator = accumulate('mean', frames(3))
+    display = accumulator.get_display_frame()
+    assert display.dtype == np.uint8
+    assert display.min() == 0 and display.max() == 255
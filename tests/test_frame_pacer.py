@@ -0,0 +1,91 @@
+import asyncio
+import types
+
+import pytest
+
+from controllers.utils import FramePacer as frame_pacer
+from controllers.utils.FramePacer import FramePacer, StreamStats
+
+
+class FakeClock:
+    """Monotonic clock that advances only when slept on or when work is simulated"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(frame_pacer, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(frame_pacer, 'asyncio', types.SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+
+def run_frames(pacer, clock, work):
+    """Run one frame per work duration (s); returns the times the frames started"""
+    async def loop():
+        starts = []
+        for duration in work:
+            starts.append(clock.now)
+            clock.now += duration
+            await pacer.wait()
+        return starts
+    return asyncio.run(loop())
+
+
+def test_work_time_is_absorbed(clock):
+    pacer = FramePacer(fps=10)
+    starts = run_frames(pacer, clock, [0.03, 0.07, 0.01, 0.05, 0.02])
+    # the schedule is anchored at the end of the first frame
+    assert [round(b - a, 9) for a, b in zip(starts[1:], starts[2:])] == [0.1, 0.1, 0.1]
+    assert pacer.late_frames == 0
+
+
+def test_late_frame_re_anchors_without_burst(clock):
+    pacer = FramePacer(fps=10)
+    run_frames(pacer, clock, [0.01, 0.35, 0.01, 0.01])
+    assert pacer.late_frames == 1
+    # after the slow frame, the next frames are a full interval apart instead of catching up
+    assert clock.sleeps[1] == 0
+    assert clock.sleeps[2:] == [pytest.approx(0.09), pytest.approx(0.09)]
+
+
+def test_slightly_late_frame_keeps_schedule(clock):
+    pacer = FramePacer(fps=10)
+    run_frames(pacer, clock, [0.01, 0.15, 0.01])
+    assert pacer.late_frames == 1
+    # less than one interval behind: the next deadline stays on the original grid
+    assert clock.sleeps[-1] == pytest.approx(0.04)
+
+
+def test_reset(clock):
+    pacer = FramePacer(fps=10)
+    run_frames(pacer, clock, [0.5])
+    pacer.reset()
+    assert pacer.late_frames == 0
+    run_frames(pacer, clock, [0.0])
+    assert clock.sleeps[-1] == pytest.approx(0.1)
+
+
+def test_stream_stats(clock):
+    stats = StreamStats(window_s=1.0, smoothing=0.5)
+    for _ in range(5):
+        stats.record_frame(0.02)
+        clock.now += 0.1
+    stats.record_encode(0.004)
+    stats.record_encode(0.002)
+    assert stats.frame_count == 5
+    assert stats.acquire_ms == pytest.approx(20)
+    assert stats.encode_ms == pytest.approx(3)
+    assert stats.fps == pytest.approx(10)
+    clock.now += 5
+    assert stats.fps == 0.0
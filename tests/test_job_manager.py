@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from controllers.utils.JobManager import Job, JobManager
+
+
+def test_job_runs_and_reports_progress():
+    manager = JobManager()
+
+    def task(x, job, scale=1):
+        job.update(0.5, 'half way')
+        return x * scale
+
+    job = manager.submit('task', task, 21, scale=2)
+    assert job.wait(5)
+    assert job.status == Job.DONE
+    assert job.result == 42
+    assert job.progress == 1.0
+    assert manager.status(job.id)['message'] == 'half way'
+
+
+def test_failed_job_keeps_error():
+    def task(job):
+        raise ValueError("no device")
+
+    job = JobManager().submit('task', task)
+    assert job.wait(5)
+    assert job.status == Job.FAILED
+    assert job.error == "no device"
+
+
+def test_one_running_job_per_key_and_cancel():
+    manager = JobManager()
+    started = threading.Event()
+
+    def task(job):
+        started.set()
+        while not job.cancelled:
+            job._cancel_event.wait(0.01)
+
+    job = manager.submit('acquire', task, key='picoscope')
+    started.wait(5)
+    with pytest.raises(RuntimeError):
+        manager.submit('acquire again', task, key='picoscope')
+    other = manager.submit('other device', lambda job: None, key='camera')
+    assert other.wait(5)
+    manager.cancel(job.id)
+    assert job.wait(5)
+    assert job.status == Job.CANCELLED
+    # the key is free again once the job finished
+    assert manager.submit('next', lambda job: None, key='picoscope').wait(5)
+    assert [j.name for j in manager.jobs('picoscope')] == ['next', 'acquire']
+
+
+def test_prunes_oldest_finished_jobs():
+    manager = JobManager(keep_finished=2)
+    jobs = []
+    for i in range(5):
+        jobs.append(manager.submit(f'job {i}', lambda job: None))
+        jobs[-1].wait(5)
+    manager.submit('last', lambda job: None).wait(5)
+    assert manager.get(jobs[0].id) is None
+    assert manager.get(jobs[-1].id) is not None
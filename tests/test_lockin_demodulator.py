@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from controllers.picoscope.LockInDemodulator import LockInDemodulator, FIRDecimator
+
+
+SAMPLE_RATE = 1e6
+REFERENCE = 10e3
+
+
+def signal(n, amplitude=0.3, phase=0.7, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / SAMPLE_RATE
+    return (amplitude * np.cos(2 * np.pi * REFERENCE * t + phase) + 0.01 * rng.standard_normal(n)).astype(np.float32)
+
+
+def demodulate(blocks):
+    lockin = LockInDemodulator('lockin', 'A', REFERENCE)
+    lockin.configure(SAMPLE_RATE)
+    outputs = [lockin.process(block) for block in blocks]
+    return np.concatenate(outputs), lockin
+
+
+def split(x, sizes):
+    edges = np.cumsum(sizes)
+    return np.split(x, edges[edges < len(x)])
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_random_block_sizes_match_single_block(seed):
+    x = signal(200_000)
+    reference, _ = demodulate([x])
+    sizes = np.random.default_rng(seed).integers(1, 5000, size=len(x))
+    result, lockin = demodulate(split(x, sizes))
+    assert lockin.error is None
+    assert result.shape == reference.shape
+    np.testing.assert_allclose(result, reference, rtol=0, atol=1e-5)
+
+
+def test_tiny_blocks_match_single_block():
+    x = signal(50_000)
+    reference, _ = demodulate([x])
+    # blocks shorter than the CIC ratio give no CIC output for most calls
+    result, _ = demodulate(split(x, [50, 10] + [1, 7, 99, 3] * len(x)))
+    np.testing.assert_allclose(result, reference, rtol=0, atol=1e-5)
+
+
+def test_recovers_amplitude_and_phase():
+    result, _ = demodulate([signal(500_000)])
+    settled = result[len(result) // 2:]
+    assert np.abs(settled).mean() == pytest.approx(0.3, rel=1e-2)
+    assert np.angle(settled).mean() == pytest.approx(0.7, abs=1e-2)
+
+
+def test_fir_empty_block_keeps_state():
+    fir = FIRDecimator(10)
+    x = (np.arange(1000) % 17).astype(np.complex64)
+    reference = fir.process(x)
+    fir.reset()
+    parts = [fir.process(x[:500]), fir.process(x[:0]), fir.process(x[500:])]
+    assert parts[1].shape == (0,)
+    np.testing.assert_allclose(np.concatenate(parts), reference, rtol=0, atol=1e-5)
+
+
+def test_worker_survives_failed_block_and_close_returns():
+    lockin = LockInDemodulator('lockin', 'A', REFERENCE)
+    lockin.start(SAMPLE_RATE, 1.0, 0.0, 0)
+    lockin.put(np.array([['not a number']]))
+    for block in split(signal(20_000), [1000] * 20):
+        lockin.put(block[np.newaxis])
+    lockin.close()
+    assert lockin.error is not None
+    assert lockin.input_samples == 20_000
@@ -0,0 +1,73 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from controllers.analysis.PicoBatchProcessor import PicoBatchProcessor, load_table
+from controllers.picoscope.ChunkStore import ChunkStoreWriter
+
+
+SAMPLE_RATE = 1e6
+MAX_ADC = 32767
+
+
+def measurement_set(directory, num_chunks=6, num_samples=8192):
+    """ChunkStore set of a sine on A and a constant level on B per chunk; returns (metadata path, volts)"""
+    t = np.arange(num_samples) / SAMPLE_RATE
+    volts = np.empty((num_chunks, 2, num_samples))
+    for i in range(num_chunks):
+        volts[i, 0] = 0.5 * np.sin(2 * np.pi * 62.5e3 * t)
+        volts[i, 1] = 0.1 * i
+    raw = np.round(volts * MAX_ADC).astype(np.int16)
+    store = ChunkStoreWriter(os.path.join(directory, 'set'), ['A', 'B'], num_samples)
+    store.append_many(raw, trigger_times=np.arange(num_chunks) * 0.5)
+    store.close()
+    metadata = {
+        'ActualSamplingFrequency, Hz': SAMPLE_RATE,
+        'MaxADC': MAX_ADC,
+        'EnabledChannels': ['A', 'B'],
+        'MeasurementSetName': 'set',
+        'StorageFormat': 'ChunkStore',
+        'DataFile': os.path.basename(store.data_path),
+        'A': {'Range, V': 1.0},
+        'B': {'Range, V': 1.0},
+    }
+    path = os.path.join(directory, 'set_metadata.json')
+    with open(path, 'w') as f:
+        json.dump(metadata, f)
+    return path, raw / MAX_ADC
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_statistics_table(tmp_path, workers):
+    path, volts = measurement_set(str(tmp_path))
+    table = PicoBatchProcessor(path, 'statistics', workers=workers, chunks_per_task=2).run()
+    np.testing.assert_array_equal(table['chunk'], np.arange(6))
+    np.testing.assert_array_equal(table['trigger_time'], np.arange(6) * 0.5)
+    np.testing.assert_allclose(table['B_mean'], volts[:, 1].mean(axis=1), atol=1e-6)
+    np.testing.assert_allclose(table['A_rms'], np.sqrt(np.mean(volts[:, 0] ** 2, axis=1)), rtol=1e-5)
+    np.testing.assert_allclose(table['A_max'], volts[:, 0].max(axis=1), rtol=1e-6)
+
+
+def test_chunk_subset_and_csv(tmp_path):
+    path, _ = measurement_set(str(tmp_path))
+    output = str(tmp_path / 'table.csv')
+    table = PicoBatchProcessor(str(tmp_path), 'statistics', workers=1).run(output, chunks=[4, 1])
+    np.testing.assert_array_equal(table['chunk'], [4, 1])
+    saved = load_table(output)
+    np.testing.assert_allclose(saved['B_mean'], table['B_mean'])
+
+
+def test_psd_peak_and_power(tmp_path):
+    path, _ = measurement_set(str(tmp_path), num_chunks=2)
+    output = str(tmp_path / 'psd.npz')
+    table = PicoBatchProcessor(path, 'psd', workers=1).run(output)
+    frequency = table['frequency'][0]
+    psd = table['A_psd'][0]
+    assert frequency[np.argmax(psd)] == pytest.approx(62.5e3)
+    # integrated power is the signal's mean square (0.5^2 / 2)
+    assert np.sum(psd) * (frequency[1] - frequency[0]) == pytest.approx(0.125, rel=0.02)
+    with pytest.raises(ValueError):
+        PicoBatchProcessor(path, 'psd', workers=1).run(str(tmp_path / 'psd.csv'))
+    assert load_table(output)['A_psd'].shape == table['A_psd'].shape
@@ -0,0 +1,107 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from controllers.analysis.PicoDataSet import PicoDataSet, load_dataset
+from controllers.picoscope.ChunkStore import ChunkStoreWriter
+
+
+RANGES = {'A': 2.0, 'B': 0.5}
+OFFSETS = {'A': 0.0, 'B': 0.1}
+SAMPLE_RATE = 1e6
+
+
+def counts(shape, seed=0):
+    return np.random.default_rng(seed).integers(-32767, 32767, size=shape, dtype=np.int16)
+
+
+def metadata(**fields):
+    md = {'ActualSamplingFrequency, Hz': SAMPLE_RATE, 'EnabledChannels': ['A', 'B'], 'MaxADC': 32767}
+    for channel in RANGES:
+        md[channel] = {'Range, V': RANGES[channel], 'Offset, V': OFFSETS[channel]}
+    md.update(fields)
+    return md
+
+
+def write_json(path, md):
+    with open(path, 'w') as f:
+        json.dump(md, f)
+    return str(path)
+
+
+def expected_volts(raw):
+    scales = np.array([RANGES['A'], RANGES['B']])[:, None] / 32767
+    offsets = np.array([OFFSETS['A'], OFFSETS['B']])[:, None]
+    return raw * scales - offsets
+
+
+@pytest.mark.parametrize('storage', [None, 'Raw_Int16_Interleaved', 'Raw_Int16_Channels_First'])
+def test_stream_memmap(tmp_path, storage):
+    raw = counts((2, 10_000))
+    on_disk = raw if storage == 'Raw_Int16_Channels_First' else raw.T
+    np.ascontiguousarray(on_disk).tofile(tmp_path / '20240101_120000_run.bin')
+    write_json(tmp_path / '20240101_120000_run_header.json', metadata(StorageFormat=storage))
+
+    dataset = load_dataset(str(tmp_path / '20240101_120000_run.bin'))
+    assert dataset.kind == 'stream'
+    assert isinstance(dataset.raw, np.memmap)
+    assert dataset.num_samples == 10_000
+    np.testing.assert_array_equal(dataset.raw, raw)
+    np.testing.assert_allclose(dataset.volts(), expected_volts(raw), rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(dataset.volts('B', 100, 200), expected_volts(raw)[1, 100:200], rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(dataset.time(0, 3), [0, 1e-6, 2e-6])
+    dataset.close()
+
+
+def test_iter_blocks_covers_stream(tmp_path):
+    raw = counts((2, 10_001))
+    np.ascontiguousarray(raw.T).tofile(tmp_path / 'run.bin')
+    dataset = PicoDataSet(write_json(tmp_path / 'run_header.json', metadata()))
+    blocks = [(start, block.copy()) for start, block in dataset.iter_blocks(block_samples=3000, channels=['B'])]
+    assert [start for start, _ in blocks] == [0, 3000, 6000, 9000]
+    np.testing.assert_allclose(np.concatenate([block for _, block in blocks], axis=1), expected_volts(raw)[1:],
+                               rtol=1e-6, atol=1e-6)
+    raw_blocks = [block for _, block in dataset.iter_blocks(block_samples=3000, volts=False)]
+    np.testing.assert_array_equal(np.concatenate(raw_blocks, axis=1), raw)
+
+
+def test_chunk_store_set(tmp_path):
+    data = counts((4, 2, 1000))
+    store = ChunkStoreWriter(str(tmp_path / 'set'), ['A', 'B'], 1000)
+    store.append_many(data, actual_samples=[[1000, 1000], [400, 400], [1000, 1000], [1000, 1000]],
+                      trigger_times=[0.0, 0.1, 0.2, 0.3])
+    store.close()
+    write_json(tmp_path / 'set_metadata.json', metadata(MeasurementSetName='set', StorageFormat='ChunkStore',
+                                                        DataFile=os.path.basename(store.data_path)))
+
+    dataset = load_dataset(str(tmp_path))
+    assert dataset.kind == 'chunks'
+    assert dataset.num_chunks == 4
+    assert dataset.num_samples == 1000
+    assert dataset.raw.shape == (4, 2, 1000)
+    np.testing.assert_array_equal(dataset.trigger_times, [0.0, 0.1, 0.2, 0.3])
+    assert dataset.chunk_raw(1).shape == (2, 400)
+    chunks = dict(dataset.iter_chunks())
+    np.testing.assert_allclose(chunks[2], expected_volts(data[2]), rtol=1e-6, atol=1e-6)
+    dataset.close()
+
+
+def test_chunk_file_set(tmp_path):
+    data = counts((3, 2, 500))
+    for i in range(3):
+        data[i].tofile(tmp_path / f'set_chunk_{i}.bin')
+    write_json(tmp_path / 'set_metadata.json', metadata(MeasurementSetName='set', RequestedNumberOfSamples=500,
+                                                        set_chunk_1=[300, 300]))
+
+    dataset = load_dataset(str(tmp_path / 'set_metadata.json'))
+    assert dataset.num_chunks == 3
+    np.testing.assert_array_equal(dataset.chunk_raw(0), data[0])
+    np.testing.assert_array_equal(dataset.chunk_raw(1), data[1, :, :300])
+    assert dataset.trigger_times is None
+
+
+def test_missing_metadata(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_dataset(str(tmp_path))
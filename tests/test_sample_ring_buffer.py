@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from controllers.utils.SampleRingBuffer import SampleRingBuffer
+
+
+def stream(num_channels, total):
+    return np.arange(num_channels * total, dtype=np.int32).reshape(num_channels, total)
+
+
+@pytest.mark.parametrize('size', [1, 7, 99, 100, 101, 250])
+def test_wraparound_keeps_newest_samples_in_order(size):
+    data = stream(2, 1000)
+    buffer = SampleRingBuffer(2, 100, dtype=np.int32)
+    for i in range(0, data.shape[1], size):
+        buffer.write(data[:, i:i + size])
+        written = min(i + size, data.shape[1])
+        np.testing.assert_array_equal(buffer.latest(), data[:, max(0, written - 100):written])
+    assert buffer.total_written == 1000
+    assert len(buffer) == 100
+
+
+def test_latest_n():
+    data = stream(1, 150)
+    buffer = SampleRingBuffer(1, 100, dtype=np.int32)
+    buffer.write(data[:, :130])
+    buffer.write(data[:, 130:])
+    np.testing.assert_array_equal(buffer.latest(30), data[:, 120:])
+    np.testing.assert_array_equal(buffer.latest(500), data[:, 50:])
+
+
+def test_partial_fill_and_clear():
+    buffer = SampleRingBuffer(1, 100)
+    assert buffer.latest().shape == (1, 0)
+    buffer.write(np.ones((1, 10), dtype=np.int16))
+    buffer.write(np.ones((1, 0), dtype=np.int16))
+    assert len(buffer) == 10
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.latest().shape == (1, 0)
@@ -0,0 +1,95 @@
+import threading
+
+from controllers.sinara.SinaraCommandQueue import SinaraCommandQueue
+from controllers.utils.JobManager import Job
+
+
+def blocking_queue():
+    """Queue whose first job holds Sinara until release is set"""
+    queue = SinaraCommandQueue()
+    started = threading.Event()
+    release = threading.Event()
+
+    def hold(job):
+        started.set()
+        release.wait(5)
+
+    blocker = queue.submit('hold', hold)
+    started.wait(5)
+    return queue, blocker, release
+
+
+def test_jobs_run_one_at_a_time_in_order():
+    queue = SinaraCommandQueue()
+    order = []
+    running = []
+
+    def task(i, job):
+        running.append(i)
+        assert len(running) == 1
+        order.append(i)
+        running.remove(i)
+
+    jobs = [queue.submit(f'task {i}', task, i) for i in range(10)]
+    assert queue.wait_idle(5)
+    assert order == list(range(10))
+    assert all(job.status == Job.DONE for job in jobs)
+
+
+def test_queued_jobs_with_same_key_are_coalesced():
+    queue, blocker, release = blocking_queue()
+    values = []
+    jobs = [queue.submit('tone', lambda value, job: values.append(value), value, coalesce_key='mirny:0')
+            for value in (1, 2, 3)]
+    other = queue.submit('tone', lambda job: values.append('ch1'), coalesce_key='mirny:1')
+    assert queue.pending() == [jobs[-1], other]
+    release.set()
+    assert queue.wait_idle(5)
+
+    assert values == [3, 'ch1']
+    assert queue.coalesced == 2
+    assert [job.status for job in jobs] == [Job.CANCELLED, Job.CANCELLED, Job.DONE]
+    assert jobs[0].message == f"Superseded by {jobs[1].id}"
+    assert blocker.status == Job.DONE
+
+
+def test_running_job_is_not_superseded():
+    queue = SinaraCommandQueue()
+    started = threading.Event()
+    release = threading.Event()
+
+    def hold(job):
+        started.set()
+        release.wait(5)
+
+    running = queue.submit('tone', hold, coalesce_key='mirny:0')
+    started.wait(5)
+    newer = queue.submit('tone', lambda job: None, coalesce_key='mirny:0')
+    assert queue.current is running
+    release.set()
+    assert queue.wait_idle(5)
+    assert running.status == Job.DONE and newer.status == Job.DONE
+
+
+def test_cancel_queued_job():
+    queue, _, release = blocking_queue()
+    ran = []
+    job = queue.submit('task', lambda job: ran.append(job))
+    queue.cancel(job.id)
+    release.set()
+    assert queue.wait_idle(5)
+    assert ran == []
+    assert job.status == Job.CANCELLED
+
+
+def test_failed_job_does_not_stop_the_queue():
+    queue = SinaraCommandQueue()
+
+    def fail(job):
+        raise RuntimeError("artiq_run failed")
+
+    failed = queue.submit('fail', fail)
+    after = queue.submit('after', lambda job: 'ok')
+    assert queue.wait_idle(5)
+    assert failed.status == Job.FAILED
+    assert after.result == 'ok'
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from controllers.picoscope.StreamWriter import StreamWriter
+
+
+def blocks(num_channels, total, size, seed=0):
+    data = np.random.default_rng(seed).integers(-32768, 32767, size=(num_channels, total), dtype=np.int16)
+    return data, [data[:, i:i + size] for i in range(0, total, size)]
+
+
+def write(path, data, parts, expected, layout):
+    writer = StreamWriter(str(path), data.shape[0], expected, layout=layout)
+    for part in parts:
+        writer.put(part, blocking=True)
+    writer.close()
+    assert writer.error is None
+    assert writer.dropped_samples == 0
+    return writer
+
+
+def test_interleaved_layout(tmp_path):
+    path = tmp_path / 'stream.bin'
+    data, parts = blocks(2, 3_000_000, 12_345)
+    writer = write(path, data, parts, data.shape[1], 'interleaved')
+    stored = np.fromfile(path, dtype=np.int16).reshape(-1, 2)
+    np.testing.assert_array_equal(stored, data.T)
+    assert writer.written_samples == data.shape[1]
+
+
+@pytest.mark.parametrize('total, expected', [(3_000_000, 3_000_000), (2_000_001, 3_000_000)])
+def test_channels_first_layout(tmp_path, total, expected):
+    path = tmp_path / 'stream.bin'
+    data, parts = blocks(3, total, 7_777)
+    writer = write(path, data, parts, expected, 'channels_first')
+    # a short stream is compacted, so the file holds exactly the samples written
+    stored = np.fromfile(path, dtype=np.int16).reshape(3, -1)
+    np.testing.assert_array_equal(stored, data)
+    assert writer.truncated_samples == 0
+
+
+def test_channels_first_drops_samples_beyond_expected(tmp_path):
+    path = tmp_path / 'stream.bin'
+    data, parts = blocks(2, 100_000, 3_000)
+    writer = write(path, data, parts, 60_000, 'channels_first')
+    stored = np.fromfile(path, dtype=np.int16).reshape(2, -1)
+    np.testing.assert_array_equal(stored, data[:, :60_000])
+    assert writer.truncated_samples == 40_000
+
+
+def test_full_staging_ring_drops_instead_of_blocking(tmp_path):
+    writer = StreamWriter(str(tmp_path / 'stream.bin'), 1, 10)
+    too_large = np.zeros((1, writer._capacity + 1), dtype=np.int16)
+    assert writer.put(too_large) is False
+    writer.close()
+    assert writer.dropped_samples == too_large.shape[1]
+
+
+def test_unknown_layout(tmp_path):
+    with pytest.raises(ValueError):
+        StreamWriter(str(tmp_path / 'stream.bin'), 1, 10, layout='rows')
@@ -0,0 +1,65 @@
+import types
+
+import numpy as np
+import pytest
+
+from controllers.cameras.ThorCam import ThorCam
+from thorlabs_tsi_sdk.tl_camera_enums import SENSOR_TYPE
+from thorlabs_tsi_sdk.tl_color_enums import FILTER_ARRAY_PHASE
+
+HEIGHT, WIDTH = 12, 16
+
+
+class FakeCamera:
+    """TLCamera stand-in delivering one fixed frame"""
+
+    def __init__(self, image, sensor_type=SENSOR_TYPE.BAYER, phase=FILTER_ARRAY_PHASE.BAYER_RED):
+        self.image = image
+        self.camera_sensor_type = sensor_type
+        self.color_filter_array_phase = phase
+        self.bit_depth = 12
+
+    def get_default_white_balance_matrix(self):
+        return np.eye(3)
+
+    def get_color_correction_matrix(self):
+        return np.eye(3)
+
+    def get_pending_frame_or_null(self):
+        return types.SimpleNamespace(image_buffer=self.image)
+
+    def disarm(self):
+        pass
+
+    def dispose(self):
+        pass
+
+
+def camera(image, **kwargs):
+    thorcam = ThorCam(0, sdk=None)
+    thorcam._camera = FakeCamera(image, **kwargs)
+    thorcam._setup_color()
+    return thorcam
+
+
+@pytest.mark.parametrize('phase, bgr', [(FILTER_ARRAY_PHASE.BAYER_RED, (0, 0, 255)),
+                                        (FILTER_ARRAY_PHASE.BAYER_BLUE, (255, 0, 0))])
+def test_bayer_frame_becomes_bgr(phase, bgr):
+    image = np.zeros((HEIGHT, WIDTH), dtype=np.uint16)
+    image[0::2, 0::2] = 4095  # light on the origin pixel of every 2x2 cell only
+    frame = camera(image, phase=phase).get_frame()
+    assert frame.shape == (HEIGHT, WIDTH, 3) and frame.dtype == np.uint8
+    assert np.all(frame[2:-2, 2:-2] == bgr)
+
+
+def test_gray_is_srgb_encoded():
+    frame = camera(np.full((HEIGHT, WIDTH), 1024, dtype=np.uint16)).get_frame()
+    linear = 1024 / 4095
+    expected = round((1.055 * linear ** (1 / 2.4) - 0.055) * 4095) >> 4
+    assert np.all(frame[2:-2, 2:-2] == expected)
+
+
+def test_monochrome_sensor_keeps_raw_frames():
+    image = np.arange(HEIGHT * WIDTH, dtype=np.uint16).reshape(HEIGHT, WIDTH)
+    thorcam = camera(image, sensor_type=SENSOR_TYPE.MONOCHROME)
+    assert thorcam.get_frame() is image
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from thorlabs_tsi_sdk.tl_color import TLColorError
+from thorlabs_tsi_sdk.tl_color_enums import FORMAT
+from thorlabs_tsi_sdk.tl_color_host import HostColorProcessor
+
+BITS = 12
+MAX_VALUE = 2 ** BITS - 1
+NUM_PIXELS = 500
+
+
+def reference(bgr, input_luts, matrices, output_luts, limits):
+    """
+    Per-pixel model of the SDK's ColorProcessor (thorlabs_tsi_color_processing): input LUT, the appended RGB
+    matrices in order, clamp to the output LUT range, output LUT, clamp to [min, max] and shift. bgr is (N, 3).
+    """
+    out = np.empty(bgr.shape, dtype=np.int64)
+    for i, (b, g, r) in enumerate(bgr):
+        rgb = np.array([input_luts[2][r], input_luts[1][g], input_luts[0][b]], dtype=np.float64)
+        for matrix in matrices:
+            rgb = matrix @ rgb
+        for channel, value in zip((2, 1, 0), rgb):
+            index = int(np.clip(np.rint(value), 0, MAX_VALUE))
+            min_value, max_value, shift = limits[channel]
+            out[i, channel] = min(max(output_luts[channel][index], min_value), max_value) >> shift
+    return out
+
+
+@pytest.fixture
+def pipeline():
+    rng = np.random.default_rng(0)
+    identity = np.arange(MAX_VALUE + 1)
+    gamma = np.rint(MAX_VALUE * (identity / MAX_VALUE) ** 0.6).astype(np.int32)
+    return {
+        'bgr': rng.integers(0, MAX_VALUE + 1, size=(NUM_PIXELS, 3), dtype=np.uint16),
+        'input_luts': [np.rint(identity * 0.9).astype(np.int32), identity, np.minimum(identity + 100, MAX_VALUE)],
+        'matrices': [np.diag([1.4, 1.0, 1.8]),
+                     np.array([[1.6, -0.4, -0.2], [-0.3, 1.5, -0.2], [0.0, -0.6, 1.6]])],
+        'output_luts': [gamma, gamma, identity],
+    }
+
+
+def configure(host, pipeline):
+    host.set_blue_input_lut(pipeline['input_luts'][0])
+    host.set_green_input_lut(pipeline['input_luts'][1])
+    host.set_red_input_lut(pipeline['input_luts'][2])
+    host.enable_input_luts(True, True, True)
+    for matrix in pipeline['matrices']:
+        host.append_matrix(matrix)
+    host.set_blue_output_lut(pipeline['output_luts'][0])
+    host.set_green_output_lut(pipeline['output_luts'][1])
+    host.set_red_output_lut(pipeline['output_luts'][2])
+    host.enable_output_luts(True, True, True)
+
+
+def test_48_to_48_matches_reference(pipeline):
+    limits = [(0, MAX_VALUE, 0), (100, 3900, 0), (0, 2000, 0)]
+    expected = reference(pipeline['bgr'], pipeline['input_luts'], pipeline['matrices'], pipeline['output_luts'],
+                         limits)
+    with HostColorProcessor(BITS, BITS) as host:
+        configure(host, pipeline)
+        out = host.transform_48_to_48(pipeline['bgr'].ravel(), FORMAT.BGR_PIXEL, *limits[0][:2], *limits[1][:2],
+                                      *limits[2][:2], 0, 0, 0, FORMAT.BGR_PIXEL, NUM_PIXELS)
+    # float32 vs float64 matrix products may round a value to the neighbouring LUT entry
+    np.testing.assert_array_equal(out.reshape(NUM_PIXELS, 3), expected)
+
+
+@pytest.mark.parametrize('output_format', [FORMAT.BGR_PIXEL, FORMAT.RGB_PIXEL, FORMAT.BGR_PLANAR])
+def test_48_to_24_and_32_formats(pipeline, output_format):
+    limits = [(0, MAX_VALUE, 4)] * 3
+    expected = reference(pipeline['bgr'], pipeline['input_luts'], pipeline['matrices'], pipeline['output_luts'],
+                         limits)
+    host = HostColorProcessor(BITS, BITS)
+    configure(host, pipeline)
+    args = (0, MAX_VALUE, 0, MAX_VALUE, 0, MAX_VALUE, 4, 4, 4, output_format, NUM_PIXELS)
+    out24 = host.transform_48_to_24(pipeline['bgr'].ravel(), FORMAT.BGR_PIXEL, *args)
+    out32 = host.transform_48_to_32(pipeline['bgr'].ravel(), FORMAT.BGR_PIXEL, *args)
+    if output_format == FORMAT.BGR_PLANAR:
+        bgr24, bgr32 = out24.reshape(3, NUM_PIXELS).T, out32.reshape(4, NUM_PIXELS).T
+    else:
+        order = [0, 1, 2] if output_format == FORMAT.BGR_PIXEL else [2, 1, 0]
+        bgr24 = out24.reshape(NUM_PIXELS, 3)[:, order]
+        bgr32 = out32.reshape(NUM_PIXELS, 4)[:, order + [3]]
+    np.testing.assert_array_equal(bgr24, expected)
+    np.testing.assert_array_equal(bgr32[:, :3], bgr24)
+    assert np.all(bgr32[:, 3] == 255)
+
+
+def test_planar_input_and_disabled_luts():
+    rng = np.random.default_rng(1)
+    bgr = rng.integers(0, MAX_VALUE + 1, size=(NUM_PIXELS, 3), dtype=np.uint16)
+    identity = np.arange(MAX_VALUE + 1)
+    limits = [(0, MAX_VALUE, 0)] * 3
+    host = HostColorProcessor(BITS, BITS)
+    host.set_red_output_lut(MAX_VALUE - identity)  # not enabled, so not applied
+    out = host.transform_48_to_48(np.ascontiguousarray(bgr.T).ravel(), FORMAT.BGR_PLANAR, 0, MAX_VALUE, 0,
+                                  MAX_VALUE, 0, MAX_VALUE, 0, 0, 0, FORMAT.BGR_PIXEL, NUM_PIXELS)
+    np.testing.assert_array_equal(out.reshape(NUM_PIXELS, 3), reference(bgr, [identity] * 3, [], [identity] * 3,
+                                                                        limits))
+
+
+def test_settings_changes_rebuild_cached_tables(pipeline):
+    host = HostColorProcessor(BITS, BITS)
+    pixel = np.array([1000, 2000, 3000], dtype=np.uint16)
+    args = (FORMAT.BGR_PIXEL, 0, MAX_VALUE, 0, MAX_VALUE, 0, MAX_VALUE, 0, 0, 0, FORMAT.BGR_PIXEL, 1)
+    np.testing.assert_array_equal(host.transform_48_to_48(pixel, *args), pixel)
+    host.append_matrix(np.diag([0.5, 1.0, 1.0]))  # red is last in a BGR tuple
+    np.testing.assert_array_equal(host.transform_48_to_48(pixel, *args), [1000, 2000, 1500])
+    host.clear_matrix()
+    np.testing.assert_array_equal(host.transform_48_to_48(pixel, *args), pixel)
+
+
+def test_rejects_wrong_lut_and_buffer():
+    host = HostColorProcessor(BITS, BITS)
+    with pytest.raises(TLColorError):
+        host.set_red_input_lut(np.arange(10))
+    with pytest.raises(TLColorError):
+        host.transform_48_to_24(np.zeros(30, dtype=np.uint16), FORMAT.BGR_PIXEL, 0, MAX_VALUE, 0, MAX_VALUE, 0,
+                                MAX_VALUE, 4, 4, 4, FORMAT.BGR_PIXEL, 10, np.zeros(30, dtype=np.uint16))
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from thorlabs_tsi_sdk import tl_mono_to_color_host
+from thorlabs_tsi_sdk.tl_color_enums import FILTER_ARRAY_PHASE, FORMAT
+from thorlabs_tsi_sdk.tl_mono_to_color_enums import COLOR_SPACE
+from thorlabs_tsi_sdk.tl_mono_to_color_host import HostMonoToColorProcessor
+from thorlabs_tsi_sdk.tl_mono_to_color_processor import MonoToColorError
+
+BIT_DEPTH = 12
+MAX_VALUE = 2 ** BIT_DEPTH - 1
+HEIGHT, WIDTH = 16, 24
+IDENTITY = np.eye(3)
+
+
+def processor(phase=FILTER_ARRAY_PHASE.BAYER_RED, ccm=IDENTITY, wb=IDENTITY, **kwargs):
+    return HostMonoToColorProcessor(phase, ccm, wb, BIT_DEPTH, **kwargs)
+
+
+def interior(flat, channels):
+    return flat.reshape(HEIGHT, WIDTH, channels)[2:-2, 2:-2]
+
+
+def srgb(level, max_output):
+    linear = level / MAX_VALUE
+    encoded = 12.92 * linear if linear <= 0.0031308 else 1.055 * linear ** (1 / 2.4) - 0.055
+    return round(encoded * max_output)
+
+
+@pytest.mark.parametrize('level', [0, 100, 2000, MAX_VALUE])
+def test_uniform_gray_follows_srgb_curve(level):
+    image = np.full(HEIGHT * WIDTH, level, dtype=np.uint16)
+    with processor() as host:
+        rgb24 = host.transform_to_24(image, WIDTH, HEIGHT)
+        rgb48 = host.transform_to_48(image, WIDTH, HEIGHT)
+    assert np.all(interior(rgb24, 3) == srgb(level, 255))
+    assert np.all(interior(rgb48, 3) == srgb(level, MAX_VALUE))
+
+
+def test_linear_color_space():
+    image = np.full(HEIGHT * WIDTH, 2000, dtype=np.uint16)
+    host = processor(color_space=COLOR_SPACE.LINEAR_SRGB)
+    assert np.all(interior(host.transform_to_48(image, WIDTH, HEIGHT), 3) == 2000)
+
+
+@pytest.mark.parametrize('phase, color', [(FILTER_ARRAY_PHASE.BAYER_RED, 0), (FILTER_ARRAY_PHASE.BAYER_BLUE, 2),
+                                          (FILTER_ARRAY_PHASE.GREEN_LEFT_OF_RED, 1),
+                                          (FILTER_ARRAY_PHASE.GREEN_LEFT_OF_BLUE, 1)])
+def test_filter_phase_maps_origin_pixel_color(phase, color):
+    # light only on the pixels of the origin color of the 2x2 cell
+    image = np.zeros((HEIGHT, WIDTH), dtype=np.uint16)
+    image[0::2, 0::2] = 3000
+    if color == 1:
+        image[1::2, 1::2] = 3000  # both greens of the cell
+    host = processor(phase, color_space=COLOR_SPACE.LINEAR_SRGB)
+    rgb = interior(host.transform_to_48(image.ravel(), WIDTH, HEIGHT), 3)
+    assert np.all(rgb[..., color] == 3000)
+    assert np.all(np.delete(rgb, color, axis=2) == 0)
+
+
+def test_white_balance_gain_and_color_correction():
+    image = np.full(HEIGHT * WIDTH, 1000, dtype=np.uint16)
+    wb = np.diag([1.5, 1.0, 2.0])
+    ccm = np.array([[1.0, 0.0, 0.0], [0.0, 0.5, 0.5], [0.0, 0.0, 1.0]])
+    host = processor(ccm=ccm, wb=wb, color_space=COLOR_SPACE.LINEAR_SRGB)
+    host.red_gain = 2.0
+    rgb = interior(host.transform_to_48(image, WIDTH, HEIGHT), 3)
+    assert np.all(rgb[..., 0] == 3000)
+    assert np.all(rgb[..., 1] == 1500)
+    assert np.all(rgb[..., 2] == 2000)
+
+
+def test_output_formats_reuse_buffer():
+    image = np.zeros((HEIGHT, WIDTH), dtype=np.uint16)
+    image[0::2, 0::2] = MAX_VALUE  # red only
+    host = processor()
+    out = np.zeros(HEIGHT * WIDTH * 4, dtype=np.uint8)
+    assert host.transform_to_32(image.ravel(), WIDTH, HEIGHT, out) is out
+    rgba = interior(out, 4)
+    assert np.all(rgba[..., 0] == 255) and np.all(rgba[..., 2] == 0) and np.all(rgba[..., 3] == 255)
+
+    host.output_format = FORMAT.BGR_PIXEL
+    bgr = interior(host.transform_to_24(image.ravel(), WIDTH, HEIGHT), 3)
+    assert np.all(bgr[..., 2] == 255) and np.all(bgr[..., 0] == 0)
+
+    host.output_format = FORMAT.BGR_PLANAR
+    planes = host.transform_to_24(image.ravel(), WIDTH, HEIGHT).reshape(3, HEIGHT, WIDTH)[:, 2:-2, 2:-2]
+    assert np.all(planes[2] == 255) and np.all(planes[0] == 0)
+
+
+def test_wrong_output_buffer():
+    image = np.zeros(HEIGHT * WIDTH, dtype=np.uint16)
+    with pytest.raises(MonoToColorError):
+        processor().transform_to_24(image, WIDTH, HEIGHT, np.zeros(HEIGHT * WIDTH * 3, dtype=np.uint16))
+
+
+@pytest.mark.skipif(tl_mono_to_color_host.cv2 is None, reason="OpenCV is not installed")
+@pytest.mark.parametrize('phase', list(FILTER_ARRAY_PHASE))
+def test_numpy_demosaic_matches_opencv(phase):
+    # smooth image, so both bilinear interpolations agree away from the border
+    y, x = np.mgrid[0:HEIGHT, 0:WIDTH]
+    image = (500 + 40 * x + 25 * y).astype(np.uint16).ravel()
+    host = processor(phase)
+    reference = host.transform_to_48(image, WIDTH, HEIGHT)
+    host._use_opencv = False
+    numpy_result = host.transform_to_48(image, WIDTH, HEIGHT)
+    np.testing.assert_allclose(interior(numpy_result, 3).astype(int), interior(reference, 3).astype(int), atol=2)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from thorlabs_tsi_sdk.tl_polarization_enums import POLAR_PHASE
+from thorlabs_tsi_sdk.tl_polarization_host import HostPolarizationProcessor
+
+BIT_DEPTH = 12
+MAX_VALUE = 2 ** BIT_DEPTH - 1
+
+
+def transform(image, **kwargs):
+    height, width = image.shape
+    with HostPolarizationProcessor() as host:
+        return host.transform(POLAR_PHASE.PolarPhase0, image, 0, 0, width, height, BIT_DEPTH, MAX_VALUE, **kwargs)
+
+
+@pytest.mark.parametrize('level', [0, 1000, 2000, 3000, MAX_VALUE])
+def test_uniform_input_intensity_matches_input_level(level):
+    intensity, dolp, _ = transform(np.full((8, 10), level, dtype=np.uint16))
+    assert np.all(intensity == level)
+    assert np.all(dolp == 0)
+
+
+def test_fully_polarized_light():
+    # polarizer angles of the phase 0 cell: [[0, 135], [45, 90]]; light polarized at 0 degrees
+    cell = np.array([[1000, 500], [500, 0]], dtype=np.uint16)
+    intensity, dolp, azimuth = transform(np.tile(cell, (4, 4)), full_resolution=False)
+    assert intensity.shape == (4, 4)
+    assert np.all(intensity == 500)  # mean of the four polarizer pixels
+    assert np.all(dolp == MAX_VALUE)
+    assert np.all(azimuth == round(0.5 * MAX_VALUE))
+
+
+def test_bands_match_single_thread():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, MAX_VALUE, size=(512, 256), dtype=np.uint16)
+    single = transform(image)
+    with HostPolarizationProcessor(num_workers=4) as host:
+        banded = host.transform(POLAR_PHASE.PolarPhase0, image, 0, 0, 256, 512, BIT_DEPTH, MAX_VALUE)
+    for expected, actual in zip(single, banded):
+        np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,296 @@
+"""
+tl_color_host.py
+
+Host-side (pure NumPy) color pipeline with the same LUT/matrix model as ColorProcessor. Does not require the color
+processing DLLs.
+"""
+
+from traceback import format_exception
+import logging
+
+import numpy as np
+
+from .tl_color_enums import FORMAT
+from .tl_color import TLColorError
+
+""" Setup logger """
+_logger = logging.getLogger('thorlabs_tsi_sdk.tl_color_host')
+
+""" Channel order """
+
+# Internally every pixel is a (B, G, R) tuple, like the SDK's "bgr tuples"
+_BLUE, _GREEN, _RED = 0, 1, 2
+# Permutation that turns an RGB ordered 3x3 matrix into one acting on BGR tuples
+_RGB_TO_BGR = [2, 1, 0]
+
+
+class HostColorProcessor(object):
+
+    """
+    HostColorProcessor
+
+    NumPy counterpart of :class:`ColorProcessor<thorlabs_tsi_sdk.tl_color.ColorProcessor>` for live color preview.
+    It exposes the same input LUT, matrix and output LUT controls and transform_48_to_48/32/24 methods, but evaluates
+    the pipeline in as few vectorized passes as possible:
+
+    1. input LUTs (pre-converted to float32 tables) gather the pixels straight into a float32 (N, 3) buffer,
+    2. the product of all appended matrices is applied with one float32 matrix multiplication,
+    3. a fused output table, combining the output LUT, the min/max clamp, the shift and the conversion to the
+       output dtype, gathers the result into the caller's buffer.
+
+    The float32 input tables, the composite matrix and the fused output tables are cached and only rebuilt after a
+    LUT, an enable flag or the matrix list changes. Intermediate buffers are kept between frames of the same size.
+
+    Matrices passed to :meth:`append_matrix` are row-major 3x3 matrices acting on (R, G, B) vectors, the layout of
+    :meth:`TLCamera.get_color_correction_matrix<thorlabs_tsi_sdk.tl_camera.TLCamera.get_color_correction_matrix>`.
+
+    """
+
+    def __init__(self, input_lut_size_bits, output_lut_size_bits):
+        # type: (int, int) -> None
+        try:
+            self._input_lut_size_bits = input_lut_size_bits
+            self._output_lut_size_bits = output_lut_size_bits
+            input_identity = np.arange(2 ** input_lut_size_bits, dtype=np.int32)
+            output_identity = np.arange(2 ** output_lut_size_bits, dtype=np.int32)
+            # LUTs and enable flags in (B, G, R) order
+            self._input_luts = [input_identity.copy() for _ in range(3)]
+            self._output_luts = [output_identity.copy() for _ in range(3)]
+            self._input_luts_enabled = [False, False, False]
+            self._output_luts_enabled = [False, False, False]
+            self._matrices = []
+
+            # cached derived tables
+            self._input_tables = None
+            self._composite_matrix = None
+            self._output_tables = {}
+
+            self._scratch_size = None
+            self._linear = None
+            self._mixed = None
+            self._index = None
+        except Exception as error:
+            _logger.error("HostColorProcessor initialization failed. ")
+            raise error
+
+    """ with statement functionality """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            _logger.debug("".join(format_exception(exc_type, exc_val, exc_tb)))
+        self.dispose()
+        return True if exc_type is None else False
+
+    """ Public Methods """
+
+    def dispose(self):
+        # type: (type(None)) -> None
+        self._scratch_size = None
+        self._linear = self._mixed = self._index = None
+
+#  getters will return a copy of lut. setters copy the values and invalidate the cached tables.
+
+    def get_blue_input_lut(self):
+        # type: (type(None)) -> np.array
+        return self._input_luts[_BLUE].copy()
+
+    def get_green_input_lut(self):
+        # type: (type(None)) -> np.array
+        return self._input_luts[_GREEN].copy()
+
+    def get_red_input_lut(self):
+        # type: (type(None)) -> np.array
+        return self._input_luts[_RED].copy()
+
+    def set_blue_input_lut(self, blue_lut):
+        # type: (np.array) -> None
+        self._set_lut(self._input_luts, _BLUE, blue_lut)
+        self._input_tables = None
+
+    def set_green_input_lut(self, green_lut):
+        # type: (np.array) -> None
+        self._set_lut(self._input_luts, _GREEN, green_lut)
+        self._input_tables = None
+
+    def set_red_input_lut(self, red_lut):
+        # type: (np.array) -> None
+        self._set_lut(self._input_luts, _RED, red_lut)
+        self._input_tables = None
+
+    def enable_input_luts(self, blue_LUT_enable, green_LUT_enable, red_LUT_enable):
+        # type: (int, int, int) -> None
+        self._input_luts_enabled = [bool(blue_LUT_enable), bool(green_LUT_enable), bool(red_LUT_enable)]
+        self._input_tables = None
+
+    def append_matrix(self, matrix):
+        # type: (np.array) -> None
+        try:
+            self._matrices.append(np.asarray(matrix, dtype=np.float64).reshape(3, 3))
+            self._composite_matrix = None
+        except Exception as error:
+            _logger.error("Could not append matrix. ")
+            raise error
+
+    def clear_matrix(self):
+        # type: (type(None)) -> None
+        self._matrices = []
+        self._composite_matrix = None
+
+    def get_blue_output_lut(self):
+        # type: (type(None)) -> np.array
+        return self._output_luts[_BLUE].copy()
+
+    def get_green_output_lut(self):
+        # type: (type(None)) -> np.array
+        return self._output_luts[_GREEN].copy()
+
+    def get_red_output_lut(self):
+        # type: (type(None)) -> np.array
+        return self._output_luts[_RED].copy()
+
+    def set_blue_output_lut(self, blue_lut):
+        # type: (np.array) -> None
+        self._set_lut(self._output_luts, _BLUE, blue_lut)
+        self._output_tables = {}
+
+    def set_green_output_lut(self, green_lut):
+        # type: (np.array) -> None
+        self._set_lut(self._output_luts, _GREEN, green_lut)
+        self._output_tables = {}
+
+    def set_red_output_lut(self, red_lut):
+        # type: (np.array) -> None
+        self._set_lut(self._output_luts, _RED, red_lut)
+        self._output_tables = {}
+
+    def enable_output_luts(self, blue_LUT_enable, green_LUT_enable, red_LUT_enable):
+        # type: (int, int, int) -> None
+        self._output_luts_enabled = [bool(blue_LUT_enable), bool(green_LUT_enable), bool(red_LUT_enable)]
+        self._output_tables = {}
+
+    def transform_48_to_48(self, input_buffer, input_buffer_format, blue_output_min_value, blue_output_max_value,
+                           green_output_min_value, green_output_max_value, red_output_min_value, red_output_max_value,
+                           output_blue_shift_distance, output_green_shift_distance, output_red_shift_distance,
+                           output_buffer_format, number_of_bgr_tuples, output_buffer=None
+                           ):
+        # type: (np.array, FORMAT, int, int, int, int, int, int, int, int, int, FORMAT, int, np.array) -> np.array
+        return self._transform(input_buffer, input_buffer_format,
+                               ((blue_output_min_value, blue_output_max_value, output_blue_shift_distance),
+                                (green_output_min_value, green_output_max_value, output_green_shift_distance),
+                                (red_output_min_value, red_output_max_value, output_red_shift_distance)),
+                               output_buffer_format, number_of_bgr_tuples, output_buffer, 3, np.uint16)
+
+    def transform_48_to_32(self, input_buffer, input_buffer_format, blue_output_min_value, blue_output_max_value,
+                           green_output_min_value, green_output_max_value, red_output_min_value, red_output_max_value,
+                           output_blue_shift_distance, output_green_shift_distance, output_red_shift_distance,
+                           output_buffer_format, number_of_bgr_tuples, output_buffer=None
+                           ):
+        # type: (np.array, FORMAT, int, int, int, int, int, int, int, int, int, FORMAT, int, np.array) -> np.array
+        return self._transform(input_buffer, input_buffer_format,
+                               ((blue_output_min_value, blue_output_max_value, output_blue_shift_distance),
+                                (green_output_min_value, green_output_max_value, output_green_shift_distance),
+                                (red_output_min_value, red_output_max_value, output_red_shift_distance)),
+                               output_buffer_format, number_of_bgr_tuples, output_buffer, 4, np.uint8)
+
+    def transform_48_to_24(self, input_buffer, input_buffer_format, blue_output_min_value, blue_output_max_value,
+                           green_output_min_value, green_output_max_value, red_output_min_value, red_output_max_value,
+                           output_blue_shift_distance, output_green_shift_distance, output_red_shift_distance,
+                           output_buffer_format, number_of_bgr_tuples, output_buffer=None
+                           ):
+        # type: (np.array, FORMAT, int, int, int, int, int, int, int, int, int, FORMAT, int, np.array) -> np.array
+        return self._transform(input_buffer, input_buffer_format,
+                               ((blue_output_min_value, blue_output_max_value, output_blue_shift_distance),
+                                (green_output_min_value, green_output_max_value, output_green_shift_distance),
+                                (red_output_min_value, red_output_max_value, output_red_shift_distance)),
+                               output_buffer_format, number_of_bgr_tuples, output_buffer, 3, np.uint8)
+
+    """ Pipeline """
+
+    def _transform(self, input_buffer, input_buffer_format, limits, output_buffer_format, num_pixels, output_buffer,
+                   channels, dtype):
+        try:
+            if output_buffer is None:
+                output_buffer = np.empty(shape=(num_pixels * channels,), dtype=dtype)
+            elif output_buffer.size != num_pixels * channels or output_buffer.dtype != dtype:
+                raise TLColorError("Output buffer must have {size} elements of {dtype}\n"
+                                   .format(size=num_pixels * channels, dtype=np.dtype(dtype).name))
+            self._ensure_scratch(num_pixels)
+
+            # pass 1: input LUTs, gathered as float32
+            source = self._bgr_columns(np.asarray(input_buffer).view(np.ushort), input_buffer_format, num_pixels, 3)
+            for channel, table in enumerate(self._get_input_tables()):
+                np.take(table, source[channel], out=self._linear[:, channel], mode='clip')
+
+            # pass 2: all matrices at once
+            np.matmul(self._linear, self._get_composite_matrix().T, out=self._mixed)
+            np.clip(self._mixed, 0, 2 ** self._output_lut_size_bits - 1, out=self._mixed)
+            self._mixed += 0.5
+            np.copyto(self._index, self._mixed, casting='unsafe')
+
+            # pass 3: fused output LUT / clamp / shift / dtype conversion into the caller's buffer
+            target = self._bgr_columns(output_buffer, output_buffer_format, num_pixels, channels)
+            for channel, table in enumerate(self._get_output_tables(limits, dtype)):
+                np.take(table, self._index[:, channel], out=target[channel], mode='clip')
+            if channels == 4:
+                target[3][:] = 255
+            return output_buffer
+        except Exception as error:
+            _logger.error("Could not transform image on host. ")
+            raise error
+
+    @staticmethod
+    def _bgr_columns(buffer, buffer_format, num_pixels, channels):
+        # views of the blue, green, red (and alpha) samples of a flat buffer in the given format
+        if buffer_format == FORMAT.BGR_PLANAR:
+            planes = buffer.reshape(channels, num_pixels)
+            return [planes[i] for i in range(channels)]
+        pixels = buffer.reshape(num_pixels, channels)
+        order = [0, 1, 2] if buffer_format == FORMAT.BGR_PIXEL else [2, 1, 0]
+        return [pixels[:, i] for i in order] + [pixels[:, i] for i in range(3, channels)]
+
+    def _ensure_scratch(self, num_pixels):
+        if self._scratch_size == num_pixels:
+            return
+        self._scratch_size = num_pixels
+        self._linear = np.empty((num_pixels, 3), dtype=np.float32)
+        self._mixed = np.empty((num_pixels, 3), dtype=np.float32)
+        self._index = np.empty((num_pixels, 3), dtype=np.uint16)
+
+    def _get_input_tables(self):
+        if self._input_tables is None:
+            identity = np.arange(2 ** self._input_lut_size_bits, dtype=np.float32)
+            self._input_tables = [lut.astype(np.float32) if enabled else identity
+                                  for lut, enabled in zip(self._input_luts, self._input_luts_enabled)]
+        return self._input_tables
+
+    def _get_composite_matrix(self):
+        if self._composite_matrix is None:
+            composite = np.eye(3)
+            for matrix in self._matrices:
+                composite = matrix @ composite
+            self._composite_matrix = np.ascontiguousarray(composite[_RGB_TO_BGR][:, _RGB_TO_BGR], dtype=np.float32)
+        return self._composite_matrix
+
+    def _get_output_tables(self, limits, dtype):
+        key = (tuple(limits), np.dtype(dtype))
+        tables = self._output_tables.get(key)
+        if tables is None:
+            identity = np.arange(2 ** self._output_lut_size_bits, dtype=np.int64)
+            tables = []
+            for lut, enabled, (min_value, max_value, shift) in zip(self._output_luts, self._output_luts_enabled,
+                                                                   limits):
+                values = lut.astype(np.int64) if enabled else identity
+                values = np.clip(values, min_value, max_value) >> shift
+                tables.append(np.clip(values, 0, np.iinfo(dtype).max).astype(dtype))
+            self._output_tables[key] = tables
+        return tables
+
+    @staticmethod
+    def _set_lut(luts, channel, lut):
+        lut = np.asarray(lut)
+        if lut.shape != luts[channel].shape:
+            raise TLColorError("LUT must have {size} entries, got {actual}\n"
+                               .format(size=luts[channel].size, actual=lut.size))
+        luts[channel][:] = lut
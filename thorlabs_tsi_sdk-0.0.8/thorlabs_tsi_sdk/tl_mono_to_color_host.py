@@ -0,0 +1,351 @@
+"""
+tl_mono_to_color_host.py
+
+Host-side (NumPy/OpenCV) mono to color processing. Does not require the mono to color DLLs, so it also runs on Linux
+for offline processing and testing.
+"""
+
+from traceback import format_exception
+import logging
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:  # OpenCV is optional, a NumPy demosaic is used without it
+    cv2 = None
+
+from .tl_color_enums import FORMAT, FILTER_ARRAY_PHASE
+from .tl_mono_to_color_enums import COLOR_SPACE
+from .tl_mono_to_color_processor import MonoToColorError
+
+""" Setup logger """
+_logger = logging.getLogger('thorlabs_tsi_sdk.tl_mono_to_color_host')
+
+""" Bayer layout """
+
+# Colors of the 2x2 cell starting at the origin pixel (0 = red, 1 = green, 2 = blue), row by row
+_BAYER_CELLS = {FILTER_ARRAY_PHASE.BAYER_RED: ((0, 1), (1, 2)),
+                FILTER_ARRAY_PHASE.BAYER_BLUE: ((2, 1), (1, 0)),
+                FILTER_ARRAY_PHASE.GREEN_LEFT_OF_RED: ((1, 0), (2, 1)),
+                FILTER_ARRAY_PHASE.GREEN_LEFT_OF_BLUE: ((1, 2), (0, 1))}
+
+# OpenCV conversion codes per phase, named after the sensor layout (available from OpenCV 4.5)
+_OPENCV_BAYER_CODES = {FILTER_ARRAY_PHASE.BAYER_RED: 'COLOR_BayerRGGB2RGB',
+                       FILTER_ARRAY_PHASE.BAYER_BLUE: 'COLOR_BayerBGGR2RGB',
+                       FILTER_ARRAY_PHASE.GREEN_LEFT_OF_RED: 'COLOR_BayerGRBG2RGB',
+                       FILTER_ARRAY_PHASE.GREEN_LEFT_OF_BLUE: 'COLOR_BayerGBRG2RGB'}
+
+# Bilinear interpolation kernels for the NumPy demosaic
+_KERNEL_RED_BLUE = np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]], dtype=np.float32) / 4
+_KERNEL_GREEN = np.array([[0, 1, 0], [1, 4, 1], [0, 1, 0]], dtype=np.float32) / 4
+
+
+def _srgb_encode(linear):
+    # type: (np.array) -> np.array
+    """ sRGB transfer function for linear values in [0, 1] """
+    return np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * np.power(linear, 1 / 2.4) - 0.055)
+
+
+class HostMonoToColorProcessor(object):
+
+    """
+    HostMonoToColorProcessor
+
+    NumPy/OpenCV counterpart of :class:`MonoToColorProcessor<thorlabs_tsi_sdk.tl_mono_to_color_processor.MonoToColorProcessor>`.
+    It is constructed from the same color filter array phase, color correction matrix, default white balance matrix and
+    bit depth (read them from the camera or from an SDK processor) and offers the same transform_to_24/32/48 methods.
+
+    Each frame is demosaicked (OpenCV if available, bilinear NumPy otherwise), multiplied by the fused
+    color correction x white balance x gain matrix, and mapped through a lookup table that applies scaling and the
+    sRGB transfer function in one step. Intermediate buffers are kept between frames of the same size and the result
+    is written into the caller-provided output buffer, so steady-state processing does not allocate.
+
+    Output buffers are flat, with the same size and pixel order as the SDK transforms.
+
+    """
+
+    def __init__(self, color_filter_array_phase, color_correction_matrix, default_white_balance_matrix, bit_depth,
+                 color_space=COLOR_SPACE.SRGB, output_format=FORMAT.RGB_PIXEL):
+        # type: (FILTER_ARRAY_PHASE, np.array, np.array, int, COLOR_SPACE, FORMAT) -> None
+        try:
+            self._color_filter_array_phase = FILTER_ARRAY_PHASE(color_filter_array_phase)
+            self._color_correction_matrix = np.asarray(color_correction_matrix, dtype=np.float32).reshape(3, 3)
+            self._default_white_balance_matrix = np.asarray(default_white_balance_matrix,
+                                                            dtype=np.float32).reshape(3, 3)
+            self._bit_depth = int(bit_depth)
+            self._color_space = COLOR_SPACE(color_space)
+            self._output_format = FORMAT(output_format)
+            self._red_gain = 1.0
+            self._green_gain = 1.0
+            self._blue_gain = 1.0
+            self._use_opencv = cv2 is not None and hasattr(cv2, _OPENCV_BAYER_CODES[self._color_filter_array_phase])
+            # derived state, rebuilt lazily when one of the settings above changes
+            self._matrix = None
+            self._luts = {}
+            self._scratch_shape = None
+            self._rgb16 = None
+            self._linear = None
+            self._index = None
+        except Exception as exception:
+            _logger.error("HostMonoToColorProcessor initialization failed; " + str(exception))
+            raise exception
+
+    """ with statement functionality """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        if exception_type is not None:
+            _logger.debug("".join(format_exception(exception_type, exception_value, exception_traceback)))
+        self.dispose()
+        return True if exception_type is None else False
+
+    def dispose(self):
+        # type: (type(None)) -> None
+        """
+        Releases the intermediate buffers.
+
+        """
+        self._scratch_shape = None
+        self._rgb16 = self._linear = self._index = None
+
+    def transform_to_48(self, input_buffer, image_width_pixels, image_height_pixels, output_buffer=None):
+        # type: (np.array, int, int, np.array) -> np.array
+        """
+        Convert monochrome image data into a 3-channel colored image with 16 bits per channel (values up to the bit
+        depth of the processor). The pixel data will be ordered according to :attr:`output_format`.
+
+        :param np.array input_buffer: Single channel monochrome image data of size image_width * image_height.
+        :param int image_width_pixels: The width of the image in the input_buffer.
+        :param int image_height_pixels: The height of the image in the input_buffer.
+        :param np.array output_buffer: Optional output of size image_width * image_height * 3, *dtype* = np.uint16.
+        :return np.array: 3-channel colored output image, *dtype* = np.uint16.
+        """
+        return self._transform(input_buffer, image_width_pixels, image_height_pixels, output_buffer, 3, np.uint16)
+
+    def transform_to_32(self, input_buffer, image_width_pixels, image_height_pixels, output_buffer=None):
+        # type: (np.array, int, int, np.array) -> np.array
+        """
+        Convert monochrome image data into a 4-channel colored image with 8 bits per channel. The fourth (alpha)
+        channel is set to 255. The pixel data will be ordered according to :attr:`output_format`.
+
+        :param np.array input_buffer: Single channel monochrome image data of size image_width * image_height.
+        :param int image_width_pixels: The width of the image in the input_buffer.
+        :param int image_height_pixels: The height of the image in the input_buffer.
+        :param np.array output_buffer: Optional output of size image_width * image_height * 4, *dtype* = np.uint8.
+        :return np.array: 4-channel colored output image, *dtype* = np.uint8.
+        """
+        return self._transform(input_buffer, image_width_pixels, image_height_pixels, output_buffer, 4, np.uint8)
+
+    def transform_to_24(self, input_buffer, image_width_pixels, image_height_pixels, output_buffer=None):
+        # type: (np.array, int, int, np.array) -> np.array
+        """
+        Convert monochrome image data into a 3-channel colored image with 8 bits per channel. The pixel data will be
+        ordered according to :attr:`output_format`.
+
+        :param np.array input_buffer: Single channel monochrome image data of size image_width * image_height.
+        :param int image_width_pixels: The width of the image in the input_buffer.
+        :param int image_height_pixels: The height of the image in the input_buffer.
+        :param np.array output_buffer: Optional output of size image_width * image_height * 3, *dtype* = np.uint8.
+        :return np.array: 3-channel colored output image, *dtype* = np.uint8.
+        """
+        return self._transform(input_buffer, image_width_pixels, image_height_pixels, output_buffer, 3, np.uint8)
+
+    def _transform(self, input_buffer, width, height, output_buffer, channels, dtype):
+        try:
+            num_pixels = width * height
+            if output_buffer is None:
+                output_buffer = np.zeros(shape=(num_pixels * channels,), dtype=dtype)
+            elif output_buffer.size != num_pixels * channels or output_buffer.dtype != dtype:
+                raise MonoToColorError("Output buffer must have {size} elements of {dtype}"
+                                       .format(size=num_pixels * channels, dtype=np.dtype(dtype).name))
+            self._ensure_scratch(width, height)
+
+            image = np.asarray(input_buffer).reshape(height, width)
+            self._demosaic(image)
+
+            # white balance, gains and color correction in one matrix product, rows already in output channel order
+            np.matmul(self._rgb16.reshape(num_pixels, 3), self._get_matrix().T, out=self._linear)
+            np.clip(self._linear, 0, 2 ** self._bit_depth - 1, out=self._linear)
+            self._linear += 0.5
+            np.copyto(self._index, self._linear, casting='unsafe')
+
+            # scaling and transfer function through the lookup table, straight into the caller's buffer
+            lut = self._get_lut(dtype)
+            if self._output_format == FORMAT.BGR_PLANAR:
+                planes = output_buffer.reshape(channels, num_pixels)
+                for channel in range(3):
+                    np.take(lut, self._index[:, channel], out=planes[channel], mode='clip')
+                if channels == 4:
+                    planes[3] = 255
+            else:
+                pixels = output_buffer.reshape(num_pixels, channels)
+                np.take(lut, self._index, out=pixels[:, :3], mode='clip')
+                if channels == 4:
+                    pixels[:, 3] = 255
+            return output_buffer
+        except Exception as exception:
+            _logger.error("Could not transform image on host; " + str(exception))
+            raise exception
+
+    def _ensure_scratch(self, width, height):
+        if self._scratch_shape == (height, width):
+            return
+        self._scratch_shape = (height, width)
+        self._rgb16 = np.empty((height, width, 3), dtype=np.uint16)
+        self._linear = np.empty((height * width, 3), dtype=np.float32)
+        self._index = np.empty((height * width, 3), dtype=np.uint16)
+
+    def _demosaic(self, image):
+        if self._use_opencv:
+            code = getattr(cv2, _OPENCV_BAYER_CODES[self._color_filter_array_phase])
+            cv2.cvtColor(np.ascontiguousarray(image, dtype=np.uint16), code, dst=self._rgb16)
+            return
+
+        # bilinear interpolation of each sparse color plane
+        height, width = image.shape
+        cell = _BAYER_CELLS[self._color_filter_array_phase]
+        padded = np.zeros((height + 2, width + 2), dtype=np.float32)
+        for color, kernel in ((0, _KERNEL_RED_BLUE), (1, _KERNEL_GREEN), (2, _KERNEL_RED_BLUE)):
+            padded.fill(0)
+            for row in (0, 1):
+                for col in (0, 1):
+                    if cell[row][col] == color:
+                        padded[1 + row:height + 1:2, 1 + col:width + 1:2] = image[row::2, col::2]
+            plane = np.zeros((height, width), dtype=np.float32)
+            for dy in range(3):
+                for dx in range(3):
+                    if kernel[dy, dx]:
+                        plane += kernel[dy, dx] * padded[dy:dy + height, dx:dx + width]
+            self._rgb16[:, :, color] = plane + 0.5
+
+    def _get_matrix(self):
+        if self._matrix is None:
+            gains = np.diag(np.array([self._red_gain, self._green_gain, self._blue_gain], dtype=np.float32))
+            matrix = self._color_correction_matrix @ self._default_white_balance_matrix @ gains
+            if self._output_format != FORMAT.RGB_PIXEL:
+                matrix = matrix[::-1]  # blue first
+            self._matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        return self._matrix
+
+    def _get_lut(self, dtype):
+        lut = self._luts.get(np.dtype(dtype))
+        if lut is None:
+            max_input = 2 ** self._bit_depth - 1
+            max_output = 255 if np.dtype(dtype) == np.uint8 else max_input
+            linear = np.arange(max_input + 1, dtype=np.float64) / max_input
+            if self._color_space == COLOR_SPACE.SRGB:
+                linear = _srgb_encode(linear)
+            lut = np.rint(linear * max_output).astype(dtype)
+            self._luts[np.dtype(dtype)] = lut
+        return lut
+
+    """ Properties """
+
+    @property
+    def color_space(self):
+        """
+        Color space of the output images, see :class:`COLOR_SPACE<thorlabs_tsi_sdk.tl_mono_to_color_enums.COLOR_SPACE>`.
+
+        :type: :class:`COLOR_SPACE<thorlabs_tsi_sdk.tl_mono_to_color_enums.COLOR_SPACE>`
+        """
+        return self._color_space
+
+    @color_space.setter
+    def color_space(self, color_space):
+        self._color_space = COLOR_SPACE(color_space)
+        self._luts = {}
+
+    @property
+    def output_format(self):
+        """
+        Pixel order of the output images, see :class:`FORMAT<thorlabs_tsi_sdk.tl_color_enums.FORMAT>`.
+
+        :type: :class:`FORMAT<thorlabs_tsi_sdk.tl_color_enums.FORMAT>`
+        """
+        return self._output_format
+
+    @output_format.setter
+    def output_format(self, output_format):
+        self._output_format = FORMAT(output_format)
+        self._matrix = None
+
+    @property
+    def red_gain(self):
+        """
+        Gain applied to the red channel on top of the default white balance.
+
+        :type: float
+        """
+        return self._red_gain
+
+    @red_gain.setter
+    def red_gain(self, red_gain):
+        self._red_gain = float(red_gain)
+        self._matrix = None
+
+    @property
+    def green_gain(self):
+        """
+        Gain applied to the green channel on top of the default white balance.
+
+        :type: float
+        """
+        return self._green_gain
+
+    @green_gain.setter
+    def green_gain(self, green_gain):
+        self._green_gain = float(green_gain)
+        self._matrix = None
+
+    @property
+    def blue_gain(self):
+        """
+        Gain applied to the blue channel on top of the default white balance.
+
+        :type: float
+        """
+        return self._blue_gain
+
+    @blue_gain.setter
+    def blue_gain(self, blue_gain):
+        self._blue_gain = float(blue_gain)
+        self._matrix = None
+
+    @property
+    def color_filter_array_phase(self):
+        """
+        The color filter array phase passed in during construction.
+
+        :type: :class:`FILTER_ARRAY_PHASE<thorlabs_tsi_sdk.tl_color.FILTER_ARRAY_PHASE>`
+        """
+        return self._color_filter_array_phase
+
+    @property
+    def color_correction_matrix(self):
+        """
+        The color correction matrix passed in during construction, flattened.
+
+        :type: np.array
+        """
+        return self._color_correction_matrix.ravel().copy()
+
+    @property
+    def default_white_balance_matrix(self):
+        """
+        The default white balance matrix passed in during construction, flattened.
+
+        :type: np.array
+        """
+        return self._default_white_balance_matrix.ravel().copy()
+
+    @property
+    def bit_depth(self):
+        """
+        The bit depth passed in during construction.
+
+        :type: int
+        """
+        return self._bit_depth
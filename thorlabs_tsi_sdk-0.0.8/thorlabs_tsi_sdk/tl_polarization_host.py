@@ -0,0 +1,270 @@
+"""
+tl_polarization_host.py
+
+Host-side (pure NumPy) polarization processing. Does not require the polarization processor DLLs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from traceback import format_exception
+import logging
+
+import numpy as np
+
+from .tl_polarization_enums import POLAR_PHASE
+from .tl_polarization_processor import PolarizationError
+
+""" Setup logger """
+_logger = logging.getLogger('thorlabs_tsi_sdk.tl_polarization_host')
+
+""" Mosaic layout """
+
+# Polarizer angle of each pixel of the 2x2 cell for an origin phase of 0 degrees, see POLAR_PHASE
+_CELL_ANGLES = ((0, 135),
+                (45, 90))
+
+# (row, column) of the origin pixel inside the phase 0 cell for each sensor polar phase
+_PHASE_OFFSETS = {POLAR_PHASE.PolarPhase0: (0, 0),
+                  POLAR_PHASE.PolarPhase45: (1, 0),
+                  POLAR_PHASE.PolarPhase90: (1, 1),
+                  POLAR_PHASE.PolarPhase135: (0, 1)}
+
+# Frames with fewer cell rows than this are always processed on the calling thread
+_MIN_ROWS_PER_WORKER = 64
+
+
+def _cell_positions(sensor_polar_phase, image_origin_x_pixels, image_origin_y_pixels):
+    # type: (POLAR_PHASE, int, int) -> dict
+    """
+    Returns a dictionary mapping each polarizer angle (0, 45, 90, 135) to the (row, column) of the pixel with that
+    angle inside the first 2x2 cell of the image.
+
+    """
+    dy, dx = _PHASE_OFFSETS[POLAR_PHASE(sensor_polar_phase)]
+    positions = {}
+    for row in (0, 1):
+        for col in (0, 1):
+            angle = _CELL_ANGLES[(row + image_origin_y_pixels + dy) % 2][(col + image_origin_x_pixels + dx) % 2]
+            positions[angle] = (row, col)
+    return positions
+
+
+class HostPolarizationProcessor(object):
+
+    """
+    HostPolarizationProcessor
+
+    Computes intensity, DoLP and azimuth from the raw 2x2 polarizer mosaic in a single pass over the frame, as a
+    NumPy alternative to the three separate
+    :class:`PolarizationProcessor<thorlabs_tsi_sdk.tl_polarization_processor.PolarizationProcessor>` transforms.
+
+    The four polarizer channels are read through strided views of the input image, the Stokes parameters are computed
+    once per 2x2 cell in float32 scratch buffers that are kept between calls, and the results are written into
+    caller-provided (or lazily allocated) output arrays. Outputs follow the same scaling as the SDK transforms, so
+    the equations in the PolarizationProcessor documentation apply unchanged.
+
+    Unlike the SDK, which interpolates every pixel from its neighbours, each 2x2 cell is treated as one super-pixel.
+    With *full_resolution* the cell value is repeated over its four pixels, otherwise outputs have half the width and
+    height of the input.
+
+    Large frames can be split into horizontal bands processed by a thread pool (*num_workers* > 1). NumPy releases
+    the GIL inside its ufuncs, so the bands run concurrently.
+
+    """
+
+    def __init__(self, num_workers=1):
+        # type: (int) -> None
+        self._num_workers = max(1, int(num_workers))
+        self._executor = None
+        self._scratch_shape = None
+        self._s0 = None
+        self._s1 = None
+        self._s2 = None
+        self._tmp = None
+
+    def __del__(self):
+        self.dispose()
+
+    """ with statement functionality """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        if exception_type is not None:
+            _logger.debug("".join(format_exception(exception_type, exception_value, exception_traceback)))
+        self.dispose()
+        return True if exception_type is None else False
+
+    def dispose(self):
+        # type: (type(None)) -> None
+        """
+        Shuts down the worker pool (if any) and releases the scratch buffers.
+
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._scratch_shape = None
+        self._s0 = self._s1 = self._s2 = self._tmp = None
+
+    @staticmethod
+    def allocate_outputs(image_width_pixels, image_height_pixels, full_resolution=True):
+        # type: (int, int, bool) -> tuple
+        """
+        Allocates a set of output arrays (intensity, DoLP, azimuth) that can be reused for every frame of the given
+        size.
+
+        :param image_width_pixels: Width of input image in pixels
+        :param image_height_pixels: Height of input image in pixels
+        :param full_resolution: Whether the outputs have the size of the input image or one pixel per 2x2 cell.
+        :return tuple: (intensity, dolp, azimuth) arrays, *dtype* = np.uint16
+        """
+        shape = HostPolarizationProcessor._output_shape(image_width_pixels, image_height_pixels, full_resolution)
+        return tuple(np.zeros(shape, dtype=np.uint16) for _ in range(3))
+
+    @staticmethod
+    def _output_shape(image_width_pixels, image_height_pixels, full_resolution):
+        if full_resolution:
+            return image_height_pixels, image_width_pixels
+        return image_height_pixels // 2, image_width_pixels // 2
+
+    def transform(self,
+                  sensor_polar_phase,
+                  input_image,
+                  image_origin_x_pixels,
+                  image_origin_y_pixels,
+                  image_width_pixels,
+                  image_height_pixels,
+                  input_image_bit_depth,
+                  output_max_value,
+                  intensity=None,
+                  dolp=None,
+                  azimuth=None,
+                  full_resolution=True):
+        # type: (POLAR_PHASE, np.array, int, int, int, int, int, int, np.array, np.array, np.array, bool) -> tuple
+        """
+        Transforms raw-image data into intensity, DoLP and azimuth outputs in a single pass.
+
+        :param sensor_polar_phase: The polar phase (in degrees) of the origin (top-left) pixel of the camera sensor.
+        :param input_image: Unprocessed input image delivered by the camera, flat or 2D.
+        :param image_origin_x_pixels: The X position of the origin (top-left) of the input image on the sensor.
+        :param image_origin_y_pixels: The Y position of the origin (top-left) of the input image on the sensor.
+        :param image_width_pixels: Width of input image in pixels
+        :param image_height_pixels: Height of input image in pixels
+        :param input_image_bit_depth: Bit depth of input image pixels
+        :param output_max_value: The maximum possible pixel value in the output images. Must be between 1 and 65535.
+        :param intensity: Optional output array for the intensity, see :meth:`allocate_outputs`.
+        :param dolp: Optional output array for the DoLP, see :meth:`allocate_outputs`.
+        :param azimuth: Optional output array for the azimuth, see :meth:`allocate_outputs`.
+        :param full_resolution: Whether the outputs have the size of the input image or one pixel per 2x2 cell.
+        :return tuple: (intensity, dolp, azimuth) arrays, *dtype* = np.uint16
+        """
+        try:
+            if not 1 <= output_max_value <= 65535:
+                raise PolarizationError("output_max_value must be between 1 and 65535, got {value}"
+                                        .format(value=output_max_value))
+            if image_width_pixels < 2 or image_height_pixels < 2:
+                raise PolarizationError("Image must be at least 2x2 pixels")
+
+            image = np.asarray(input_image).reshape(image_height_pixels, image_width_pixels)
+            out_shape = self._output_shape(image_width_pixels, image_height_pixels, full_resolution)
+            outputs = []
+            for output in (intensity, dolp, azimuth):
+                if output is None:
+                    output = np.zeros(out_shape, dtype=np.uint16)
+                elif output.shape != out_shape:
+                    raise PolarizationError("Output buffer has shape {actual}, expected {expected}"
+                                            .format(actual=output.shape, expected=out_shape))
+                outputs.append(output)
+
+            cell_rows, cell_cols = image_height_pixels // 2, image_width_pixels // 2
+            self._ensure_scratch(cell_rows, cell_cols)
+
+            positions = _cell_positions(sensor_polar_phase, image_origin_x_pixels, image_origin_y_pixels)
+            # strided views of the four polarizer channels, one element per 2x2 cell
+            channels = {angle: image[row::2, col::2][:cell_rows, :cell_cols] for angle, (row, col) in positions.items()}
+            max_input = float(2 ** input_image_bit_depth - 1)
+
+            bands = self._bands(cell_rows)
+            if len(bands) == 1:
+                self._transform_band(channels, outputs, max_input, output_max_value, full_resolution, *bands[0])
+            else:
+                futures = [self._executor.submit(self._transform_band, channels, outputs, max_input,
+                                                 output_max_value, full_resolution, start, stop)
+                           for start, stop in bands]
+                for future in futures:
+                    future.result()
+
+            if full_resolution:
+                # odd sizes leave the last row/column outside of any cell; copy them from their neighbours
+                for output in outputs:
+                    if image_height_pixels % 2:
+                        output[-1, :] = output[-2, :]
+                    if image_width_pixels % 2:
+                        output[:, -1] = output[:, -2]
+
+            return tuple(outputs)
+        except Exception as exception:
+            _logger.error("Could not transform polarization image; " + str(exception))
+            raise exception
+
+    def _ensure_scratch(self, cell_rows, cell_cols):
+        if self._scratch_shape == (cell_rows, cell_cols):
+            return
+        self._scratch_shape = (cell_rows, cell_cols)
+        self._s0, self._s1, self._s2, self._tmp = (np.empty(self._scratch_shape, dtype=np.float32) for _ in range(4))
+
+    def _bands(self, cell_rows):
+        workers = min(self._num_workers, cell_rows // _MIN_ROWS_PER_WORKER)
+        if workers <= 1:
+            return [(0, cell_rows)]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._num_workers,
+                                                thread_name_prefix='tl_polarization_host')
+        edges = np.linspace(0, cell_rows, workers + 1).astype(int)
+        return list(zip(edges[:-1], edges[1:]))
+
+    def _transform_band(self, channels, outputs, max_input, output_max_value, full_resolution, start, stop):
+        i0, i45, i90, i135 = (channels[angle][start:stop] for angle in (0, 45, 90, 135))
+        s0, s1, s2, tmp = (buf[start:stop] for buf in (self._s0, self._s1, self._s2, self._tmp))
+        intensity, dolp, azimuth = outputs
+
+        # Stokes parameters of each cell
+        np.add(i0, i90, out=s0, dtype=np.float32)
+        np.add(s0, i45, out=s0)
+        np.add(s0, i135, out=s0)
+        s0 *= 0.5
+        np.subtract(i0, i90, out=s1, dtype=np.float32)
+        np.subtract(i45, i135, out=s2, dtype=np.float32)
+
+        # Azimuth: 0.5 * atan2(S2, S1) in [-90, 90] degrees, scaled to [0, output_max_value]
+        np.arctan2(s2, s1, out=tmp)
+        tmp *= 0.5 / np.pi
+        tmp += 0.5
+        self._store(tmp, azimuth, output_max_value, full_resolution, start, stop)
+
+        # DoLP: sqrt(S1^2 + S2^2) / S0 in [0, 1]; s1 is reused as scratch from here on
+        np.hypot(s1, s2, out=tmp)
+        np.maximum(s0, 1.0, out=s1)
+        np.divide(tmp, s1, out=tmp)
+        self._store(tmp, dolp, output_max_value, full_resolution, start, stop)
+
+        # Intensity: total optical power relative to the input full scale; S0 is twice the mean of the four
+        # pixels, so full-scale unpolarized light gives S0 = 2 * max_input
+        np.divide(s0, 2 * max_input, out=tmp)
+        self._store(tmp, intensity, output_max_value, full_resolution, start, stop)
+
+    @staticmethod
+    def _store(normalized, output, output_max_value, full_resolution, start, stop):
+        # scales [0, 1] values in place and writes them (rounded) into the uint16 output rows of this band
+        normalized *= output_max_value
+        np.clip(normalized, 0, output_max_value, out=normalized)
+        normalized += 0.5
+        if full_resolution:
+            rows = slice(2 * start, 2 * stop)
+            cols = normalized.shape[1]
+            for row in (0, 1):
+                for col in (0, 1):
+                    output[rows][row::2, col::2][:, :cols] = normalized
+        else:
+            output[start:stop] = normalized
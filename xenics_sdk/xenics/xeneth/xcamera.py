@@ -4,7 +4,7 @@ xcamera.py
 XenEth camera class
 """
 
-from typing import Any, Union, Tuple
+from typing import Any, Dict, Iterable, Union, Tuple
 
 from xenics.xeneth.capi.errors import XErrorCodes
 from xenics.xeneth.util import handle_c_call
@@ -31,6 +31,9 @@ from xenics.xeneth.xframebuffer import XFrameBuffer
 # only export XCamera class
 __all__ = ['XCamera']
 
+# marks a property without cached metadata; None is a valid cached unit or range
+_MISSING = object()
+
 class XCamera(object):
     """
     Represents a XenICs camera.
@@ -53,14 +56,21 @@ class XCamera(object):
         self._status_cb = ctypes.cast(None, XStatus)
         self._callback_data = None
         self.props = Properties()
+        # Static property metadata (type, category, unit, range), keyed by property name.
+        # Filled once by _populate_props so UI code does not hit the SDK for it on every access.
+        self._property_meta = {}
 
         self._native_frame_type = XFrameType.FT_UNKNOWN
 
     def _populate_props(self):
         """
-        Retrieve the properties of the camera and make them available as attributes of the props member object
+        Retrieve the properties of the camera and make them available as attributes of the props member object.
+        The static metadata of each property (type, category, unit and range) is cached in _property_meta.
         """
 
+        self.props = Properties()
+        self._property_meta = {}
+
         numprops = self.get_property_count()
 
         for i in range(numprops):
@@ -74,12 +84,50 @@ class XCamera(object):
             if propclass:
                 prop = propclass(self.handle, propname, proptype, propcategory)
 
+                # not every property reports a unit or range, those are cached as None.
+                # The SDK is queried with the original name, including a '(0)' suffix.
+                try:
+                    propunit = self._query_property_unit(propname)
+                except XenethAPIException as ex:
+                    logger.debug("No unit for property %s: %s", propname, ex.message)
+                    propunit = None
+                try:
+                    proprange = self._query_property_range(propname, proptype)
+                except XenethAPIException as ex:
+                    logger.debug("No range for property %s: %s", propname, ex.message)
+                    proprange = None
+
                 # Handle the special case where properties end in '(0)', simply strip those 3 characters from the name used as attribute
-                if propname.endswith('(0)'):
-                    propname = propname[:-3]
+                attrname = propname[:-3] if propname.endswith('(0)') else propname
 
                 # self._properties.append(prop)
-                setattr(self.props, propname, prop)  # .decode bytes->str
+                setattr(self.props, attrname, prop)  # .decode bytes->str
+
+                self._property_meta[attrname] = {
+                    'type': proptype,
+                    'category': propcategory,
+                    'unit': propunit,
+                    'range': proprange,
+                }
+
+    def _invalidate_props(self):
+        """
+        Drops the cached property metadata and reloads it from the camera.
+        Must be called whenever the camera's property set may have changed, e.g. after loading settings.
+        """
+        self._property_meta = {}
+        if self._handle:
+            self._populate_props()
+
+    def _cached_meta(self, property_name: str, key: str):
+        """
+        Returns a cached metadata entry of a property, or _MISSING if it is not cached.
+        """
+        if property_name.endswith('(0)'):
+            property_name = property_name[:-3]
+
+        meta = self._property_meta.get(property_name)
+        return _MISSING if meta is None else meta[key]
 
     #region Properties
 
@@ -241,6 +289,7 @@ class XCamera(object):
 
         # reset handles and pointers
         self._handle = 0
+        self._property_meta = {}
         self._status_cb = ctypes.cast(None, XStatus)
         self._callback_data = None
 
@@ -335,6 +384,9 @@ class XCamera(object):
         """
         handle_c_call(lambda: XC_LoadSettings(self._handle, filename.encode()))
 
+        # loaded settings may change ranges and available properties
+        self._invalidate_props()
+
 
     def save_settings(self, filename: str) -> None:
         """
@@ -385,6 +437,10 @@ class XCamera(object):
         :param property_name: The name of the property for which to retrieve the category
         :return: The property category
         """
+        cached = self._cached_meta(property_name, 'category')
+        if cached is not _MISSING:
+            return cached
+
         property_category = _create_property_category_buffer()
         handle_c_call(lambda: XC_GetPropertyCategory(self.handle, property_name.encode(), property_category, len(property_category)))
 
@@ -397,6 +453,10 @@ class XCamera(object):
         :param property_name: The name of the property for which to retrieve the value
         :return: The property type
         """
+        cached = self._cached_meta(property_name, 'type')
+        if cached is not _MISSING:
+            return cached
+
         value = ctypes.c_int()
 
         handle_c_call(lambda: XC_GetPropertyType(self.handle, property_name.encode(), ctypes.byref(value)))
@@ -411,6 +471,16 @@ class XCamera(object):
 
         :return: The unit of the property.
         """
+        cached = self._cached_meta(property_name, 'unit')
+        if cached is not _MISSING:
+            return cached
+
+        return self._query_property_unit(property_name)
+
+    def _query_property_unit(self, property_name : str) -> str:
+        """
+        Reads the unit of a property from the camera, bypassing the metadata cache.
+        """
         property_unit = _create_property_unit_buffer()
         handle_c_call(lambda:  XC_GetPropertyUnit(self.handle, property_name.encode(), property_unit, len(property_unit)))
 
@@ -436,6 +506,36 @@ class XCamera(object):
         """
         self.props[property_name].set(value)
 
+    def get_property_values(self, property_names: Iterable[str]) -> Dict[str, Union[str, int, float]]:
+        """
+        Retrieves the current values of several properties in one call.
+        All names are resolved against the cached property list before the camera is queried.
+
+        :param property_names: The names of the properties to read.
+
+        :return: Dictionary mapping each property name to its current value.
+        """
+        props = {name: self.props[name] for name in property_names}
+
+        return {name: prop.get() for name, prop in props.items()}
+
+    def set_property_values(self, values: Dict[str, Any]) -> None:
+        """
+        Sets the values of several properties in one call.
+        All properties are checked for existence and write access before the first value is written,
+        so an invalid entry does not leave the camera half configured.
+
+        :param values: Dictionary mapping property names to their new values. Values are written in the given order.
+        """
+        props = {name: self.props[name] for name in values}
+
+        for name, prop in props.items():
+            if not prop.writable:
+                raise XCameraAccessException(prop.name, PropertyAccess.WRITE)
+
+        for name, prop in props.items():
+            prop.set(values[name])
+
 
     def get_property_range(self, property_name: str) -> Union[Tuple[int, int],Tuple[float, float],Tuple[str, str]]:
         """
@@ -447,12 +547,20 @@ class XCamera(object):
         For enum properties a tuple of strings is returned, for number a tuple of min,max values is returned.
         For all other property types None is returned.
         """
+        cached = self._cached_meta(property_name, 'range')
+        if cached is not _MISSING:
+            return cached
+
+        return self._query_property_range(property_name, self.get_property_type(property_name))
+
+    def _query_property_range(self, property_name: str, proptype: XPropType):
+        """
+        Reads the range of a property from the camera, bypassing the metadata cache.
+        See get_property_range for the return value.
+        """
         range_len = 4096
         proprange = ctypes.create_string_buffer(range_len)
 
-        # get property type
-        proptype = self.get_property_type(property_name)
-
         if proptype & XPropType.XType_Base_Number == XPropType.XType_Base_Number:
             handle_c_call(lambda: XC_GetPropertyRange(self.handle, property_name.encode(), proprange, range_len))
 